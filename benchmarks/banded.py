@@ -0,0 +1,85 @@
+"""
+Benchmarks the multiplication of a state vector with the transition matrix of a
+cow with 9 lactations, for the states in different orders: the banded order of
+``enumerate_states``, the reverse Cuthill-McKee order, and a random order as for
+a table created with ``StateTable.from_states`` from states in any order.
+
+For each order it prints the distance between the row and column of the
+transitions, the number of cache lines of the vector that a multiplication
+reads per 1000 transitions (a read from another line than the previous read),
+and the time of a multiplication. A 2800-day simulation of the random order is
+then timed with and without ``order=band_order(...)``.
+
+Run from the repository root with::
+
+    python benchmarks/banded.py
+
+To count the hardware cache misses of one order, run it under ``perf``::
+
+    perf stat -e cache-references,cache-misses python benchmarks/banded.py random
+"""
+import sys
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.simulation import StatePropagator, permute_matrix, simulate
+from cow_builder.state_space import band_order
+from cow_builder.transition_matrix import build_transition_matrix
+
+STEPS = 500
+LINE = 8  # float64 values per 64-byte cache line
+
+
+def profile(name: str, transition_matrix):
+    transposed = csr_matrix(transition_matrix.T)
+    transposed.sort_indices()
+    rows = np.repeat(np.arange(transposed.shape[0]), np.diff(transposed.indptr))
+    distance = np.abs(transposed.indices.astype(np.int64) - rows)
+    lines = transposed.indices // LINE
+    line_reads = 1 + np.count_nonzero(lines[1:] != lines[:-1])
+
+    propagator = StatePropagator(transition_matrix)
+    vector = np.random.default_rng(0).random(transition_matrix.shape[0])
+    out = np.empty_like(vector)
+    propagator.step(vector, out)
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        propagator.step(vector, out)
+    step_time = (time.perf_counter() - start) / STEPS
+    print(f"{name}:\n"
+          f"\tdistance: median {np.median(distance):.0f}, "
+          f"99.9% {np.percentile(distance, 99.9):.0f}, max {distance.max()}\n"
+          f"\tcache lines read per 1000 transitions: "
+          f"{1000 * line_reads / transposed.nnz:.0f}\n"
+          f"\tmultiplication: {step_time * 1e3:.3f} ms, "
+          f"{transposed.nnz / step_time / 1e6:.0f} M transitions/s")
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    shuffle = np.random.default_rng(1).permutation(cow.node_count)
+    orders = {'banded': np.arange(cow.node_count),
+              'rcm': reverse_cuthill_mckee(tm, symmetric_mode=False),
+              'random': shuffle}
+    selected = sys.argv[1:] or list(orders)
+    for name in selected:
+        profile(name, permute_matrix(tm, orders[name]))
+
+    if sys.argv[1:]:
+        sys.exit()
+    # The states of the cow in a random order, as a table from another source.
+    shuffled_states = cow.total_states.take(shuffle)
+    shuffled_tm = permute_matrix(tm, shuffle)
+    initial_state_vector = cow.initial_state_vector[shuffle]
+    for name, order in (("random order", None),
+                        ("random order, band_order", band_order(shuffled_states))):
+        start = time.perf_counter()
+        simulate(initial_state_vector, shuffled_tm, days=2800, step_size=14,
+                 fill_ratio=0, order=order)
+        print(f"simulate 2800 days, {name}: {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,63 @@
+"""
+Benchmarks the body weight of all states of a cow with 9 lactations on every
+14th day of a simulation of 2800 days. It compares ``body_weight_vector``,
+which calculates all terms on each day, with ``StatePhenotypes.body_weight``,
+which only adds the growth of the day to the part calculated once. It then calls
+``calculate_body_weight`` for each state with a probability above 0 on those
+days, and prints the size of the cache of ``state_body_weight`` next to the
+number of distinct (state, age) pairs the calls had.
+
+Run from the repository root with::
+
+    python benchmarks/body_weight.py
+"""
+import time
+import numpy as np
+from cow_builder.digital_cow import DigitalCow, calculate_body_weight, \
+    state_body_weight
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.phenotypes import body_weight_vector
+from cow_builder.simulation import state_vectors
+from cow_builder.transition_matrix import build_transition_matrix
+
+DAYS = 2800
+STEP_SIZE = 14
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    total_states = cow.total_states
+    ages = cow.age + np.arange(STEP_SIZE, DAYS + 1, STEP_SIZE)
+
+    start = time.perf_counter()
+    full = [body_weight_vector(total_states, age) for age in ages]
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    phenotypes = cow.phenotypes
+    split_setup = time.perf_counter() - start
+    start = time.perf_counter()
+    split = [phenotypes.body_weight(age) for age in ages]
+    split_time = time.perf_counter() - start
+    difference = max(np.max(np.abs(a - b) / b) for a, b in zip(full, split))
+    print(f"{len(total_states)} states, {len(ages)} days:\n"
+          f"\tbody_weight_vector: {full_time * 1e3:.1f} ms\n"
+          f"\tStatePhenotypes.body_weight: {split_time * 1e3:.1f} ms "
+          f"+ {split_setup * 1e3:.1f} ms once "
+          f"({full_time / split_time:.1f}x faster per day)\n"
+          f"\tlargest relative difference: {difference:.1e}")
+
+    pairs = 0
+    start = time.perf_counter()
+    for vector, day in state_vectors(cow.initial_state_vector, tm, DAYS,
+                                     step_size=STEP_SIZE):
+        support = np.flatnonzero(vector)
+        pairs += len(support)
+        for index in support:
+            calculate_body_weight(total_states[index], cow.age + day)
+    scalar_time = time.perf_counter() - start
+    print(f"calculate_body_weight, {pairs} calls in {scalar_time:.2f} s:\n"
+          f"\tdistinct (state, age) pairs: {pairs}\n"
+          f"\tstate_body_weight cache size: "
+          f"{state_body_weight.statistics().size}")
@@ -0,0 +1,68 @@
+"""
+Benchmarks the caches of the phenotype functions of ``digital_cow``. For a cow
+with 9 lactations, it calls ``nitrogen_emission`` for each state that has a
+probability above 0 on every 14th day of a simulation of 1400 days, with three
+cache settings:
+
+* unbounded: every cache is resized to hold all arguments, like
+  ``functools.cache``.
+* bounded: the default sizes, and the caches of ``calculate_dmi`` and the
+  nitrogen functions disable themselves if their hit rate stays below 0.1.
+* disabled: every function is called directly.
+
+It prints the time of each setting and the statistics of every cache.
+
+Run from the repository root with::
+
+    python benchmarks/function_cache.py
+"""
+import time
+import numpy as np
+from cow_builder.digital_cow import DigitalCow, nitrogen_emission
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.function_cache import caches, cache_statistics, \
+    clear_caches, enable_caches
+from cow_builder.simulation import state_vectors
+from cow_builder.transition_matrix import build_transition_matrix
+from cow_builder.state_space import EXIT
+
+DAYS = 1400
+STEP_SIZE = 14
+
+
+def run(cow, supports) -> float:
+    """Calls ``nitrogen_emission`` for each state of each day, and returns the
+    total and the time."""
+    total_states = cow.total_states
+    start = time.perf_counter()
+    total = sum(nitrogen_emission(cow, total_states[index], cow.age + day)
+                for day, support in supports for index in support)
+    return total, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    in_herd = cow.total_states.life_states != EXIT
+    supports = [(day, np.flatnonzero((vector > 0) & in_herd))
+                for vector, day in state_vectors(cow.initial_state_vector, tm,
+                                                 DAYS, step_size=STEP_SIZE)]
+    print(f"{sum(len(support) for _, support in supports)} calls per run")
+
+    maxsizes = {name: cache.maxsize for name, cache in caches().items()}
+    settings = {'unbounded': lambda cache, name: cache.resize(2 ** 30),
+                'bounded': lambda cache, name: cache.resize(maxsizes[name]),
+                'disabled': lambda cache, name: cache.disable()}
+    for setting, configure in settings.items():
+        clear_caches()
+        enable_caches()
+        for name, cache in caches().items():
+            configure(cache, name)
+        total, seconds = run(cow, supports)
+        print(f"{setting}: {seconds:.2f} s, {total:.6f} g")
+        for name, statistics in cache_statistics().items():
+            print(f"\t{name.rsplit('.', 1)[1]}: hit rate "
+                  f"{statistics.hit_rate:.3f}, size {statistics.size}, "
+                  f"{'enabled' if statistics.enabled else 'disabled'}")
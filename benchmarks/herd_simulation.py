@@ -0,0 +1,46 @@
+"""
+Benchmarks simulating the cows of a herd one by one with ``simulate`` against
+simulating them at once with ``simulate_herd``, for 2800 days with a step size of
+14 days as in ``main.py``. Only the state vectors are calculated, without
+phenotype callbacks.
+
+Run from the repository root with::
+
+    python benchmarks/herd_simulation.py
+"""
+import time
+import numpy as np
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.simulation import simulate, simulate_herd, initial_state_matrix
+from cow_builder.transition_matrix import build_transition_matrix
+
+SIMULATED_DAYS = 2800
+STEPS = 14
+
+
+def benchmark(cow_count: int):
+    herd = DigitalHerd()
+    rng = np.random.default_rng(0)
+    cows = [DigitalCow(days_in_milk=int(dim), lactation_number=1,
+                       days_pregnant=0, age=700, herd=herd, state='Open')
+            for dim in rng.integers(0, 160, cow_count)]
+    cows[0].generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cows[0])
+    vectors = initial_state_matrix(cows)
+
+    start = time.perf_counter()
+    for column in range(cow_count):
+        simulate(vectors[:, column], tm, SIMULATED_DAYS, STEPS)
+    separate = time.perf_counter() - start
+    start = time.perf_counter()
+    simulate_herd(vectors, tm, SIMULATED_DAYS, STEPS)
+    batched = time.perf_counter() - start
+    print(f"{cow_count} cows:\n"
+          f"\tseparate simulations: {separate:.1f} s\n"
+          f"\tone herd simulation: {batched:.1f} s ({separate / batched:.1f}x)")
+
+
+if __name__ == '__main__':
+    benchmark(cow_count=8)
+    benchmark(cow_count=16)
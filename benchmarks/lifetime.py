@@ -0,0 +1,59 @@
+"""
+Benchmarks ``expected_lifetime_totals`` against accumulating the expected milk
+production and nitrogen emission day by day with ``simulate``, and compares the
+totals. The simulated milk converges to the exact total as the number of
+simulated days grows. The nitrogen of the solve is evaluated at the expected age
+of the visits to each state, so it differs slightly from the simulated total.
+
+Run from the repository root with::
+
+    python benchmarks/lifetime.py
+"""
+import time
+import numpy as np
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.lifetime import expected_lifetime_totals
+from cow_builder.simulation import simulate
+from cow_builder.transition_matrix import build_transition_matrix
+
+
+def benchmark(cow: DigitalCow, days: tuple):
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    milk = cow.total_states.milk_output
+    phenotypes = cow.phenotypes
+
+    def nitrogen(vector, day, step_size):
+        present = np.flatnonzero(vector)
+        return vector[present] @ phenotypes.nitrogen(cow.age + day, present) * \
+            step_size
+
+    start = time.perf_counter()
+    lifetime = expected_lifetime_totals(cow, transition_matrix=tm)
+    solve_time = time.perf_counter() - start
+    print(f"{cow.current_life_state} cow in lactation "
+          f"{cow.current_lactation_number}, {cow.node_count} states:\n"
+          f"\tlinear solve: {lifetime.totals['milk']:.1f} kg milk, "
+          f"{lifetime.totals['nitrogen']:.1f} g nitrogen, "
+          f"{lifetime.productive_days:.1f} days, {solve_time:.3f} s")
+    for simulated_days in days:
+        start = time.perf_counter()
+        accumulated = simulate(
+            cow.initial_state_vector, tm, days=simulated_days,
+            milk=lambda vector, day, step_size: (vector @ milk) * step_size,
+            nitrogen=nitrogen)
+        simulate_time = time.perf_counter() - start
+        print(f"\tsimulate {simulated_days} days: {accumulated['milk']:.1f} kg "
+              f"milk, {accumulated['nitrogen']:.1f} g nitrogen "
+              f"({accumulated['nitrogen'] / lifetime.totals['nitrogen'] - 1:+.2%}),"
+              f" {simulate_time:.2f} s "
+              f"({simulate_time / solve_time:.0f}x slower)")
+
+
+if __name__ == '__main__':
+    herd = DigitalHerd()
+    benchmark(DigitalCow(days_in_milk=0, lactation_number=0, days_pregnant=0,
+                         age=0, herd=herd, state='Open'), days=(2800, 5600))
+    benchmark(DigitalCow(days_in_milk=20, lactation_number=3, days_pregnant=0,
+                         age=2000, herd=herd, state='Open'), days=(2800, 5600))
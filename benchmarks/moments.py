@@ -0,0 +1,64 @@
+"""
+Benchmarks ``phenotype_moments`` against drawing trajectories with
+``sample_trajectories`` for a cow with 9 lactations, and compares the standard
+deviation of the total milk production over 2800 days, and the 5th, 50th and
+95th percentile of the milk production on day 700.
+
+Run from the repository root with::
+
+    python benchmarks/moments.py
+"""
+import time
+import numpy as np
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.moments import phenotype_moments
+from cow_builder.monte_carlo import sample_trajectories
+from cow_builder.simulation import matrix_power, simulate
+from cow_builder.state_space import EXIT
+from cow_builder.transition_matrix import build_transition_matrix
+
+DAYS = 2800
+STEP_SIZE = 14
+DAY = 700
+SAMPLE = DAY // STEP_SIZE - 1
+PERCENTILES = (5, 50, 95)
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    milk = np.where(cow.total_states.life_states == EXIT, 0.0,
+                    cow.total_states.milk_output)
+
+    start = time.perf_counter()
+    simulate(cow.initial_state_vector, tm, DAYS, STEP_SIZE, fill_ratio=0,
+             milk=lambda vector, day, step_size: (vector @ milk) * step_size)
+    print(f"simulate, mean only: {time.perf_counter() - start:.2f} s")
+    tm_14 = matrix_power(tm, STEP_SIZE)
+    for name, step_matrix in (("daily", None), ("step matrix", tm_14)):
+        start = time.perf_counter()
+        moments = phenotype_moments(cow.initial_state_vector, tm, DAYS,
+                                    {'milk': milk}, STEP_SIZE, step_matrix,
+                                    PERCENTILES)
+        print(f"phenotype_moments, {name}: {time.perf_counter() - start:.2f} s, "
+              f"total milk {moments.cumulative_mean['milk'][-1]:.0f} kg, "
+              f"standard deviation "
+              f"{np.sqrt(moments.cumulative_variance['milk'][-1]):.0f} kg, "
+              f"percentiles of day {DAY}: "
+              f"{np.round(moments.percentiles['milk'][:, SAMPLE], 2)} kg")
+
+    for trajectory_count in (1000, 10000, 100000):
+        start = time.perf_counter()
+        trajectories = sample_trajectories(
+            cow, trajectory_count, DAYS, STEP_SIZE, seed=0,
+            transition_matrix=tm, phenotypes={'milk': milk})
+        sample_time = time.perf_counter() - start
+        totals = trajectories.series['milk'].sum(axis=0)
+        day_milk = trajectories.series['milk'][SAMPLE] / STEP_SIZE
+        print(f"sample_trajectories, {trajectory_count} trajectories: "
+              f"{sample_time:.2f} s, total milk {totals.mean():.0f} kg, "
+              f"standard deviation {totals.std():.0f} kg, percentiles of "
+              f"day {DAY}: {np.round(np.percentile(day_milk, PERCENTILES), 2)} kg")
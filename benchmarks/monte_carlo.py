@@ -0,0 +1,54 @@
+"""
+Benchmarks ``sample_trajectories`` for a cow with 9 lactations: the time to draw
+the trajectories with and without the phenotypes, and the number of transitions
+drawn per second. It compares the mean of the trajectories with the expectation
+of ``expected_lifetime_totals``.
+
+Run from the repository root with::
+
+    python benchmarks/monte_carlo.py
+"""
+import time
+import numpy as np
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.lifetime import expected_lifetime_totals
+from cow_builder.monte_carlo import sample_trajectories
+from cow_builder.transition_matrix import build_transition_matrix
+
+DAYS = 5000
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    lifetime = expected_lifetime_totals(cow, transition_matrix=tm)
+    for trajectory_count in (1000, 10000, 100000):
+        start = time.perf_counter()
+        sample_trajectories(cow, trajectory_count, DAYS, step_size=30, seed=0,
+                            transition_matrix=tm, phenotypes={})
+        sample_time = time.perf_counter() - start
+        print(f"{trajectory_count} trajectories of {DAYS} days: "
+              f"{sample_time:.2f} s, "
+              f"{trajectory_count * DAYS / sample_time / 1e6:.1f} M "
+              f"transitions/s")
+
+    start = time.perf_counter()
+    sample_trajectories(cow, 10000, DAYS, step_size=30, seed=0,
+                        transition_matrix=tm)
+    print(f"10000 trajectories with milk and nitrogen every 30 days: "
+          f"{time.perf_counter() - start:.2f} s")
+
+    trajectories = sample_trajectories(
+        cow, 10000, DAYS, seed=0, transition_matrix=tm,
+        phenotypes={'milk': cow.total_states.milk_output})
+    milk = trajectories.series['milk'].sum(axis=0)
+    print(f"lifetime milk: mean {milk.mean():.0f} kg "
+          f"(expected {lifetime.totals['milk']:.0f} kg), "
+          f"5-95% {np.percentile(milk, 5):.0f}-{np.percentile(milk, 95):.0f} kg")
+    print(f"days to exit: mean {trajectories.exit_days.mean():.0f} "
+          f"(expected {lifetime.productive_days + 1:.0f}), "
+          f"5-95% {np.percentile(trajectories.exit_days, 5):.0f}-"
+          f"{np.percentile(trajectories.exit_days, 95):.0f}")
@@ -0,0 +1,49 @@
+"""
+Benchmarks ``vector_nitrogen_emission`` in the scenario of ``main.py``, a cow
+with 9 lactations simulated for 2800 days with a step size of 14 days, against
+calculating the nitrogen emission state by state with ``nitrogen_emission``.
+
+Run from the repository root with::
+
+    python benchmarks/nitrogen.py
+"""
+import time
+from functools import partial
+import numpy as np
+from cow_builder.digital_cow import DigitalCow, nitrogen_emission, \
+    vector_nitrogen_emission
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.simulation import simulate
+from cow_builder.transition_matrix import build_transition_matrix
+
+
+def loop_nitrogen_emission(vector, step_in_time, step_size, digital_cow):
+    """The nitrogen emission of a state vector, calculated state by state."""
+    non_exit_states = 0
+    vector_phenotype = 0
+    for index in np.flatnonzero(vector > 0):
+        state = digital_cow.total_states[index]
+        if state.state != 'Exit':
+            non_exit_states += 1
+            vector_phenotype += nitrogen_emission(
+                digital_cow, state, digital_cow.age + step_in_time)
+    if non_exit_states:
+        vector_phenotype /= non_exit_states
+    return vector_phenotype * step_size
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    for name, callback in (
+            ("state by state", partial(loop_nitrogen_emission,
+                                       digital_cow=cow)),
+            ("vectorized", partial(vector_nitrogen_emission, digital_cow=cow,
+                                   intermediate_accumulator=None))):
+        start = time.perf_counter()
+        accumulated = simulate(cow.initial_state_vector, tm, 2800, 14,
+                               nitrogen=callback)
+        print(f"{name}: {accumulated['nitrogen']:.6f} g, "
+              f"{time.perf_counter() - start:.2f} s")
@@ -0,0 +1,58 @@
+"""
+Benchmarks ``vector_milk_production`` against the loop over the states with a
+probability above 0 that it replaces, for a cow with 9 lactations, on several
+days of a simulation. It prints the number of states with a probability above
+0, the time of a call of each, and the result of the probability-weighted mode.
+
+Run from the repository root with::
+
+    python benchmarks/phenotypes.py
+"""
+import time
+import timeit
+import numpy as np
+from cow_builder.digital_cow import DigitalCow, vector_milk_production
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.simulation import state_vectors
+from cow_builder.transition_matrix import build_transition_matrix
+
+DAYS = (100, 700, 1400, 2800)
+
+
+def loop_milk_production(vector, digital_cow) -> float:
+    """The milk production of a state vector, calculated state by state."""
+    non_exit_states = 0
+    vector_phenotype = 0
+    for index in np.where(vector > 0)[0]:
+        state = digital_cow.total_states[index]
+        if state.state != 'Exit':
+            non_exit_states += 1
+            vector_phenotype += state.milk_output
+    return vector_phenotype / non_exit_states if non_exit_states else 0
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    cow.phenotypes
+    previous_day = 0
+    for vector, day in state_vectors(cow.initial_state_vector, tm, DAYS[-1],
+                                     step_size=100):
+        if day not in DAYS:
+            continue
+        start = time.perf_counter()
+        loop = loop_milk_production(vector, cow)
+        loop_time = time.perf_counter() - start
+        times = {mode: timeit.timeit(
+            lambda: vector_milk_production(vector, day, 1, cow, None, mode),
+            number=20) / 20 for mode in ('count', 'probability')}
+        print(f"day {day}, {np.count_nonzero(vector)} states above 0:\n"
+              f"\tloop: {loop:.3f} kg, {loop_time * 1e3:.2f} ms\n"
+              f"\tcount: {vector_milk_production(vector, day, 1, cow, None):.3f}"
+              f" kg, {times['count'] * 1e3:.3f} ms "
+              f"({loop_time / times['count']:.0f}x faster)\n"
+              f"\tprobability: "
+              f"{vector_milk_production(vector, day, 1, cow, None, 'probability'):.3f}"
+              f" kg, {times['probability'] * 1e3:.3f} ms")
@@ -0,0 +1,59 @@
+"""
+Benchmarks how long a worker process needs to get the states and transition
+matrix of a cow: by generating them, by loading a compressed ``.npz`` file as in
+``transition_matrices/``, and by memory mapping the arrays saved by
+``cow_builder.storage``.
+
+Run from the repository root with::
+
+    python benchmarks/shared_matrix.py
+"""
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from scipy.sparse import save_npz, load_npz
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.storage import save_matrix, open_matrix
+from cow_builder.transition_matrix import build_transition_matrix
+
+
+def generate(_):
+    start = time.perf_counter()
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    build_transition_matrix(cow)
+    return time.perf_counter() - start
+
+
+def load_compressed(path):
+    start = time.perf_counter()
+    load_npz(path)
+    return time.perf_counter() - start
+
+
+def attach(path):
+    start = time.perf_counter()
+    open_matrix(path)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    workers = 4
+    with tempfile.TemporaryDirectory() as directory:
+        npz_path = Path(directory) / 'transition_matrix.npz'
+        save_npz(npz_path, tm, True)
+        array_path = save_matrix(Path(directory) / 'matrix', cow.total_states, tm)
+        with ProcessPoolExecutor(workers) as executor:
+            for name, function, argument in (
+                    ("generate and build", generate, None),
+                    ("load compressed .npz", load_compressed, npz_path),
+                    ("memory map .npy", attach, array_path)):
+                timings = list(executor.map(function, [argument] * workers))
+                print(f"{name}: {max(timings) * 1e3:.1f} ms per worker")
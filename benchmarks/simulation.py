@@ -0,0 +1,84 @@
+"""
+Benchmarks ``cow_builder.simulation`` against the ``chain_simulator`` path of
+``main.py``: a cow with 9 lactations simulated for 2800 days, with the milk and
+nitrogen callbacks called every 14 days. The step skipping path includes the
+calculation of the transition matrix to the power 14. The path without frontier
+multiplies the whole state vector every day. The ``chain_simulator`` path is
+skipped if the package is not installed.
+
+Run from the repository root with::
+
+    python benchmarks/simulation.py
+"""
+import time
+from functools import partial
+from cow_builder.digital_cow import DigitalCow, vector_milk_production, \
+    vector_nitrogen_emission
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.simulation import simulate, matrix_power
+from cow_builder.transition_matrix import build_transition_matrix
+
+SIMULATED_DAYS = 2800
+STEPS = 14
+
+
+def callbacks(cow: DigitalCow) -> dict:
+    return {
+        "milk": partial(vector_milk_production, digital_cow=cow,
+                        intermediate_accumulator=None),
+        "nitrogen": partial(vector_nitrogen_emission, digital_cow=cow,
+                            intermediate_accumulator=None),
+    }
+
+
+def chain_simulator_path(cow: DigitalCow, tm, **kwargs) -> dict:
+    from chain_simulator.simulation import state_vector_processor
+    from chain_simulator.utilities import simulation_accumulator
+    simulation = state_vector_processor(cow.initial_state_vector, tm,
+                                        SIMULATED_DAYS, STEPS)
+    return dict(simulation_accumulator(simulation, **kwargs))
+
+
+def native_path(cow: DigitalCow, tm, **kwargs) -> dict:
+    return simulate(cow.initial_state_vector, tm, SIMULATED_DAYS, STEPS, **kwargs)
+
+
+def dense_path(cow: DigitalCow, tm, **kwargs) -> dict:
+    return simulate(cow.initial_state_vector, tm, SIMULATED_DAYS, STEPS,
+                    fill_ratio=0, **kwargs)
+
+
+def step_skipping_path(cow: DigitalCow, tm, **kwargs) -> dict:
+    return simulate(cow.initial_state_vector, tm, SIMULATED_DAYS, STEPS,
+                    step_matrix=matrix_power(tm, STEPS), **kwargs)
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    paths = [("cow_builder.simulation", native_path),
+             ("cow_builder.simulation without frontier", dense_path),
+             ("cow_builder.simulation with step skipping", step_skipping_path)]
+    try:
+        import chain_simulator
+        paths.append(("chain_simulator", chain_simulator_path))
+    except ImportError:
+        print("chain_simulator is not installed, its path is skipped.")
+    # The phenotype functions cache their results, and every path calls the
+    # callbacks with the same state vectors, so they are called once before the
+    # paths are timed.
+    step_skipping_path(cow, tm, **callbacks(cow))
+    for name, path in paths:
+        start = time.perf_counter()
+        path(cow, tm)
+        propagation = time.perf_counter() - start
+        start = time.perf_counter()
+        accumulated = path(cow, tm, **callbacks(cow))
+        total = time.perf_counter() - start
+        print(f"{name}:\n"
+              f"\tpropagation only: {propagation:.2f} s\n"
+              f"\twith callbacks: {total:.2f} s\n"
+              f"\tmilk: {accumulated['milk']:.1f} kg, "
+              f"nitrogen: {accumulated['nitrogen']:.1f} g")
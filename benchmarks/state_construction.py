@@ -0,0 +1,67 @@
+"""
+Microbenchmarks the construction of ``State`` objects.
+
+``LegacyState`` is the ``State`` dataclass as it was before it used slots and
+before ``State._trusted`` was added. Run from the repository root with::
+
+    python benchmarks/state_construction.py
+"""
+import sys
+import timeit
+from dataclasses import dataclass, asdict
+from cow_builder.state import State
+
+
+@dataclass(repr=True, eq=True, frozen=True)
+class LegacyState:
+    state: str
+    days_in_milk: int
+    lactation_number: int
+    days_pregnant: int
+    milk_output: float
+
+    def __post_init__(self):
+        if self.days_pregnant != 0 and self.state != 'Pregnant':
+            raise ValueError("The days_pregnant variable cannot be more than 0 if the state variable is not Pregnant.")
+        if self.days_pregnant == 0 and self.state == 'Pregnant':
+            raise ValueError("The days_pregnant variable cannot be 0 if the state variable is Pregnant.")
+        if not type(self.state) == str:
+            raise TypeError("The state variable is not of type str.")
+        if not type(self.days_in_milk) == int:
+            raise TypeError("The days_in_milk variable is not of type int.")
+        if not type(self.lactation_number) == int:
+            raise TypeError("The lactation_number variable is not of type int.")
+        if not type(self.days_pregnant) == int:
+            raise TypeError("The days_pregnant variable is not of type int.")
+        if not type(self.milk_output) == float:
+            raise TypeError("The milk_output variable is not of type float.")
+
+    def mutate(self, **kwargs):
+        var = asdict(self)
+        for key, value in kwargs.items():
+            var[key] = value
+        return LegacyState(**var)
+
+
+def time_per_call(statement: str, number=200_000, repeat=5) -> float:
+    """Returns the best time per call in nanoseconds."""
+    timings = timeit.repeat(statement, number=number, repeat=repeat,
+                            globals=globals())
+    return min(timings) / number * 1e9
+
+
+if __name__ == '__main__':
+    legacy_state = LegacyState('Pregnant', 245, 3, 165, 20.5)
+    state = State('Pregnant', 245, 3, 165, 20.5)
+    benchmarks = (
+        ("construction, before", "LegacyState('Pregnant', 245, 3, 165, 20.5)"),
+        ("construction, validated", "State('Pregnant', 245, 3, 165, 20.5)"),
+        ("construction, trusted", "State._trusted('Pregnant', 245, 3, 165, 20.5)"),
+        ("mutate, before", "legacy_state.mutate(days_in_milk=246)"),
+        ("mutate, after", "state.mutate(days_in_milk=246)"),
+    )
+    for name, statement in benchmarks:
+        print(f"{name}: {time_per_call(statement):.0f} ns")
+    print(f"instance size, before: "
+          f"{sys.getsizeof(legacy_state) + sys.getsizeof(legacy_state.__dict__)} bytes")
+    print(f"instance size, after: {sys.getsizeof(state)} bytes")
@@ -0,0 +1,232 @@
+"""
+Benchmarks the NumPy state enumeration of ``DigitalCow.generate_total_states``
+against the loop that generated the states one ``State`` object at a time.
+
+Run from the repository root with::
+
+    python benchmarks/state_enumeration.py
+"""
+import time
+from cow_builder.digital_cow import DigitalCow, set_milkbot_variables, \
+    milk_production
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.state import State
+from cow_builder.state_space import enumerate_states
+
+
+def legacy_generate_total_states(cow: DigitalCow, dim_limit: int,
+                                 ln_limit: int) -> tuple:
+    """The state generation loop as it was before the NumPy enumeration."""
+    if dim_limit is None:
+        dim_limit = cow.herd.days_in_milk_limit
+    if ln_limit is None:
+        ln_limit = cow.herd.lactation_number_limit
+    total_states = []
+    days_in_milk = 0
+    lactation_number = 0
+    days_pregnant_start = 1
+    days_pregnant = 1
+    simulated_dp_limit = 1
+    stop_pregnant_state = False
+    last_pregnancy = False
+    not_heifer = False
+    dp_limit = cow.herd.get_days_pregnant_limit(lactation_number)
+    vwp = cow.herd.get_voluntary_waiting_period(lactation_number)
+    insemination_window = cow.herd.get_insemination_window(lactation_number)
+
+    while lactation_number <= ln_limit:
+        for life_state in ['Open', 'DoNotBreed', 'Pregnant', 'Exit']:
+            milkbot_variables = set_milkbot_variables(lactation_number)
+            if life_state == 'Pregnant':
+                milk_output = None
+            else:
+                temp_state = State(life_state, days_in_milk,
+                                   lactation_number, 0, 0.0)
+                milk_output = milk_production(milkbot_variables,
+                                              temp_state,
+                                              cow.herd.get_days_pregnant_limit(
+                                                  temp_state.lactation_number),
+                                              cow.herd.get_duration_dry(
+                                                  temp_state.lactation_number))
+            # Calculates the milk output for the cow at every state.
+
+            match life_state:
+                case 'Open':
+                    if days_in_milk <= vwp + insemination_window:
+                        if milk_output >= cow.herd.milk_threshold or \
+                                lactation_number == 0:
+                            new_state = State(life_state, days_in_milk,
+                                              lactation_number, 0,
+                                              milk_output)
+                            total_states.append(new_state)
+
+                case 'DoNotBreed':
+                    if days_in_milk > vwp + insemination_window and \
+                            lactation_number != 0:
+                        if milk_output >= cow.herd.milk_threshold or \
+                                lactation_number == 0:
+                            new_state = State(life_state, days_in_milk,
+                                              lactation_number, 0,
+                                              milk_output)
+                            total_states.append(new_state)
+
+                        if last_pregnancy:
+                            milkbot_variables = set_milkbot_variables(
+                                lactation_number + 1)
+                            temp_state = State(life_state,
+                                               days_in_milk,
+                                               lactation_number + 1, 0,
+                                               0.0)
+                            milk_output = milk_production(
+                                milkbot_variables,
+                                temp_state,
+                                cow.herd.get_days_pregnant_limit(
+                                    temp_state.lactation_number),
+                                cow.herd.get_duration_dry(
+                                    temp_state.lactation_number))
+                            if milk_output >= cow.herd.milk_threshold or \
+                                    lactation_number == 0:
+                                new_state = State(life_state,
+                                                  days_in_milk,
+                                                  lactation_number + 1,
+                                                  0,
+                                                  milk_output)
+                                total_states.append(new_state)
+
+                case 'Pregnant':
+                    if vwp < days_in_milk <= vwp + insemination_window + dp_limit:
+                        if not stop_pregnant_state:
+                            while days_pregnant <= simulated_dp_limit:
+                                temp_state = State(life_state,
+                                                   days_in_milk,
+                                                   lactation_number,
+                                                   days_pregnant,
+                                                   0.0)
+                                milk_output = milk_production(
+                                    milkbot_variables,
+                                    temp_state,
+                                    cow.herd.get_days_pregnant_limit(
+                                        temp_state.lactation_number),
+                                    cow.herd.get_duration_dry(
+                                        temp_state.lactation_number))
+
+                                new_state = State(life_state,
+                                                  days_in_milk,
+                                                  lactation_number,
+                                                  days_pregnant,
+                                                  milk_output)
+                                total_states.append(new_state)
+                                days_pregnant += 1
+
+                            if vwp + insemination_window < days_in_milk < vwp + \
+                                    insemination_window + dp_limit:
+                                days_pregnant_start += 1
+                            days_pregnant = days_pregnant_start
+                            if simulated_dp_limit != dp_limit:
+                                simulated_dp_limit += 1
+                            elif lactation_number == ln_limit:
+                                if days_pregnant_start > dp_limit:
+                                    stop_pregnant_state = True
+                                elif days_in_milk == vwp + dp_limit:
+                                    last_pregnancy = True
+
+                case 'Exit':
+                    new_state = State(life_state, days_in_milk,
+                                      lactation_number, 0,
+                                      milk_output)
+                    total_states.append(new_state)
+                    if last_pregnancy:
+                        new_state = State(life_state, days_in_milk,
+                                          lactation_number + 1, 0,
+                                          milk_output)
+                        total_states.append(new_state)
+
+        if days_in_milk == dim_limit - 1 and not_heifer:
+            new_state = State('Exit', dim_limit,
+                              lactation_number, 0, 0.0)
+            total_states.append(new_state)
+            if lactation_number == ln_limit:
+                new_state = State('Exit', dim_limit,
+                                  lactation_number + 1, 0, 0.0)
+                total_states.append(new_state)
+            days_in_milk = 0
+            days_pregnant = 1
+            days_pregnant_start = 1
+            simulated_dp_limit = 1
+            lactation_number += 1
+            dp_limit = cow.herd.get_days_pregnant_limit(lactation_number)
+            vwp = cow.herd.get_voluntary_waiting_period(lactation_number)
+            insemination_window = cow.herd.get_insemination_window(
+                lactation_number)
+
+        else:
+            days_in_milk += 1
+
+        temp_state = State('DoNotBreed', days_in_milk - 1,
+                           lactation_number, 0, 0.0)
+        milk_output = milk_production(milkbot_variables,
+                                      temp_state,
+                                      cow.herd.get_days_pregnant_limit(
+                                          temp_state.lactation_number),
+                                      cow.herd.get_duration_dry(
+                                          temp_state.lactation_number))
+
+        if milk_output < cow.herd.milk_threshold and not_heifer:
+            days_in_milk = 0
+            days_pregnant = 1
+            days_pregnant_start = 1
+            simulated_dp_limit = 1
+            lactation_number += 1
+            dp_limit = cow.herd.get_days_pregnant_limit(lactation_number)
+            vwp = cow.herd.get_voluntary_waiting_period(lactation_number)
+            insemination_window = cow.herd.get_insemination_window(
+                lactation_number)
+
+        if days_in_milk == vwp + insemination_window + dp_limit + 2 and \
+                lactation_number == 0:
+            days_in_milk = 0
+            days_pregnant = 1
+            days_pregnant_start = 1
+            simulated_dp_limit = 1
+            lactation_number += 1
+            dp_limit = cow.herd.get_days_pregnant_limit(lactation_number)
+            vwp = cow.herd.get_voluntary_waiting_period(lactation_number)
+            insemination_window = cow.herd.get_insemination_window(
+                lactation_number)
+            not_heifer = True
+
+    return tuple(total_states)
+
+
+def benchmark(herd: DigitalHerd, dim_limit: int, ln_limit: int, repeat=3):
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=herd, state='Open')
+    timings = {}
+    for name, function in (
+            ('loop', lambda: legacy_generate_total_states(cow, dim_limit, ln_limit)),
+            ('arrays', lambda: enumerate_states(herd, dim_limit, ln_limit)),
+            ('generate_total_states',
+             lambda: cow.generate_total_states(dim_limit, ln_limit))):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    expected = legacy_generate_total_states(cow, dim_limit, ln_limit)
+    cow.generate_total_states(dim_limit, ln_limit)
+    assert tuple(cow.total_states) == expected, "The state spaces are not equal."
+    print(f"dim_limit={dim_limit}, ln_limit={ln_limit}, "
+          f"{len(expected)} states:")
+    for name, seconds in timings.items():
+        print(f"\t{name}: {seconds:.3f} s "
+              f"({timings['loop'] / seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    benchmark(DigitalHerd(), dim_limit=1000, ln_limit=2)
+    benchmark(DigitalHerd(), dim_limit=1000, ln_limit=9)
+    benchmark(DigitalHerd(vwp=(365, 90, 70), insemination_window=(110, 100, 90),
+                          milk_threshold=12, duration_dry=(70, 50)),
+              dim_limit=750, ln_limit=5)
@@ -0,0 +1,33 @@
+"""
+Benchmarks the two methods of ``stationary_distribution`` for a cow with 9
+lactations: the renewal solution and the power method. It prints the time, the
+number of multiplications and the residual of each method, and the difference
+between the distributions.
+
+Run from the repository root with::
+
+    python benchmarks/steady_state.py
+"""
+import time
+import numpy as np
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.steady_state import stationary_distribution
+from cow_builder.transition_matrix import build_transition_matrix
+
+
+if __name__ == '__main__':
+    cow = DigitalCow(days_in_milk=0, lactation_number=0, days_pregnant=0,
+                     age=0, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    tm = build_transition_matrix(cow)
+    distributions = {}
+    for method in ('renewal', 'power'):
+        start = time.perf_counter()
+        distribution, iterations, residual = stationary_distribution(
+            tm, cow.total_states, method=method)
+        distributions[method] = distribution
+        print(f"{method}: {time.perf_counter() - start:.2f} s, "
+              f"{iterations} multiplications, residual {residual:.2e}")
+    difference = np.abs(distributions['renewal'] - distributions['power']).sum()
+    print(f"difference between the distributions: {difference:.2e}")
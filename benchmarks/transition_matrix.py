@@ -0,0 +1,52 @@
+"""
+Benchmarks ``build_transition_matrix`` against assembling the transition matrix
+from ``state_probability_generator``, and checks that both matrices are
+identical.
+
+Run from the repository root with::
+
+    python benchmarks/transition_matrix.py
+"""
+import time
+import numpy as np
+from scipy.sparse import coo_matrix
+from cow_builder.digital_cow import DigitalCow, state_probability_generator
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.transition_matrix import build_transition_matrix
+
+
+def generator_matrix(cow: DigitalCow):
+    """Assembles the transition matrix from the state_probability_generator, as
+    the array_assembler of chain_simulator does."""
+    rows, columns, probabilities = zip(*state_probability_generator(cow))
+    return coo_matrix((np.asarray(probabilities, dtype=np.float64),
+                       (np.asarray(rows), np.asarray(columns))),
+                      shape=(cow.node_count, cow.node_count)).tocsr()
+
+
+def benchmark(dim_limit: int, ln_limit: int):
+    cow = DigitalCow(days_in_milk=0, lactation_number=1, days_pregnant=0,
+                     age=660, herd=DigitalHerd(), state='Open')
+    cow.generate_total_states(dim_limit=dim_limit, ln_limit=ln_limit)
+
+    start = time.perf_counter()
+    expected = generator_matrix(cow)
+    generator_time = time.perf_counter() - start
+    start = time.perf_counter()
+    matrix = build_transition_matrix(cow)
+    builder_time = time.perf_counter() - start
+
+    identical = np.array_equal(expected.indptr, matrix.indptr) and \
+        np.array_equal(expected.indices, matrix.indices) and \
+        np.array_equal(expected.data, matrix.data)
+    assert identical, "The transition matrices are not identical."
+    print(f"dim_limit={dim_limit}, ln_limit={ln_limit}, "
+          f"{cow.node_count} states, {matrix.nnz} transitions:\n"
+          f"\tstate_probability_generator: {generator_time:.2f} s\n"
+          f"\tbuild_transition_matrix: {builder_time:.3f} s "
+          f"({generator_time / builder_time:.0f}x)")
+
+
+if __name__ == '__main__':
+    benchmark(dim_limit=1000, ln_limit=2)
+    benchmark(dim_limit=1000, ln_limit=9)
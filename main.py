@@ -1,11 +1,10 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from cow_builder.digital_cow import DigitalCow, state_probability_generator, \
-    vector_milk_production, vector_nitrogen_emission
+from cow_builder.digital_cow import DigitalCow, vector_milk_production, \
+    vector_nitrogen_emission
 from cow_builder.digital_herd import DigitalHerd
-from chain_simulator.simulation import state_vector_processor
-from chain_simulator.utilities import simulation_accumulator
-from chain_simulator.assembly import array_assembler
+from cow_builder.simulation import simulate
+from cow_builder.transition_matrix import build_transition_matrix
 from functools import partial
 import time
 
@@ -16,13 +15,10 @@ just_another_cow = DigitalCow(
 
 just_another_cow.generate_total_states(dim_limit=1000, ln_limit=9)
 
-tm = array_assembler(just_another_cow.node_count,
-                     state_probability_generator(just_another_cow))
+tm = build_transition_matrix(just_another_cow)
 
 simulated_days = 2800
 steps = 14
-simulation = state_vector_processor(just_another_cow.initial_state_vector, tm,
-                                    simulated_days, steps)
 
 start = time.perf_counter()
 milk_accumulator = {}
@@ -33,7 +29,8 @@ callbacks = {
     "nitrogen": partial(vector_nitrogen_emission, digital_cow=just_another_cow,
                         intermediate_accumulator=nitrogen_accumulator)
 }
-accumulated = simulation_accumulator(simulation, **callbacks)
+accumulated = simulate(just_another_cow.initial_state_vector, tm,
+                       simulated_days, steps, **callbacks)
 end = time.perf_counter()
 print(f"The time needed to iterate over the simulation "
       f"and calculate phenotype output: {end - start} seconds.")
@@ -0,0 +1,356 @@
+"""
+:module: checkpoint
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the Checkpoint class and the functions that save
+    the state of a simulation periodically, and continue a simulation from a
+    saved state.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+A checkpoint holds everything a simulation needs to continue: the day, the state
+vector, or the matrix of state vectors of a herd, the accumulated results of the
+callbacks, and the ``intermediate_accumulator`` dictionaries. It is saved as a
+single ``.npz`` file, which is written to a temporary file first and then
+replaces the checkpoint, so a crash while saving leaves the previous checkpoint
+intact.\n
+A simulation that is continued from a checkpoint gives the same results as a
+simulation that was never interrupted, as long as the step size is the same and
+the day of the checkpoint is a multiple of it. The callbacks are called with the
+day since the start of the first simulation.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the functions:
+************************
+::
+
+    from cow_builder.checkpoint import Checkpoint, continue_simulation, \\
+        resume_simulation, save_checkpoint, load_checkpoint
+
+************************************************************
+
+2. Simulate with checkpoints:
+*****************************
+The simulation starts from a checkpoint on day 0, and saves a checkpoint every
+``interval`` days and on the last day. The ``intermediate_accumulator``
+dictionaries of the callbacks are given by name, so that they are saved too::
+
+    milk_accumulator = {}
+    callbacks = {'milk': partial(vector_milk_production, digital_cow=cow,
+                                 intermediate_accumulator=milk_accumulator)}
+    result = continue_simulation(
+        Checkpoint.start(cow.initial_state_vector), tm, days=10000,
+        step_size=14, path='path/to/run.npz', interval=700,
+        intermediate_accumulators={'milk': milk_accumulator}, **callbacks)
+    result.accumulated['milk']
+
+************************************************************
+
+3. Resume after a crash:
+************************
+The simulation continues from the last saved checkpoint and keeps saving
+checkpoints in the same file. The saved intermediate results are added to the
+given dictionaries::
+
+    milk_accumulator = {}
+    callbacks = {'milk': partial(vector_milk_production, digital_cow=cow,
+                                 intermediate_accumulator=milk_accumulator)}
+    result = resume_simulation(
+        'path/to/run.npz', tm, days=10000, step_size=14, interval=700,
+        intermediate_accumulators={'milk': milk_accumulator}, **callbacks)
+
+************************************************************
+
+4. Fork scenarios from a warm-up:
+*********************************
+The checkpoint of a shared warm-up period is not changed by a simulation that
+continues from it, so several what-if scenarios can continue from it, each with
+its own transition matrix or callbacks::
+
+    warm_up = continue_simulation(Checkpoint.start(initial_state_vector), tm,
+                                  days=1400, step_size=14, **callbacks)
+    save_checkpoint('path/to/warm_up.npz', warm_up)
+    results = {name: continue_simulation(warm_up, scenario_tm, days=5600,
+                                         step_size=14, **callbacks)
+               for name, scenario_tm in scenarios.items()}
+
+************************************************************
+"""
+from dataclasses import dataclass, field
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable
+import numpy as np
+from cow_builder.simulation import DEFAULT_FILL_RATIO, state_vectors
+
+CHECKPOINT_METADATA = 'metadata'
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """
+    The state of a simulation on a day.
+
+    :Attributes:
+        :var day: The day in the simulation.
+        :type day: int
+        :var vector: The state vector of the day, or the matrix of state vectors
+            with a column per cow.
+        :type vector: np.ndarray[np.float64]
+        :var accumulated: The accumulated results of the callbacks, by name. The
+            results of herd callbacks are arrays with a value per cow.
+        :type accumulated: dict[str, float | np.ndarray]
+        :var intermediate_accumulators: The results of the callbacks on each day,
+            by name of the callback.
+        :type intermediate_accumulators: dict[str, dict[int, float]]
+        :var metadata: Values that are saved with the checkpoint. They must be
+            serializable to JSON.
+        :type metadata: dict
+
+    :Methods:
+        start(initial_state_vector, metadata)\n
+
+    ************************************************************
+    """
+    day: int
+    vector: np.ndarray
+    accumulated: dict = field(default_factory=dict)
+    intermediate_accumulators: dict = field(default_factory=dict)
+    metadata: dict = field(default_factory=dict)
+
+    @classmethod
+    def start(cls, initial_state_vector: np.ndarray, metadata=None) \
+            -> 'Checkpoint':
+        """
+        Creates the checkpoint of day 0 of a simulation.
+
+        :param initial_state_vector: The probability of being in each state on
+            day 0, or a matrix with the state vector of a cow per column.
+        :type initial_state_vector: np.ndarray
+        :param metadata: Values that are saved with the checkpoint. Defaults to
+            None.
+        :type metadata: dict | None
+        :return: The checkpoint of day 0.
+        :rtype: Checkpoint
+        """
+        return cls(day=0,
+                   vector=np.array(initial_state_vector, dtype=np.float64),
+                   metadata=dict(metadata or {}))
+
+
+def save_checkpoint(path, checkpoint: Checkpoint) -> Path:
+    """
+    Saves ``checkpoint`` in the file ``path``. The checkpoint is written to a
+    temporary file in the same directory first, which then replaces ``path``, so
+    that ``path`` always holds a complete checkpoint.
+
+    :param path: The file in which to save the checkpoint, usually with the
+        extension ``.npz``.
+    :type path: str | os.PathLike
+    :param checkpoint: The checkpoint to save.
+    :type checkpoint: Checkpoint
+    :return: The path of the file.
+    :rtype: Path
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {'vector': checkpoint.vector}
+    for number, value in enumerate(checkpoint.accumulated.values()):
+        arrays[f"accumulated_{number}"] = np.asarray(value, dtype=np.float64)
+    for number, accumulator in enumerate(
+            checkpoint.intermediate_accumulators.values()):
+        arrays[f"intermediate_days_{number}"] = np.fromiter(
+            accumulator.keys(), dtype=np.int64, count=len(accumulator))
+        arrays[f"intermediate_values_{number}"] = np.array(
+            list(accumulator.values()), dtype=np.float64)
+    arrays[CHECKPOINT_METADATA] = np.array(json.dumps({
+        'day': checkpoint.day,
+        'accumulated': list(checkpoint.accumulated),
+        'intermediate_accumulators': list(checkpoint.intermediate_accumulators),
+        'metadata': checkpoint.metadata}))
+
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent,
+                                             prefix=f".{path.name}.")
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            np.savez(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        Path(temporary).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def load_checkpoint(path) -> Checkpoint:
+    """
+    Loads a checkpoint saved by ``save_checkpoint``.
+
+    :param path: The file in which the checkpoint is saved.
+    :type path: str | os.PathLike
+    :return: The checkpoint.
+    :rtype: Checkpoint
+    :raises FileNotFoundError: If the file does not exist.
+    :raises ValueError: If the file is not a checkpoint.
+    """
+    with np.load(path, allow_pickle=False) as arrays:
+        if CHECKPOINT_METADATA not in arrays:
+            raise ValueError(f"{path} is not a checkpoint.")
+        header = json.loads(str(arrays[CHECKPOINT_METADATA]))
+        accumulated = {}
+        for number, name in enumerate(header['accumulated']):
+            value = arrays[f"accumulated_{number}"]
+            accumulated[name] = float(value) if value.ndim == 0 else value
+        intermediate_accumulators = {
+            name: dict(zip(arrays[f"intermediate_days_{number}"].tolist(),
+                           arrays[f"intermediate_values_{number}"].tolist()))
+            for number, name in enumerate(header['intermediate_accumulators'])}
+        return Checkpoint(day=header['day'], vector=arrays['vector'],
+                          accumulated=accumulated,
+                          intermediate_accumulators=intermediate_accumulators,
+                          metadata=header['metadata'])
+
+
+def continue_simulation(checkpoint: Checkpoint, transition_matrix, days: int,
+                        step_size=1, step_matrix=None,
+                        fill_ratio=DEFAULT_FILL_RATIO, order=None, path=None,
+                        interval=None, intermediate_accumulators=None,
+                        **callbacks: Callable) -> Checkpoint:
+    """
+    Simulates from the day of ``checkpoint`` until day ``days``, and adds the
+    results of the phenotype callbacks to the accumulated results of the
+    checkpoint, as ``simulation.simulate()``. The checkpoint itself is not
+    changed.
+
+    :param checkpoint: The checkpoint from which to continue, see
+        ``Checkpoint.start`` to start a new simulation.
+    :type checkpoint: Checkpoint
+    :param transition_matrix: A square matrix with the probability of moving from
+        the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param days: The day until which to simulate, counted from the start of the
+        first simulation.
+    :type days: int
+    :param step_size: The interval in days at which the callbacks are called.
+        Defaults to 1.
+    :type step_size: int
+    :param step_matrix: The transition matrix to the power ``step_size``, see
+        ``simulation.state_vectors``. Defaults to None.
+    :type step_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :param fill_ratio: The part of the states with a probability above 0 below
+        which only the rows of those states are multiplied, see
+        ``simulation.state_vectors``. Defaults to ``DEFAULT_FILL_RATIO``.
+    :type fill_ratio: float
+    :param order: A permutation of the states in which the vectors are
+        multiplied, see ``simulation.state_vectors``. Defaults to None.
+    :type order: np.ndarray[int] | None
+    :param path: The file in which a checkpoint is saved every ``interval`` days
+        and on the last day. Defaults to None, which saves no checkpoints.
+    :type path: str | os.PathLike | None
+    :param interval: The minimum number of days between two saved checkpoints.
+        Checkpoints are saved on the days the callbacks are called. Defaults to
+        None, which only saves the checkpoint of the last day.
+    :type interval: int | None
+    :param intermediate_accumulators: The ``intermediate_accumulator``
+        dictionaries of the callbacks, by name. The intermediate results of the
+        checkpoint are added to them before the simulation, and they are saved
+        in each checkpoint. Defaults to None.
+    :type intermediate_accumulators: dict[str, dict[int, float]] | None
+    :param callbacks: The phenotype callbacks, by name.
+    :type callbacks: Callable[[np.ndarray, int, int], float | np.ndarray]
+    :return: The checkpoint of day ``days``.
+    :rtype: Checkpoint
+    :raises ValueError: If ``days`` is before the day of the checkpoint, or the
+        interval is smaller than 1.
+    """
+    if days < checkpoint.day:
+        raise ValueError("The simulation cannot end before the day of the "
+                         "checkpoint.")
+    if interval is not None and interval < 1:
+        raise ValueError("The interval must be at least 1 day.")
+    accumulated = {name: np.copy(value) if isinstance(value, np.ndarray)
+                   else value for name, value in checkpoint.accumulated.items()}
+    for name in callbacks:
+        accumulated.setdefault(name, 0)
+    intermediate_accumulators = dict(intermediate_accumulators or {})
+    for name, accumulator in checkpoint.intermediate_accumulators.items():
+        intermediate_accumulators.setdefault(name, {})
+        intermediate_accumulators[name].update(accumulator)
+
+    def snapshot(vector: np.ndarray, day: int) -> Checkpoint:
+        return Checkpoint(day=day, vector=vector, accumulated=accumulated,
+                          intermediate_accumulators=intermediate_accumulators,
+                          metadata=checkpoint.metadata)
+
+    vector = checkpoint.vector
+    previous_day = saved_day = checkpoint.day
+    for vector, day in state_vectors(checkpoint.vector, transition_matrix,
+                                     days - checkpoint.day, step_size,
+                                     step_matrix, fill_ratio, order):
+        day += checkpoint.day
+        for name, callback in callbacks.items():
+            accumulated[name] += callback(vector, day, day - previous_day)
+        previous_day = day
+        if path is not None and interval is not None and \
+                day - saved_day >= interval and day < days:
+            save_checkpoint(path, snapshot(vector, day))
+            saved_day = day
+    result = Checkpoint(
+        day=previous_day, vector=np.array(vector, dtype=np.float64),
+        accumulated=accumulated,
+        intermediate_accumulators={name: dict(accumulator) for name, accumulator
+                                   in intermediate_accumulators.items()},
+        metadata=dict(checkpoint.metadata))
+    if path is not None:
+        save_checkpoint(path, result)
+    return result
+
+
+def resume_simulation(path, transition_matrix, days: int, step_size=1,
+                      step_matrix=None, fill_ratio=DEFAULT_FILL_RATIO,
+                      order=None, interval=None, intermediate_accumulators=None,
+                      **callbacks: Callable) -> Checkpoint:
+    """
+    Continues a simulation from the checkpoint saved in ``path``, and keeps
+    saving checkpoints in ``path``, see ``continue_simulation``.
+
+    :param path: The file in which the checkpoint is saved.
+    :type path: str | os.PathLike
+    :param transition_matrix: The transition matrix of the simulation.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param days: The day until which to simulate, counted from the start of the
+        first simulation.
+    :type days: int
+    :param step_size: The interval in days at which the callbacks are called. It
+        must be the step size of the interrupted simulation to give the same
+        results. Defaults to 1.
+    :type step_size: int
+    :param step_matrix: The transition matrix to the power ``step_size``.
+        Defaults to None.
+    :type step_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :param fill_ratio: See ``simulation.state_vectors``. Defaults to
+        ``DEFAULT_FILL_RATIO``.
+    :type fill_ratio: float
+    :param order: See ``simulation.state_vectors``. Defaults to None.
+    :type order: np.ndarray[int] | None
+    :param interval: The minimum number of days between two saved checkpoints.
+        Defaults to None, which only saves the checkpoint of the last day.
+    :type interval: int | None
+    :param intermediate_accumulators: The ``intermediate_accumulator``
+        dictionaries of the callbacks, by name. Defaults to None.
+    :type intermediate_accumulators: dict[str, dict[int, float]] | None
+    :param callbacks: The phenotype callbacks, by name.
+    :type callbacks: Callable[[np.ndarray, int, int], float | np.ndarray]
+    :return: The checkpoint of day ``days``.
+    :rtype: Checkpoint
+    :raises FileNotFoundError: If no checkpoint is saved in ``path``.
+    :raises ValueError: If ``days`` is before the day of the checkpoint.
+    """
+    return continue_simulation(load_checkpoint(path), transition_matrix, days,
+                               step_size, step_matrix, fill_ratio, order, path,
+                               interval, intermediate_accumulators, **callbacks)
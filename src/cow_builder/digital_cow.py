@@ -117,6 +117,12 @@ b) with parameters::
 
     cow.generate_total_states(dim_limit=750, ln_limit=9)
 
+The states are shared by all cows in the herd and are only generated once, see
+the ``digital_herd`` module. The cow keeps the index of its current state in
+the states::
+
+    index = cow.current_state_index
+
 ************************************************************
 
 5. Using the ``state_probability_generator``:
@@ -151,15 +157,24 @@ instance variables and functions.
         "nitrogen": partial(vector_nitrogen_emission, digital_cow=cow)
     }
 
+The phenotypes of the states are kept as arrays in ``cow.phenotypes``, see the
+``phenotypes`` module. By default a vector phenotype is the mean over the states
+with a probability above 0. With ``mode='probability'`` the states are weighted
+by their probability instead::
+
+    partial(vector_milk_production, digital_cow=cow, mode='probability')
+
 ************************************************************
 """
 from numpy import ndarray
 from cow_builder.digital_herd import DigitalHerd
 from cow_builder.state import State
+from cow_builder.state_space import StateTable
+from cow_builder.phenotypes import StatePhenotypes, phenotype_expectation
 import math
 from typing import Generator
 import numpy as np
-from functools import cache
+from cow_builder.function_cache import bounded_cache
 
 
 class DigitalCow:
@@ -178,10 +193,22 @@ class DigitalCow:
         :type _age_at_first_heat: int | None
         :var __life_states: A list of all possible life states the cow can be in.
         :type __life_states: list[str]
-        :var _total_states: A tuple of ``State`` objects containing all possible
-            states this cow can be in or transition to. Filled by
-            ``self.generate_total_states()``.
-        :type _total_states: tuple[State] | None
+        :var _total_states: A ``StateTable`` containing all possible
+            states this cow can be in or transition to, if they are set with
+            ``self.total_states``. None if the cow uses the shared states of its
+            herd, which ``self.generate_total_states()`` selects.
+        :type _total_states: StateTable | None
+        :var _edge_count: The number of possible transitions between the states
+            in ``_total_states``. Counted the first time it is needed.
+        :type _edge_count: int | None
+        :var _current_state_index: The states, the current state, and the index
+            of the current state in the states, when the index was last looked
+            up. The index is looked up again when either of them has changed.
+        :type _current_state_index: tuple[StateTable, State, int] | None
+        :var _phenotypes: The phenotypes of the states in ``total_states``,
+            created the first time they are needed and again when the states
+            have changed.
+        :type _phenotypes: StatePhenotypes | None
         :var _milkbot_variables: A tuple of 4 floats used for the
             ``self.milk_production`` function.
 
@@ -197,7 +224,9 @@ class DigitalCow:
         __init__(days_in_milk, lactation_number, days_pregnant, age_at_first_heat,
         herd, state, precision)\n
         generate_total_states(dim_limit, ln_limit)\n
+        set_generated_states(total_states, dim_limit, ln_limit, edge_count)\n
         probability_state_change(state_from, state_to)\n
+        transitions(state_from)\n
         possible_new_states(state_from)\n
 
     ************************************************************
@@ -238,6 +267,9 @@ class DigitalCow:
         self._total_states = None
         self._generated_days_in_milk = None
         self._generated_lactation_numbers = None
+        self._edge_count = None
+        self._current_state_index = None
+        self._phenotypes = None
         self._age = age
         self._diet_cp_cu = diet_cp_cu
         self._diet_cp_fo = diet_cp_fo
@@ -263,8 +295,10 @@ class DigitalCow:
 
     def generate_total_states(self, dim_limit=None, ln_limit=None) -> None:
         """
-        Generates a tuple of ``State`` objects that represent all possible
-        states of the ``DigitalCow`` instance.
+        Generates a ``StateTable`` that represents all possible states of the
+        ``DigitalCow`` instance. The states are shared by all cows in its herd,
+        and are only generated if the herd has not generated them yet, see
+        ``DigitalHerd.get_total_states()``.
 
         :param dim_limit: The limit of days in milk for which states should
             be generated. Defaults to the limit of its herd.
@@ -277,183 +311,36 @@ class DigitalCow:
             dim_limit = self.herd.days_in_milk_limit
         if ln_limit is None:
             ln_limit = self.herd.lactation_number_limit
-        total_states = []
-        days_in_milk = 0
-        lactation_number = 0
-        days_pregnant_start = 1
-        days_pregnant = 1
-        simulated_dp_limit = 1
-        stop_pregnant_state = False
-        last_pregnancy = False
-        not_heifer = False
-        dp_limit = self.herd.get_days_pregnant_limit(lactation_number)
-        vwp = self.herd.get_voluntary_waiting_period(lactation_number)
-        insemination_window = self.herd.get_insemination_window(lactation_number)
-
-        while lactation_number <= ln_limit:
-            for life_state in self.__life_states:
-                self.milkbot_variables = set_milkbot_variables(lactation_number)
-                if life_state == 'Pregnant':
-                    milk_output = None
-                else:
-                    temp_state = State(life_state, days_in_milk,
-                                       lactation_number, 0, 0.0)
-                    milk_output = milk_production(self.milkbot_variables,
-                                                  temp_state,
-                                                  self.herd.get_days_pregnant_limit(
-                                                      temp_state.lactation_number),
-                                                  self.herd.get_duration_dry(
-                                                      temp_state.lactation_number))
-                # Calculates the milk output for the cow at every state.
-
-                match life_state:
-                    case 'Open':
-                        if days_in_milk <= vwp + insemination_window:
-                            if milk_output >= self.herd.milk_threshold or \
-                                    lactation_number == 0:
-                                new_state = State(life_state, days_in_milk,
-                                                  lactation_number, 0,
-                                                  milk_output)
-                                total_states.append(new_state)
-
-                    case 'DoNotBreed':
-                        if days_in_milk > vwp + insemination_window and \
-                                lactation_number != 0:
-                            if milk_output >= self.herd.milk_threshold or \
-                                    lactation_number == 0:
-                                new_state = State(life_state, days_in_milk,
-                                                  lactation_number, 0,
-                                                  milk_output)
-                                total_states.append(new_state)
-
-                            if last_pregnancy:
-                                self.milkbot_variables = set_milkbot_variables(
-                                    lactation_number + 1)
-                                temp_state = State(life_state,
-                                                   days_in_milk,
-                                                   lactation_number + 1, 0,
-                                                   0.0)
-                                milk_output = milk_production(
-                                    self.milkbot_variables,
-                                    temp_state,
-                                    self.herd.get_days_pregnant_limit(
-                                        temp_state.lactation_number),
-                                    self.herd.get_duration_dry(
-                                        temp_state.lactation_number))
-                                if milk_output >= self.herd.milk_threshold or \
-                                        lactation_number == 0:
-                                    new_state = State(life_state,
-                                                      days_in_milk,
-                                                      lactation_number + 1,
-                                                      0,
-                                                      milk_output)
-                                    total_states.append(new_state)
-
-                    case 'Pregnant':
-                        if vwp < days_in_milk <= vwp + insemination_window + dp_limit:
-                            if not stop_pregnant_state:
-                                while days_pregnant <= simulated_dp_limit:
-                                    temp_state = State(life_state,
-                                                       days_in_milk,
-                                                       lactation_number,
-                                                       days_pregnant,
-                                                       0.0)
-                                    milk_output = milk_production(
-                                        self.milkbot_variables,
-                                        temp_state,
-                                        self.herd.get_days_pregnant_limit(
-                                            temp_state.lactation_number),
-                                        self.herd.get_duration_dry(
-                                            temp_state.lactation_number))
-
-                                    new_state = State(life_state,
-                                                      days_in_milk,
-                                                      lactation_number,
-                                                      days_pregnant,
-                                                      milk_output)
-                                    total_states.append(new_state)
-                                    days_pregnant += 1
-
-                                if vwp + insemination_window < days_in_milk < vwp + \
-                                        insemination_window + dp_limit:
-                                    days_pregnant_start += 1
-                                days_pregnant = days_pregnant_start
-                                if simulated_dp_limit != dp_limit:
-                                    simulated_dp_limit += 1
-                                elif lactation_number == ln_limit:
-                                    if days_pregnant_start > dp_limit:
-                                        stop_pregnant_state = True
-                                    elif days_in_milk == vwp + dp_limit:
-                                        last_pregnancy = True
-
-                    case 'Exit':
-                        new_state = State(life_state, days_in_milk,
-                                          lactation_number, 0,
-                                          milk_output)
-                        total_states.append(new_state)
-                        if last_pregnancy:
-                            new_state = State(life_state, days_in_milk,
-                                              lactation_number + 1, 0,
-                                              milk_output)
-                            total_states.append(new_state)
-
-            if days_in_milk == dim_limit - 1 and not_heifer:
-                new_state = State('Exit', dim_limit,
-                                  lactation_number, 0, 0.0)
-                total_states.append(new_state)
-                if lactation_number == ln_limit:
-                    new_state = State('Exit', dim_limit,
-                                      lactation_number + 1, 0, 0.0)
-                    total_states.append(new_state)
-                days_in_milk = 0
-                days_pregnant = 1
-                days_pregnant_start = 1
-                simulated_dp_limit = 1
-                lactation_number += 1
-                dp_limit = self.herd.get_days_pregnant_limit(lactation_number)
-                vwp = self.herd.get_voluntary_waiting_period(lactation_number)
-                insemination_window = self.herd.get_insemination_window(
-                    lactation_number)
-
-            else:
-                days_in_milk += 1
-
-            temp_state = State('DoNotBreed', days_in_milk - 1,
-                               lactation_number, 0, 0.0)
-            milk_output = milk_production(self.milkbot_variables,
-                                          temp_state,
-                                          self.herd.get_days_pregnant_limit(
-                                              temp_state.lactation_number),
-                                          self.herd.get_duration_dry(
-                                              temp_state.lactation_number))
+        self.herd.get_total_states(dim_limit, ln_limit)
+        self.total_states = None
+        self._generated_days_in_milk = dim_limit
+        self._generated_lactation_numbers = ln_limit
 
-            if milk_output < self.herd.milk_threshold and not_heifer:
-                days_in_milk = 0
-                days_pregnant = 1
-                days_pregnant_start = 1
-                simulated_dp_limit = 1
-                lactation_number += 1
-                dp_limit = self.herd.get_days_pregnant_limit(lactation_number)
-                vwp = self.herd.get_voluntary_waiting_period(lactation_number)
-                insemination_window = self.herd.get_insemination_window(
-                    lactation_number)
-
-            if days_in_milk == vwp + insemination_window + dp_limit + 2 and \
-                    lactation_number == 0:
-                days_in_milk = 0
-                days_pregnant = 1
-                days_pregnant_start = 1
-                simulated_dp_limit = 1
-                lactation_number += 1
-                dp_limit = self.herd.get_days_pregnant_limit(lactation_number)
-                vwp = self.herd.get_voluntary_waiting_period(lactation_number)
-                insemination_window = self.herd.get_insemination_window(
-                    lactation_number)
-                not_heifer = True
-
-        self.total_states = tuple(total_states)
+    def set_generated_states(self, total_states: StateTable, dim_limit: int,
+                             ln_limit: int, edge_count=None) -> None:
+        """
+        Sets states that were generated elsewhere for ``dim_limit`` and
+        ``ln_limit``, such as states loaded from a ``MatrixCache``. Unlike
+        ``self.total_states``, the limits are kept, so the transitions of the
+        cow are those of states generated with ``self.generate_total_states()``.
+
+        :param total_states: The states, generated for ``dim_limit`` and
+            ``ln_limit``.
+        :type total_states: StateTable
+        :param dim_limit: The limit of days in milk for which the states were
+            generated.
+        :type dim_limit: int
+        :param ln_limit: The limit of lactation numbers for which the states were
+            generated.
+        :type ln_limit: int
+        :param edge_count: The number of possible transitions between the states.
+            Defaults to None, which counts them the first time they are needed.
+        :type edge_count: int | None
+        """
+        self.total_states = total_states
         self._generated_days_in_milk = dim_limit
         self._generated_lactation_numbers = ln_limit
+        self._edge_count = edge_count
 
     def probability_state_change(self, state_from: State, state_to: State) -> float:
         """
@@ -473,20 +360,62 @@ class DigitalCow:
                 in self.__life_states:
             raise ValueError("State variables of a State object must be defined in "
                              "self.__life_states")
+        if state_to not in self.possible_new_states(state_from):
+            return 0
+        return self.__transition_probability(state_from, state_to)
+
+    def transitions(self, state_from: State) -> tuple:
+        """
+        Determines all states ``state_from`` can transition into, and calculates
+        the probability of each transition. The possible new states are determined
+        only once, unlike when ``self.probability_state_change()`` is called for
+        each state pair.
+
+        :param state_from: The state from which to transition. It must be in
+            ``total_states``.
+        :type state_from: State
+        :returns: A tuple containing a tuple for each transition, with the index
+            of the state transitioned into in ``total_states`` and the probability
+            of the transition. An Exit state transitions into itself.
+        :rtype: tuple[tuple[int, float]]
+        :raises ValueError: If a state transitioned into is not in
+            ``total_states``.
+        """
+        new_states = self.possible_new_states(state_from)
+        if not new_states:
+            return ((self.total_states.index(state_from), 1),)
+        if len(new_states) == 1:
+            return ((self.total_states.index(new_states[0]), 1),)
+        return tuple((self.total_states.index(state_to),
+                      self.__transition_probability(state_from, state_to))
+                     for state_to in new_states)
+
+    def __transition_probability(self, state_from: State, state_to: State) -> \
+            float:
+        """
+        Calculates the probability of transitioning from ``state_from`` to
+        ``state_to``, given that ``state_to`` is one of the possible new states of
+        ``state_from``.
+
+        :param state_from: The state from which to transition.
+        :type state_from: State
+        :param state_to: The state to transition into.
+        :type state_to: State
+        :returns: The probability of transitioning from ``state_from`` to
+            ``state_to``.
+        :rtype: float
+        """
         vwp = self.herd.get_voluntary_waiting_period(state_from.lactation_number)
         insemination_window = self.herd.get_insemination_window(
             state_from.lactation_number)
         dp_limit = self.herd.get_days_pregnant_limit(state_from.lactation_number)
         duration_dry = self.herd.get_duration_dry(state_from.lactation_number)
 
-        if state_to not in self.possible_new_states(state_from):
-            return 0
-
         if state_from.days_in_milk == self._generated_days_in_milk or \
                 (state_from.days_in_milk == vwp + insemination_window +
                  dp_limit and state_from.lactation_number == 0) and \
-                state_to == State('Exit', state_from.days_in_milk,
-                                  state_from.lactation_number, 0, 0.0):
+                state_to == State._trusted('Exit', state_from.days_in_milk,
+                                           state_from.lactation_number, 0, 0.0):
             return 1
 
         def __probability_ovulation():
@@ -690,9 +619,9 @@ class DigitalCow:
         :raises ValueError: If the state of ``state_from`` is not valid.
         """
 
-        states_to = [State('Exit',
-                           state_from.days_in_milk + 1,
-                           state_from.lactation_number, 0, 0.0)]
+        states_to = [State._trusted('Exit',
+                                    state_from.days_in_milk + 1,
+                                    state_from.lactation_number, 0, 0.0)]
         if state_from.days_in_milk == self._generated_days_in_milk - 1 and \
                 state_from.state != 'Exit':
             return tuple(states_to)
@@ -709,10 +638,10 @@ class DigitalCow:
                     if vwp <= state_from.days_in_milk <= vwp + insemination_window:
                         self.milkbot_variables = set_milkbot_variables(
                             state_from.lactation_number)
-                        temp_state = State('Pregnant',
-                                           state_from.days_in_milk + 1,
-                                           state_from.lactation_number,
-                                           1, 0.0)
+                        temp_state = State._trusted('Pregnant',
+                                                    state_from.days_in_milk + 1,
+                                                    state_from.lactation_number,
+                                                    1, 0.0)
                         milk_output = milk_production(
                             self.milkbot_variables,
                             temp_state,
@@ -722,7 +651,7 @@ class DigitalCow:
                                 temp_state.lactation_number))
 
                         #
-                        states_to.append(State(
+                        states_to.append(State._trusted(
                             'Pregnant',
                             state_from.days_in_milk + 1,
                             state_from.lactation_number, 1, milk_output))
@@ -731,10 +660,10 @@ class DigitalCow:
                             state_from.lactation_number != 0:
                         self.milkbot_variables = set_milkbot_variables(
                             state_from.lactation_number)
-                        temp_state = State('DoNotBreed',
-                                           state_from.days_in_milk + 1,
-                                           state_from.lactation_number,
-                                           0, 0.0)
+                        temp_state = State._trusted('DoNotBreed',
+                                                    state_from.days_in_milk + 1,
+                                                    state_from.lactation_number,
+                                                    0, 0.0)
                         milk_output = milk_production(
                             self.milkbot_variables,
                             temp_state,
@@ -743,7 +672,7 @@ class DigitalCow:
                             self.herd.get_duration_dry(
                                 temp_state.lactation_number))
 
-                        states_to.append(State(
+                        states_to.append(State._trusted(
                             'DoNotBreed',
                             state_from.days_in_milk + 1,
                             state_from.lactation_number, 0, milk_output))
@@ -751,10 +680,10 @@ class DigitalCow:
                     elif state_from.days_in_milk < vwp + insemination_window:
                         self.milkbot_variables = set_milkbot_variables(
                             state_from.lactation_number)
-                        temp_state = State('Open',
-                                           state_from.days_in_milk + 1,
-                                           state_from.lactation_number,
-                                           0, 0.0)
+                        temp_state = State._trusted('Open',
+                                                    state_from.days_in_milk + 1,
+                                                    state_from.lactation_number,
+                                                    0, 0.0)
                         milk_output = milk_production(
                             self.milkbot_variables,
                             temp_state,
@@ -762,7 +691,7 @@ class DigitalCow:
                                 temp_state.lactation_number),
                             self.herd.get_duration_dry(
                                 temp_state.lactation_number))
-                        states_to.append(State(
+                        states_to.append(State._trusted(
                             'Open',
                             state_from.days_in_milk + 1,
                             state_from.lactation_number, 0, milk_output))
@@ -771,11 +700,11 @@ class DigitalCow:
                 if state_from.milk_output > self.herd.milk_threshold:
                     self.milkbot_variables = set_milkbot_variables(
                         state_from.lactation_number)
-                    temp_state = State('DoNotBreed',
-                                       state_from.days_in_milk + 1,
-                                       state_from.lactation_number,
-                                       0,
-                                       0.0)
+                    temp_state = State._trusted('DoNotBreed',
+                                                state_from.days_in_milk + 1,
+                                                state_from.lactation_number,
+                                                0,
+                                                0.0)
                     milk_output = milk_production(
                         self.milkbot_variables,
                         temp_state,
@@ -784,7 +713,7 @@ class DigitalCow:
                         self.herd.get_duration_dry(
                             temp_state.lactation_number))
                     if milk_output >= self.herd.milk_threshold:
-                        states_to.append(State(
+                        states_to.append(State._trusted(
                             'DoNotBreed',
                             state_from.days_in_milk + 1,
                             state_from.lactation_number, 0, milk_output))
@@ -800,7 +729,7 @@ class DigitalCow:
                             state_from.lactation_number + 1)
                         if state_from.lactation_number == \
                                 self._generated_lactation_numbers:
-                            temp_state = State(
+                            temp_state = State._trusted(
                                 'DoNotBreed', state_from.days_in_milk + 1,
                                 state_from.lactation_number + 1, 0, 0.0)
                             milk_output = milk_production(
@@ -810,13 +739,13 @@ class DigitalCow:
                                     temp_state.lactation_number),
                                 self.herd.get_duration_dry(
                                     temp_state.lactation_number))
-                            states_to.append(State(
+                            states_to.append(State._trusted(
                                 'DoNotBreed', state_from.days_in_milk + 1,
                                 state_from.lactation_number + 1, 0,
                                 milk_output))
 
                         else:
-                            temp_state = State(
+                            temp_state = State._trusted(
                                 'Open', 0,
                                 state_from.lactation_number + 1, 0, 0.0)
                             milk_output = milk_production(
@@ -826,7 +755,7 @@ class DigitalCow:
                                     temp_state.lactation_number),
                                 self.herd.get_duration_dry(
                                     temp_state.lactation_number))
-                            states_to.append(State(
+                            states_to.append(State._trusted(
                                 'Open',
                                 0, state_from.lactation_number + 1,
                                 0, milk_output))
@@ -834,10 +763,10 @@ class DigitalCow:
                     elif state_from.days_pregnant < dp_limit:
                         self.milkbot_variables = set_milkbot_variables(
                             state_from.lactation_number)
-                        temp_state = State('Pregnant',
-                                           state_from.days_in_milk + 1,
-                                           state_from.lactation_number,
-                                           state_from.days_pregnant + 1, 0.0)
+                        temp_state = State._trusted('Pregnant',
+                                                    state_from.days_in_milk + 1,
+                                                    state_from.lactation_number,
+                                                    state_from.days_pregnant + 1, 0.0)
                         milk_output = milk_production(
                             self.milkbot_variables,
                             temp_state,
@@ -845,17 +774,17 @@ class DigitalCow:
                                 temp_state.lactation_number),
                             self.herd.get_duration_dry(
                                 temp_state.lactation_number))
-                        states_to.append(State(
+                        states_to.append(State._trusted(
                             'Pregnant',
                             state_from.days_in_milk + 1,
                             state_from.lactation_number,
                             state_from.days_pregnant + 1, milk_output))
                         if state_from.days_in_milk < vwp + insemination_window:
                             self.milkbot_variables = set_milkbot_variables(state_from.lactation_number)
-                            temp_state = State('Open',
-                                               state_from.days_in_milk + 1,
-                                               state_from.lactation_number,
-                                               0, 0.0)
+                            temp_state = State._trusted('Open',
+                                                        state_from.days_in_milk + 1,
+                                                        state_from.lactation_number,
+                                                        0, 0.0)
                             milk_output = milk_production(
                                 self.milkbot_variables,
                                 temp_state,
@@ -863,7 +792,7 @@ class DigitalCow:
                                     temp_state.lactation_number),
                                 self.herd.get_duration_dry(
                                     temp_state.lactation_number))
-                            states_to.append(State(
+                            states_to.append(State._trusted(
                                 'Open',
                                 state_from.days_in_milk + 1,
                                 state_from.lactation_number, 0, milk_output))
@@ -872,10 +801,10 @@ class DigitalCow:
                                 and state_from.lactation_number != 0:
                             self.milkbot_variables = set_milkbot_variables(
                                 state_from.lactation_number)
-                            temp_state = State('DoNotBreed',
-                                               state_from.days_in_milk + 1,
-                                               state_from.lactation_number,
-                                               0, 0.0)
+                            temp_state = State._trusted('DoNotBreed',
+                                                        state_from.days_in_milk + 1,
+                                                        state_from.lactation_number,
+                                                        0, 0.0)
                             milk_output = milk_production(
                                 self.milkbot_variables,
                                 temp_state,
@@ -883,7 +812,7 @@ class DigitalCow:
                                     temp_state.lactation_number),
                                 self.herd.get_duration_dry(
                                     temp_state.lactation_number))
-                            states_to.append(State(
+                            states_to.append(State._trusted(
                                 'DoNotBreed',
                                 state_from.days_in_milk + 1,
                                 state_from.lactation_number, 0, milk_output))
@@ -1007,13 +936,22 @@ class DigitalCow:
         return self._current_state
 
     @property
-    def total_states(self) -> tuple:
-        """A generated tuple of ``State`` objects that the cow can be in."""
+    def total_states(self) -> StateTable:
+        """A generated ``StateTable`` of the states that the cow can be in. It
+        returns a ``State`` object for each index, like a tuple. Unless other
+        states are set, these are the shared states of the herd. Other states
+        can be set as a ``StateTable`` or as ``State`` objects in any order."""
+        if self.shares_states:
+            return self.herd.get_total_states(self._generated_days_in_milk,
+                                              self._generated_lactation_numbers)
         return self._total_states
 
     @total_states.setter
     def total_states(self, states):
+        if states is not None and not isinstance(states, StateTable):
+            states = StateTable.from_states(states)
         self._total_states = states
+        self._edge_count = None
 
     @property
     def milkbot_variables(self) -> tuple:
@@ -1025,27 +963,74 @@ class DigitalCow:
         if type(var) == tuple and len(var) == 4:
             self._milkbot_variables = var
 
+    @property
+    def generated_limits(self) -> tuple | None:
+        """The limits of days in milk and lactation numbers for which the states
+        were generated, see ``self.generate_total_states()`` and
+        ``self.set_generated_states()``, or None if no states were generated."""
+        if self._generated_days_in_milk is None:
+            return None
+        return self._generated_days_in_milk, self._generated_lactation_numbers
+
+    @property
+    def shares_states(self) -> bool:
+        """Whether the cow uses the shared states of its herd, which is the case
+        after ``self.generate_total_states()`` unless other states are set."""
+        return self._total_states is None and self.herd is not None and \
+            self._generated_days_in_milk is not None
+
     @property
     def edge_count(self) -> int:
-        """The total number of possible transitions."""
-        edge_count = 0
-        for state in self.total_states:
-            edge_count += len(self.possible_new_states(state))
-        return edge_count
+        """The total number of possible transitions. It is counted when the
+        states are generated, or the first time it is needed if the states were
+        set otherwise."""
+        if self.shares_states:
+            return self.herd.get_edge_count(self._generated_days_in_milk,
+                                            self._generated_lactation_numbers)
+        if self._edge_count is None:
+            self._edge_count = sum(len(self.possible_new_states(state))
+                                   for state in self.total_states)
+        return self._edge_count
 
     @property
     def node_count(self) -> int:
         """The total number of ``State`` objects in ``total_states``."""
         return len(self.total_states)
 
+    @property
+    def current_state_index(self) -> int:
+        """The index of the current state in ``total_states``. It is looked up
+        again only when the current state or the states have changed.
+
+        :raises ValueError: If the current state is not in ``total_states``.
+        """
+        total_states = self.total_states
+        if self._current_state_index is None or \
+                self._current_state_index[0] is not total_states or \
+                self._current_state_index[1] is not self._current_state:
+            self._current_state_index = (
+                total_states, self._current_state,
+                total_states.index(self._current_state))
+        return self._current_state_index[2]
+
+    @property
+    def phenotypes(self) -> StatePhenotypes:
+        """The phenotypes of the states in ``total_states``, as arrays aligned
+        with the states. They are created again only when the states have
+        changed."""
+        total_states = self.total_states
+        if self._phenotypes is None or \
+                self._phenotypes.total_states is not total_states:
+            self._phenotypes = StatePhenotypes(self)
+        return self._phenotypes
+
     @property
     def initial_state_vector(self) -> ndarray:
         """A numpy array indicating which state of all states in ``total_states``
         the cow is in."""
-        index = self.total_states.index(self.current_state)
-        vector = len(self.total_states) * [0]
-        vector[index] = 1
-        return np.asarray(vector)
+        vector = np.zeros(len(self.total_states), dtype=np.int64)
+        vector[self.current_state_index] = 1
+        return vector
 
     @property
     def age(self) -> int:
@@ -1088,9 +1073,9 @@ class DigitalCow:
 def state_probability_generator(digital_cow: DigitalCow) -> \
         Generator[tuple[int, int, float], None, None]:
     """
-    A generator that iterates over a tuple of states. It determines the states
+    A generator that iterates over a table of states. It determines the states
     each state can transition into, and calculates the probability of the state
-    change for each pair.
+    change for each pair with ``DigitalCow.transitions()``.
     It returns the indexes of the state pair in the tuple of states and their
     probability.
 
@@ -1098,35 +1083,23 @@ def state_probability_generator(digital_cow: DigitalCow) -> \
         transition probabilities must be calculated.
     :type digital_cow: DigitalCow
     :return:
-        - state_index[state_from]: The index of the ``state_from`` state in the
-            tuple of states.
-        - state_index[state_to]: The index of the ``state_to`` state in the tuple of
+        - index_from: The index of the ``state_from`` state in the
+            table of states.
+        - index_to: The index of the ``state_to`` state in the table of
             states.
         - probability: The probability of moving from ``state_from`` to ``state_to``.
     :rtype:
-        - state_index[state_from]: int
-        - state_index[state_to]: int
+        - index_from: int
+        - index_to: int
         - probability: float
     """
-    state_index = {
-        state: index for index, state in enumerate(digital_cow.total_states)
-    }
-
-    for state_from in state_index:
-        new_states = digital_cow.possible_new_states(state_from)
-        if not new_states:
-            new_states = (state_from,)
-        for state_to in new_states:
-            probability = digital_cow.probability_state_change(state_from, state_to)
-            if len(new_states) == 1:
-                probability = 1
-            yield state_index[state_from], \
-                state_index[state_to], \
-                probability
+    for index_from, state_from in enumerate(digital_cow.total_states):
+        for index_to, probability in digital_cow.transitions(state_from):
+            yield index_from, index_to, probability
 
 
 def vector_milk_production(vector: np.ndarray, step_in_time: int, step_size: int, digital_cow: DigitalCow,
-                           intermediate_accumulator: dict[int, float] | None):
+                           intermediate_accumulator: dict[int, float] | None, mode='count'):
     """
     A function that calculates the milk production of a cow ``digital_cow``,
     on a given day in simulation ``step_in_time``, using a vector of state probabilities.
@@ -1145,33 +1118,24 @@ def vector_milk_production(vector: np.ndarray, step_in_time: int, step_size: int
     :param intermediate_accumulator: A dictionary that stores the milk production of each day in the simulation for
         which phenotype values are calculated.
     :type intermediate_accumulator: dict[int, float] | None
+    :param mode: ``'count'`` for the mean milk production of the states with a probability above 0, or
+        ``'probability'`` for the mean weighted by the probabilities, see ``phenotypes.phenotype_expectation``.
+        Defaults to ``'count'``.
+    :type mode: str
 
     :return The milk production of the current day in simulation extrapolated until the next step_in_time.
     :rtype: float
     """
-    non_exit_states = 0
-    vector_phenotype = 0
-    index_state = {
-        index: state for index, state in enumerate(digital_cow.total_states)
-    }
-    nonzero_indices = np.where(vector > 0)[0]
-
-    for index in nonzero_indices:
-        state = index_state[index]
-        if state.state != 'Exit':
-            non_exit_states += 1
-            vector_phenotype += state.milk_output
-    try:
-        vector_phenotype = vector_phenotype / non_exit_states
-    except ZeroDivisionError:
-        vector_phenotype = 0
+    phenotypes = digital_cow.phenotypes
+    vector_phenotype = phenotype_expectation(vector, phenotypes.milk,
+                                             phenotypes.in_herd, mode)
     if intermediate_accumulator is not None:
         intermediate_accumulator[step_in_time] = vector_phenotype
     return vector_phenotype * step_size
 
 
 def vector_nitrogen_emission(vector: np.ndarray, step_in_time: int, step_size: int, digital_cow: DigitalCow,
-                             intermediate_accumulator: dict[int, float] | None):
+                             intermediate_accumulator: dict[int, float] | None, mode='count'):
     """
     A function that calculates the nitrogen emission of a cow ``digital_cow``,
     on a given day in simulation ``step_in_time``, using a vector of state probabilities.
@@ -1190,77 +1154,81 @@ def vector_nitrogen_emission(vector: np.ndarray, step_in_time: int, step_size: i
     :param intermediate_accumulator: A dictionary that stores the nitrogen emission of each day in the simulation for
         which phenotype values are calculated.
     :type intermediate_accumulator: dict[int, float] | None
+    :param mode: ``'count'`` for the mean nitrogen emission of the states with a probability above 0, or
+        ``'probability'`` for the mean weighted by the probabilities, see ``phenotypes.phenotype_expectation``.
+        Defaults to ``'count'``.
+    :type mode: str
 
     :return: The nitrogen emission of the current day in simulation extrapolated until the next step_in_time.
     :rtype: float
     """
-    non_exit_states = 0
-    vector_phenotype = 0
-    index_state = {
-        index: state for index, state in enumerate(digital_cow.total_states)
-    }
-    nonzero_indices = np.where(vector > 0)[0]
-    diet_cp = None
-    intake = None
+    phenotypes = digital_cow.phenotypes
+    # Only the states with a probability above 0 count, so only their nitrogen
+    # emission is calculated.
+    present = np.flatnonzero((vector > 0) & phenotypes.in_herd)
+    nitrogen = np.zeros(len(vector), dtype=np.float64)
+    nitrogen[present] = phenotypes.nitrogen(digital_cow.age + step_in_time,
+                                            present)
+    vector_phenotype = phenotype_expectation(vector, nitrogen,
+                                             phenotypes.in_herd, mode)
+    if intermediate_accumulator is not None:
+        intermediate_accumulator[step_in_time] = vector_phenotype
+    return vector_phenotype * step_size
 
-    for index in nonzero_indices:
-        state = index_state[index]
-        age = digital_cow.age + step_in_time
-        if state.state != 'Exit':
-            dp_limit = digital_cow.herd.get_days_pregnant_limit(
-                state.lactation_number)
-            vwp = digital_cow.herd.get_voluntary_waiting_period(
-                state.lactation_number)
-            dry_period = digital_cow.herd.get_duration_dry(
-                state.lactation_number)
-            close_up = dry_period / 2
-            milk = state.milk_output
-            bw = calculate_body_weight(state, age)
-            dmi = calculate_dmi(state, bw)
-            lactating = True
-            if state.lactation_number == 0:
-                lactating = False
-
-            if (state.lactation_number != 0 and state.days_pregnant >=
-                dp_limit - close_up) or (state.lactation_number == 0
-                                         and state.days_in_milk < (
-                    vwp / 2)) or (state.lactation_number != 0 and
-                                  state.days_in_milk < 100):
-                diet_cp = digital_cow.diet_cp_cu / 1000
-                intake = dmi * diet_cp / 0.625
-
-            elif (state.lactation_number != 0 and (dp_limit - dry_period)
-                  <= state.days_pregnant < (dp_limit - close_up)) or (
-                    state.lactation_number == 0 and
-                    state.days_in_milk >= vwp / 2):
-                diet_cp = digital_cow.diet_cp_fo / 1000
-                intake = dmi * diet_cp / 0.625
-
-            elif state.lactation_number != 0 \
-                    and 100 <= state.days_in_milk:
-                diet_cp = ((digital_cow.diet_cp_fo +
-                            digital_cow.diet_cp_cu) / 2) / 1000
-                intake = dmi * diet_cp / 0.625
-
-            if lactating:
-                nitrogen = manure_nitrogen_output(
-                    dmi, diet_cp * 100,
-                    milk, digital_cow.milk_cp)
 
-            else:
-                nitrogen = total_manure_nitrogen_output(
-                    lactating, intake)[0]
+def nitrogen_emission(digital_cow: DigitalCow, state: State, age: float) -> float:
+    """
+    Calculates the daily nitrogen emission in manure of ``digital_cow`` in
+    ``state``, which must not be an Exit state. The crude protein in the diet
+    depends on the stage of the lactation or the age of a heifer.
 
-            non_exit_states += 1
-            vector_phenotype += nitrogen
+    :param digital_cow: The cow of which the diet and herd are used.
+    :type digital_cow: DigitalCow
+    :param state: The state for which the nitrogen emission is calculated.
+    :type state: State
+    :param age: The age of the cow in days.
+    :type age: float
+    :return: The nitrogen emission in g.
+    :rtype: float
+    """
+    dp_limit = digital_cow.herd.get_days_pregnant_limit(state.lactation_number)
+    vwp = digital_cow.herd.get_voluntary_waiting_period(state.lactation_number)
+    dry_period = digital_cow.herd.get_duration_dry(state.lactation_number)
+    close_up = dry_period / 2
+    milk = state.milk_output
+    bw = calculate_body_weight(state, age)
+    dmi = calculate_dmi(state, bw)
+    lactating = True
+    if state.lactation_number == 0:
+        lactating = False
 
-    try:
-        vector_phenotype = vector_phenotype / non_exit_states
-    except ZeroDivisionError:
-        vector_phenotype = 0
-    if intermediate_accumulator is not None:
-        intermediate_accumulator[step_in_time] = vector_phenotype
-    return vector_phenotype * step_size
+    diet_cp = None
+    intake = None
+    if (state.lactation_number != 0 and state.days_pregnant >=
+        dp_limit - close_up) or (state.lactation_number == 0
+                                 and state.days_in_milk < (
+            vwp / 2)) or (state.lactation_number != 0 and
+                          state.days_in_milk < 100):
+        diet_cp = digital_cow.diet_cp_cu / 1000
+        intake = dmi * diet_cp / 0.625
+
+    elif (state.lactation_number != 0 and (dp_limit - dry_period)
+          <= state.days_pregnant < (dp_limit - close_up)) or (
+            state.lactation_number == 0 and
+            state.days_in_milk >= vwp / 2):
+        diet_cp = digital_cow.diet_cp_fo / 1000
+        intake = dmi * diet_cp / 0.625
+
+    elif state.lactation_number != 0 \
+            and 100 <= state.days_in_milk:
+        diet_cp = ((digital_cow.diet_cp_fo +
+                    digital_cow.diet_cp_cu) / 2) / 1000
+        intake = dmi * diet_cp / 0.625
+
+    if lactating:
+        return manure_nitrogen_output(dmi, diet_cp * 100, milk,
+                                      digital_cow.milk_cp)
+    return total_manure_nitrogen_output(lactating, intake)[0]
 
 
 def set_korver_function_variables(lactation_number: int):
@@ -1328,10 +1296,11 @@ def set_korver_function_variables(lactation_number: int):
         max_decrease_live_weight, duration_minimum_live_weight
 
 
-@cache
 def calculate_body_weight(state: State, age: int) -> float:
     """
-    Calculates the body weight of a cow for a specific state.
+    Calculates the body weight of a cow for a specific state. The body weight is
+    the sum of a term that depends on the state, see ``state_body_weight``, and
+    a term that depends on the age, see ``growth_body_weight``.
     
     :param state: The ``State`` object that represents the specific day for which the
         body weight must be calculated.
@@ -1341,6 +1310,25 @@ def calculate_body_weight(state: State, age: int) -> float:
     :return: The body weight of the cow in kg in the state that is given.
     :rtype: float
     """
+    return growth_body_weight(state.lactation_number, age) + \
+        state_body_weight(state)
+
+
+# Keyed on the state, so the hit rate is high once the states of a simulation
+# have been seen.
+@bounded_cache(maxsize=2 ** 18)
+def state_body_weight(state: State) -> float:
+    """
+    Calculates the part of the body weight of a cow that depends only on its
+    state: the weight of a heifer, or the decrease in weight during a lactation
+    and the increase in weight during a pregnancy of a cow that has calved.
+
+    :param state: The ``State`` object for which the body weight must be
+        calculated.
+    :type state: State
+    :return: The part of the body weight in kg that depends on the state.
+    :rtype: float
+    """
     # Source: (Giordano J.O., et al., 2012) (Cabrera)
     # Source: (De Vries A., 2006)
     birth_weight, mature_live_weight, growth_rate, pregnancy_parameter, \
@@ -1349,18 +1337,35 @@ def calculate_body_weight(state: State, age: int) -> float:
     if state.lactation_number == 0:
         max_weight = 580
         start_weight = 27.2
-        bw = min(max(birth_weight, start_weight + (growth_rate * state.days_in_milk)), max_weight)
-    else:
-        dpc = (state.days_pregnant - 50)  # d after conception - 50
-        if dpc < 0:
-            dpc = 0
-        bw = (mature_live_weight *
-              pow((1 - (1 - pow((birth_weight / mature_live_weight), (1 / 3))) *
-                   math.exp(-growth_rate * age)), 3) +
-              (max_decrease_live_weight * (state.days_in_milk / duration_minimum_live_weight) *
-               math.exp(1 - (state.days_in_milk / duration_minimum_live_weight))) +
-              (pow(pregnancy_parameter, 3) * pow(dpc, 3)))
-    return bw
+        return min(max(birth_weight, start_weight + (growth_rate * state.days_in_milk)), max_weight)
+    dpc = (state.days_pregnant - 50)  # d after conception - 50
+    if dpc < 0:
+        dpc = 0
+    return ((max_decrease_live_weight * (state.days_in_milk / duration_minimum_live_weight) *
+             math.exp(1 - (state.days_in_milk / duration_minimum_live_weight))) +
+            (pow(pregnancy_parameter, 3) * pow(dpc, 3)))
+
+
+def growth_body_weight(lactation_number: int, age: float) -> float:
+    """
+    Calculates the part of the body weight of a cow that depends only on its
+    age: the growth towards its mature live weight. The weight of a heifer does
+    not depend on its age, so for lactation 0 it is 0.
+
+    :param lactation_number: The number of lactation cycles the cow has completed.
+    :type lactation_number: int
+    :param age: The age of the cow in days.
+    :type age: float
+    :return: The part of the body weight in kg that depends on the age.
+    :rtype: float
+    """
+    if lactation_number == 0:
+        return 0.0
+    birth_weight, mature_live_weight, growth_rate = \
+        set_korver_function_variables(lactation_number)[:3]
+    return (mature_live_weight *
+            pow((1 - (1 - pow((birth_weight / mature_live_weight), (1 / 3))) *
+                 math.exp(-growth_rate * age)), 3))
 
 
 def set_milkbot_variables(lactation_number: int) -> tuple:
@@ -1406,7 +1411,7 @@ def set_milkbot_variables(lactation_number: int) -> tuple:
     return milkbot_variables
 
 
-@cache
+@bounded_cache(maxsize=2 ** 16)
 def milk_production(milkbot_variables: tuple, state: State, dp_limit: int,
                     duration_dry: int) -> float:
     """
@@ -1435,7 +1440,9 @@ def milk_production(milkbot_variables: tuple, state: State, dp_limit: int,
     return scale * (1 - (math.exp(((offset - state.days_in_milk) / ramp)) / 2)) * math.exp(-decay * state.days_in_milk)
 
 
-@cache
+# Keyed on the body weight, which depends on the age, so the arguments rarely
+# repeat and the cache disables itself if it does not pay off.
+@bounded_cache(min_hit_rate=0.1)
 def calculate_dmi(state: State, body_weight: float):
     """
     Calculates the dry matter intake of a cow for a specific state.
@@ -1456,7 +1463,7 @@ def calculate_dmi(state: State, body_weight: float):
     return dmi
 
 
-@cache
+@bounded_cache(min_hit_rate=0.1)
 def manure_nitrogen_output(dmi: float, diet_cp: float, milk_yield: float,
                            milk_cp: float):
     """
@@ -1548,7 +1555,7 @@ def fecal_nitrogen_output(lactating: bool, dmi: float, nitrogen_intake: float):
     return mu_n_output, min_n_output, max_n_output
 
 
-@cache
+@bounded_cache(min_hit_rate=0.1)
 def total_manure_nitrogen_output(lactating: bool, nitrogen_intake: float):
     """
     Returns estimated daily nitrogen emission of a cow's manure
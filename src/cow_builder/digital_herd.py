@@ -121,6 +121,26 @@ These can be changed like this::
 
 ************************************************************
 
+6. Share the states and transition matrix:
+******************************************
+The states and transition matrix only depend on the variables of the herd, so
+the ``DigitalHerd`` generates them once for all of its cows. They are generated
+the first time they are needed, and generated again after a variable they depend
+on is changed::
+
+    a_herd = DigitalHerd()
+    total_states = a_herd.get_total_states(dim_limit=1000, ln_limit=9)
+    tm = a_herd.get_transition_matrix(dim_limit=1000, ln_limit=9)
+
+The ``generate_total_states()`` method of a ``DigitalCow`` in the herd uses the
+shared states, so that the cow only keeps the index of its current state::
+
+    cow = DigitalCow(herd=a_herd)
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    index = cow.current_state_index
+
+************************************************************
+
 """
 
 
@@ -164,6 +184,13 @@ class DigitalHerd:
         :var _duration_dry: The number of days before calving, when a cow is not
             being milked. Values in the tuple are for lactation 1 and 2+.
         :type _duration_dry: tuple[int]
+        :var _state_spaces: The states shared by the cows in the herd, by the
+            limit of days in milk and lactation numbers for which they are
+            generated. Each value is a dictionary with the ``total_states``,
+            the ``transition_counts`` of each state, their ``edge_count``, and
+            their ``transition_matrix`` once it is
+            created. Cleared when a variable the states depend on is changed.
+        :type _state_spaces: dict[tuple[int, int], dict]
 
     :Methods:
         __init__(mu_age_at_first_heat, sigma_age_at_first_heat, vwp,
@@ -178,6 +205,14 @@ class DigitalHerd:
 
         generate_age_at_first_heat()
 
+        get_total_states(dim_limit, ln_limit)
+
+        get_edge_count(dim_limit, ln_limit)
+
+        get_transition_matrix(dim_limit, ln_limit)
+
+        clear_state_spaces()
+
         get_voluntary_waiting_period(lactation_number)
 
         set_voluntary_waiting_period(vwp)
@@ -243,6 +278,7 @@ class DigitalHerd:
         self._lactation_number_limit = lactation_number_limit
         self._days_pregnant_limit = days_pregnant_limit
         self._duration_dry = duration_dry
+        self._state_spaces = {}
 
     def add_to_herd(self, cows: list) -> None:
         """
@@ -313,6 +349,91 @@ class DigitalHerd:
         return np.random.normal(self.mu_age_at_first_heat,
                                 self.sigma_age_at_first_heat)
 
+    def __state_space(self, dim_limit=None, ln_limit=None) -> dict:
+        """Returns the shared states generated with ``dim_limit`` and
+        ``ln_limit``, and generates them if they are not generated yet."""
+        from cow_builder.state_space import StateTable, enumerate_states
+        from cow_builder.transition_matrix import transition_counts
+        if dim_limit is None:
+            dim_limit = self.days_in_milk_limit
+        if ln_limit is None:
+            ln_limit = self.lactation_number_limit
+        key = (dim_limit, ln_limit)
+        if key not in self._state_spaces:
+            total_states = StateTable(*enumerate_states(self, dim_limit, ln_limit))
+            counts = transition_counts(self, total_states, dim_limit, ln_limit)
+            self._state_spaces[key] = {
+                'total_states': total_states,
+                'transition_counts': counts,
+                'edge_count': int(counts.sum()),
+                'transition_matrix': None}
+        return self._state_spaces[key]
+
+    def get_total_states(self, dim_limit=None, ln_limit=None):
+        """
+        Returns the states a cow in the herd can be in, which are shared by all
+        cows in the herd. They are generated the first time they are needed.
+
+        :param dim_limit: The limit of days in milk for which states should
+            be generated. Defaults to the limit of the herd.
+        :type dim_limit: int | None
+        :param ln_limit: The limit of lactation numbers for which states should
+            be generated. Defaults to the limit of the herd.
+        :type ln_limit: int | None
+        :returns: The shared states.
+        :rtype: StateTable
+        """
+        return self.__state_space(dim_limit, ln_limit)['total_states']
+
+    def get_edge_count(self, dim_limit=None, ln_limit=None) -> int:
+        """
+        Returns the number of possible transitions between the shared states.
+
+        :param dim_limit: The limit of days in milk for which the states are
+            generated. Defaults to the limit of the herd.
+        :type dim_limit: int | None
+        :param ln_limit: The limit of lactation numbers for which the states are
+            generated. Defaults to the limit of the herd.
+        :type ln_limit: int | None
+        :returns: The number of possible transitions.
+        :rtype: int
+        """
+        return self.__state_space(dim_limit, ln_limit)['edge_count']
+
+    def get_transition_matrix(self, dim_limit=None, ln_limit=None):
+        """
+        Returns the transition matrix of the shared states, which is created
+        the first time it is needed. The matrix is shared by all cows in the
+        herd and should not be modified.
+
+        :param dim_limit: The limit of days in milk for which the states are
+            generated. Defaults to the limit of the herd.
+        :type dim_limit: int | None
+        :param ln_limit: The limit of lactation numbers for which the states are
+            generated. Defaults to the limit of the herd.
+        :type ln_limit: int | None
+        :returns: The transition matrix, with the probability of moving from the
+            state of a row to the state of a column.
+        :rtype: scipy.sparse.csr_matrix
+        """
+        from cow_builder.transition_matrix import herd_transition_matrix
+        if dim_limit is None:
+            dim_limit = self.days_in_milk_limit
+        if ln_limit is None:
+            ln_limit = self.lactation_number_limit
+        state_space = self.__state_space(dim_limit, ln_limit)
+        if state_space['transition_matrix'] is None:
+            state_space['transition_matrix'] = herd_transition_matrix(
+                self, state_space['total_states'], dim_limit, ln_limit,
+                state_space['transition_counts'])
+        return state_space['transition_matrix']
+
+    def clear_state_spaces(self):
+        """Removes the shared states and transition matrices, so that they are
+        generated again the next time they are needed. This is done
+        automatically when a variable they depend on is changed."""
+        self._state_spaces = {}
+
     @property
     def mu_age_at_first_heat(self):
         """The mean age in days at which a cow in the herd will experience
@@ -383,6 +504,7 @@ class DigitalHerd:
             if not type(i) == int:
                 raise TypeError(f"All variables in the list must be of type int, not {type(i)}.")
         self._voluntary_waiting_period = vwp
+        self.clear_state_spaces()
 
     @property
     def milk_threshold(self) -> float:
@@ -394,6 +516,7 @@ class DigitalHerd:
     def milk_threshold(self, mt: float):
         if type(mt) == float:
             self._milk_threshold = mt
+            self.clear_state_spaces()
 
     def get_insemination_window(self, lactation_number: int) -> int:
         """
@@ -422,6 +545,7 @@ class DigitalHerd:
             if not type(i) == int:
                 raise TypeError(f"All variables in the list must be of type int, not {type(i)}")
         self._insemination_window = dim_window
+        self.clear_state_spaces()
 
     @property
     def days_in_milk_limit(self) -> int:
@@ -470,6 +594,7 @@ class DigitalHerd:
             if not type(i) == int:
                 raise TypeError(f"All variables in the list must be of type int, not {type(i)}")
         self._days_pregnant_limit = limit
+        self.clear_state_spaces()
 
     def get_duration_dry(self, lactation_number) -> int:
         """
@@ -499,3 +624,4 @@ class DigitalHerd:
             if not type(i) == int:
                 raise TypeError(f"All variables in the list must be of type int, not {type(i)}")
         self._duration_dry = duration_dry
+        self.clear_state_spaces()
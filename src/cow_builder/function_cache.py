@@ -0,0 +1,368 @@
+"""
+:module: function_cache
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the BoundedCache class and the functions that
+    manage the in-memory caches of the phenotype functions of the
+    ``digital_cow`` module.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+A function decorated with ``bounded_cache`` keeps the results of its latest
+calls, up to a maximum number of entries. When the cache is full, the entry that
+was used least recently is removed, so the memory of a long-running process
+does not grow with the number of distinct arguments.\n
+Each cache counts its hits and misses. A function of which the arguments rarely
+repeat, such as a function of a float, gains little from its cache. Such a cache
+can be disabled, after which the function is called directly. A cache disables
+itself when it is created with ``min_hit_rate`` and its hit rate is below it
+after ``warmup`` calls.\n
+All caches are registered by the name of their function, so they can be
+inspected, cleared and resized together.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the functions:
+************************
+::
+
+    from cow_builder.function_cache import bounded_cache, cache_statistics, \\
+        clear_caches, resize_caches, disable_inefficient_caches
+
+************************************************************
+
+2. Cache a function:
+********************
+::
+
+    @bounded_cache(maxsize=1024, min_hit_rate=0.1)
+    def phenotype(state: State) -> float:
+        ...
+
+    phenotype.statistics()
+    phenotype.clear()
+
+************************************************************
+
+3. Manage all caches:
+*********************
+::
+
+    for name, statistics in cache_statistics().items():
+        print(name, statistics.hit_rate, statistics.size)
+    resize_caches(4096)
+    disabled = disable_inefficient_caches(min_hit_rate=0.2)
+    clear_caches()
+
+************************************************************
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import update_wrapper
+from threading import Lock
+
+DEFAULT_MAXSIZE = 4096
+DEFAULT_WARMUP = 10000
+# The registered caches by the module and name of their function.
+_caches = {}
+# Separates the positional arguments from the keyword arguments in a key.
+_KWARGS = object()
+
+
+@dataclass(frozen=True)
+class CacheStatistics:
+    """
+    The statistics of a ``BoundedCache``, see ``BoundedCache.statistics``.
+
+    :Attributes:
+        :var hits: The number of calls of which the result was in the cache.
+        :type hits: int
+        :var misses: The number of calls of which the result was calculated
+            while the cache was enabled.
+        :type misses: int
+        :var size: The number of entries in the cache.
+        :type size: int
+        :var maxsize: The maximum number of entries in the cache.
+        :type maxsize: int
+        :var enabled: Whether the cache is used.
+        :type enabled: bool
+
+    ************************************************************
+    """
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+    enabled: bool
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of the calls that were hits, or 0 without calls."""
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+
+class BoundedCache:
+    """
+    A function with a cache of the results of its latest calls, which removes
+    the least recently used entry when it is full. Its arguments must be
+    hashable.
+
+    :Attributes:
+        :var _function: The function of which the results are cached.
+        :type _function: Callable
+        :var _entries: The results by arguments, from the least to the most
+            recently used.
+        :type _entries: OrderedDict
+        :var _maxsize: The maximum number of entries.
+        :type _maxsize: int
+        :var _min_hit_rate: The hit rate below which the cache disables itself
+            after ``_warmup`` calls, or None if it never does.
+        :type _min_hit_rate: float | None
+        :var _warmup: The number of calls after which the hit rate is checked.
+        :type _warmup: int
+        :var _enabled: Whether the cache is used.
+        :type _enabled: bool
+        :var _judged: Whether the hit rate was checked after the warmup.
+        :type _judged: bool
+        :var _hits: The number of calls of which the result was in the cache.
+        :type _hits: int
+        :var _misses: The number of calls of which the result was calculated
+            while the cache was enabled.
+        :type _misses: int
+        :var _lock: The lock that guards ``_entries`` and the counts.
+        :type _lock: threading.Lock
+
+    :Methods:
+        __init__(function, maxsize, min_hit_rate, warmup)\n
+        __call__(*args, **kwargs)\n
+        statistics()\n
+        clear()\n
+        resize(maxsize)\n
+        enable()\n
+        disable()\n
+
+    ************************************************************
+    """
+
+    def __init__(self, function, maxsize=DEFAULT_MAXSIZE, min_hit_rate=None,
+                 warmup=DEFAULT_WARMUP):
+        """
+        Initializes a new instance of a BoundedCache object.
+
+        :param function: The function of which the results are cached.
+        :type function: Callable
+        :param maxsize: The maximum number of entries. Defaults to
+            ``DEFAULT_MAXSIZE``.
+        :type maxsize: int
+        :param min_hit_rate: The hit rate below which the cache disables itself
+            after ``warmup`` calls. Defaults to None, which never disables it.
+        :type min_hit_rate: float | None
+        :param warmup: The number of calls after which the hit rate is checked.
+            Defaults to ``DEFAULT_WARMUP``.
+        :type warmup: int
+        :raises ValueError: If ``maxsize`` is smaller than 1.
+        """
+        if maxsize < 1:
+            raise ValueError("The maximum size of a cache must be at least 1.")
+        update_wrapper(self, function)
+        self._function = function
+        self._entries = OrderedDict()
+        self._maxsize = maxsize
+        self._min_hit_rate = min_hit_rate
+        self._warmup = warmup
+        self._enabled = True
+        self._judged = False
+        self._hits = 0
+        self._misses = 0
+        self._lock = Lock()
+
+    def __repr__(self):
+        return f"BoundedCache({self.__qualname__}, maxsize={self._maxsize})"
+
+    def __call__(self, *args, **kwargs):
+        if not self._enabled:
+            return self._function(*args, **kwargs)
+        key = args if not kwargs else args + (_KWARGS,) + \
+            tuple(sorted(kwargs.items()))
+        with self._lock:
+            if key in self._entries:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        # The function is called outside the lock, so that it may call other
+        # cached functions.
+        result = self._function(*args, **kwargs)
+        with self._lock:
+            self._misses += 1
+            self._entries[key] = result
+            if len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+            # A cache with a low hit rate mostly misses, so its hit rate is
+            # judged once, on the first miss after the warmup.
+            if self._min_hit_rate is not None and not self._judged and \
+                    self._hits + self._misses >= self._warmup:
+                self._judged = True
+                if self._hits / (self._hits + self._misses) < \
+                        self._min_hit_rate:
+                    self._enabled = False
+                    self._entries.clear()
+        return result
+
+    def statistics(self) -> CacheStatistics:
+        """
+        Returns the statistics of the cache.
+
+        :return: The hits, misses and size of the cache.
+        :rtype: CacheStatistics
+        """
+        with self._lock:
+            return CacheStatistics(hits=self._hits, misses=self._misses,
+                                   size=len(self._entries),
+                                   maxsize=self._maxsize, enabled=self._enabled)
+
+    def clear(self) -> None:
+        """Removes all entries and resets the hits and misses."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def resize(self, maxsize: int) -> None:
+        """
+        Changes the maximum number of entries. The least recently used entries
+        are removed if there are more.
+
+        :param maxsize: The maximum number of entries.
+        :type maxsize: int
+        :raises ValueError: If ``maxsize`` is smaller than 1.
+        """
+        if maxsize < 1:
+            raise ValueError("The maximum size of a cache must be at least 1.")
+        with self._lock:
+            self._maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def enable(self) -> None:
+        """Uses the cache again after ``disable``. The hits and misses are reset,
+        so the hit rate is checked again after the warmup."""
+        with self._lock:
+            self._enabled = True
+            self._judged = False
+            self._hits = 0
+            self._misses = 0
+
+    def disable(self) -> None:
+        """Removes all entries and calls the function directly from now on."""
+        with self._lock:
+            self._enabled = False
+            self._entries.clear()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache is used."""
+        return self._enabled
+
+    @property
+    def maxsize(self) -> int:
+        """The maximum number of entries."""
+        return self._maxsize
+
+
+def bounded_cache(maxsize=DEFAULT_MAXSIZE, min_hit_rate=None,
+                  warmup=DEFAULT_WARMUP):
+    """
+    Decorates a function with a ``BoundedCache``, and registers the cache by the
+    module and name of the function.
+
+    :param maxsize: The maximum number of entries. Defaults to
+        ``DEFAULT_MAXSIZE``.
+    :type maxsize: int
+    :param min_hit_rate: The hit rate below which the cache disables itself
+        after ``warmup`` calls. Defaults to None, which never disables it.
+    :type min_hit_rate: float | None
+    :param warmup: The number of calls after which the hit rate is checked.
+        Defaults to ``DEFAULT_WARMUP``.
+    :type warmup: int
+    :return: The decorator.
+    :rtype: Callable[[Callable], BoundedCache]
+    """
+    def decorator(function) -> BoundedCache:
+        bounded = BoundedCache(function, maxsize, min_hit_rate, warmup)
+        _caches[f"{function.__module__}.{function.__qualname__}"] = bounded
+        return bounded
+    return decorator
+
+
+def caches() -> dict:
+    """
+    Returns the registered caches.
+
+    :return: The caches by the module and name of their function.
+    :rtype: dict[str, BoundedCache]
+    """
+    return dict(_caches)
+
+
+def cache_statistics() -> dict:
+    """
+    Returns the statistics of the registered caches.
+
+    :return: The statistics by the module and name of the function.
+    :rtype: dict[str, CacheStatistics]
+    """
+    return {name: cache.statistics() for name, cache in _caches.items()}
+
+
+def clear_caches() -> None:
+    """Removes all entries of the registered caches and resets their hits and
+    misses."""
+    for cache in _caches.values():
+        cache.clear()
+
+
+def resize_caches(maxsize: int, names=None) -> None:
+    """
+    Changes the maximum number of entries of registered caches.
+
+    :param maxsize: The maximum number of entries.
+    :type maxsize: int
+    :param names: The names of the caches, see ``caches``. Defaults to None,
+        which resizes all caches.
+    :type names: Iterable[str] | None
+    :raises KeyError: If a name is not registered.
+    """
+    for name in _caches if names is None else names:
+        _caches[name].resize(maxsize)
+
+
+def disable_inefficient_caches(min_hit_rate: float, min_calls=1) -> list:
+    """
+    Disables the registered caches of which the hit rate is below
+    ``min_hit_rate``.
+
+    :param min_hit_rate: The hit rate below which a cache is disabled.
+    :type min_hit_rate: float
+    :param min_calls: The number of calls a cache must have had to be judged.
+        Defaults to 1.
+    :type min_calls: int
+    :return: The names of the caches that were disabled.
+    :rtype: list[str]
+    """
+    disabled = []
+    for name, cache in _caches.items():
+        statistics = cache.statistics()
+        if statistics.enabled and \
+                statistics.hits + statistics.misses >= min_calls and \
+                statistics.hit_rate < min_hit_rate:
+            cache.disable()
+            disabled.append(name)
+    return disabled
+
+
+def enable_caches() -> None:
+    """Enables all registered caches."""
+    for cache in _caches.values():
+        cache.enable()
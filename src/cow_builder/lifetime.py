@@ -0,0 +1,229 @@
+"""
+:module: lifetime
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the functions that calculate the expected
+    lifetime phenotypes of a ``DigitalCow`` exactly, by solving a linear system
+    instead of simulating day by day.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+The Exit states of a cow are absorbing: once a cow is in an Exit state, it stays
+there. The expected number of days a cow spends in each other state, the
+transient states, before it exits follows from the fundamental matrix of the
+absorbing chain. With the transitions between transient states ``Q`` and the
+initial state vector ``v0``, these days ``x`` are the solution of
+``(I - Q)ᵀ x = v0``. Every transition increases the days in milk or the
+lactation number, so ``I - Q`` is triangular and the system is solved by
+substitution, in a fraction of the time of a simulation.\n
+The expected total of a phenotype is the sum over the states of the expected
+days in the state times the value of the phenotype in the state. It equals the
+sum of ``vector @ values`` over all days of a simulation that lasts until the
+cow has exited.\n
+The nitrogen emission of a state depends on the age of the cow. The sum of the
+days since the first day over all visits to each state, ``m``, is the solution of
+``(I - Q)ᵀ m = x - v0``, so ``m / x`` is the expected day of a visit to each
+state. A phenotype that depends on the day is evaluated once per state, at the
+expected day of its visits. Since the nitrogen emission is not linear in the
+age, its total is an approximation, which is close because the age of the
+visits to a state varies little relative to the age of the cow.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the function:
+***********************
+::
+
+    from cow_builder.lifetime import expected_lifetime_totals
+
+************************************************************
+
+2. Calculate the expected lifetime totals of a cow:
+***************************************************
+The states of the cow must be generated first. Without phenotypes, the expected
+milk production and nitrogen emission are calculated::
+
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    lifetime = expected_lifetime_totals(cow)
+    lifetime.totals['milk'], lifetime.totals['nitrogen'], lifetime.productive_days
+
+Other phenotypes are given as a value per state in ``total_states``, or as a
+function of the indices of states and the expected day of their visits::
+
+    lifetime = expected_lifetime_totals(
+        cow, phenotypes={'milk': cow.total_states.milk_output,
+                         'lactating': cow.total_states.lactation_numbers > 0,
+                         'body_weight': lambda states, days:
+                             cow.phenotypes.body_weight(cow.age + days, states)})
+
+************************************************************
+"""
+from dataclasses import dataclass
+import numpy as np
+from cow_builder.state_space import StateTable, EXIT
+
+
+@dataclass(frozen=True)
+class LifetimeTotals:
+    """
+    The expected phenotypes of a ``DigitalCow`` from the next day until it exits
+    the herd.
+
+    :Attributes:
+        :var totals: The expected total of each phenotype, by name.
+        :type totals: dict[str, float]
+        :var productive_days: The expected number of days until the cow exits
+            the herd.
+        :type productive_days: float
+
+    ************************************************************
+    """
+    totals: dict
+    productive_days: float
+
+
+def expected_visits(transition_matrix, total_states: StateTable,
+                    initial_state_vectors: np.ndarray) -> np.ndarray:
+    """
+    Calculates the expected number of days spent in each transient state, from
+    the day of ``initial_state_vectors`` until exit, by solving
+    ``(I - Q)ᵀ x = v0``.
+
+    :param transition_matrix: A square matrix with the probability of moving
+        from the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param total_states: The states of the rows and columns of
+        ``transition_matrix``.
+    :type total_states: StateTable
+    :param initial_state_vectors: The probability of being in each state on the
+        first day, as a vector or as a matrix with a column per cow.
+    :type initial_state_vectors: np.ndarray
+    :return: The expected number of days in each state, including the first
+        day. The days in the Exit states are 0.
+    :rtype: np.ndarray[np.float64]
+    :raises ValueError: If the transient states can transition into each other
+        in a cycle, so that a cow would never exit.
+    """
+    from scipy.sparse import csr_matrix, identity
+    from scipy.sparse.linalg import spsolve, spsolve_triangular
+    transient = np.flatnonzero(total_states.life_states != EXIT)
+    initial_state_vectors = np.asarray(initial_state_vectors, dtype=np.float64)
+    visits = np.zeros_like(initial_state_vectors)
+    if not len(transient):
+        return visits
+    q = csr_matrix(transition_matrix)[transient][:, transient].tocsr()
+    system = (identity(len(transient), format='csr') - q).T.tocsr()
+    rows = np.repeat(np.arange(len(transient)), np.diff(q.indptr))
+    if np.all(q.indices > rows):
+        # Every transition goes to a later state, so the system is lower
+        # triangular with a unit diagonal.
+        solution = spsolve_triangular(system, initial_state_vectors[transient],
+                                      lower=True, unit_diagonal=True)
+    else:
+        solution = spsolve(system.tocsc(), initial_state_vectors[transient])
+        if not np.all(np.isfinite(solution)):
+            raise ValueError("The transient states do not lead to an Exit "
+                             "state.")
+    visits[transient] = np.reshape(solution, visits[transient].shape)
+    return visits
+
+
+def expected_visit_days(transition_matrix, total_states: StateTable,
+                        visits: np.ndarray) -> np.ndarray:
+    """
+    Calculates the expected day of the visits to each transient state, counted
+    from the first day of the visits, by solving ``(I - Q)ᵀ m = x - v0``.
+
+    :param transition_matrix: A square matrix with the probability of moving
+        from the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param total_states: The states of the rows and columns of
+        ``transition_matrix``.
+    :type total_states: StateTable
+    :param visits: The expected number of days in each state after the first
+        day, ``x - v0``, see ``expected_visits``.
+    :type visits: np.ndarray[np.float64]
+    :return: The expected day of a visit to each state. The day of states that
+        are never visited is 0.
+    :rtype: np.ndarray[np.float64]
+    """
+    day_sums = expected_visits(transition_matrix, total_states, visits)
+    return np.divide(day_sums, visits, out=np.zeros_like(visits),
+                     where=visits > 0)
+
+
+def default_lifetime_phenotypes(digital_cow) -> dict:
+    """
+    Creates the default phenotypes of ``expected_lifetime_totals``: the daily
+    milk production in kg as ``'milk'`` and the daily nitrogen emission in g as
+    ``'nitrogen'``.
+
+    :param digital_cow: A DigitalCow object for which the states are generated.
+    :type digital_cow: DigitalCow
+    :return: The milk production as a value per state, and the nitrogen
+        emission as a function of the indices of states and the expected day of
+        their visits, at the age of the cow on that day.
+    :rtype: dict[str, np.ndarray | Callable[[np.ndarray, np.ndarray], np.ndarray]]
+    """
+    phenotypes = digital_cow.phenotypes
+
+    def nitrogen(states: np.ndarray, days: np.ndarray) -> np.ndarray:
+        return phenotypes.nitrogen(digital_cow.age + days, states)
+    return {'milk': phenotypes.milk, 'nitrogen': nitrogen}
+
+
+def expected_lifetime_totals(digital_cow, phenotypes=None,
+                             transition_matrix=None) -> LifetimeTotals:
+    """
+    Calculates the expected total of each phenotype of ``digital_cow`` from the
+    next day until it exits the herd, and the expected number of days until it
+    exits. The totals are those of ``simulation.simulate()`` with callbacks
+    ``vector @ values`` and a number of days long enough for the cow to exit.
+
+    :param digital_cow: A DigitalCow object for which the states are generated.
+    :type digital_cow: DigitalCow
+    :param phenotypes: The phenotypes by name, as a value per state of
+        ``total_states``, or a function that takes the indices of the visited
+        states and the expected day of their visits, see
+        ``expected_visit_days``, and returns a value per index. The values of
+        the Exit states are not used. Defaults to
+        ``default_lifetime_phenotypes``.
+    :type phenotypes: dict[str, np.ndarray | Callable[[np.ndarray, np.ndarray], np.ndarray]] | None
+    :param transition_matrix: The transition matrix of the cow. Defaults to the
+        matrix of ``transition_matrix.build_transition_matrix()``.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :return: The expected totals and number of days.
+    :rtype: LifetimeTotals
+    :raises ValueError: If the values of a phenotype do not have a value for
+        each state.
+    """
+    from cow_builder.transition_matrix import build_transition_matrix
+    total_states = digital_cow.total_states
+    if phenotypes is None:
+        phenotypes = default_lifetime_phenotypes(digital_cow)
+    if transition_matrix is None:
+        transition_matrix = build_transition_matrix(digital_cow)
+    initial_state_vector = np.zeros(len(total_states), dtype=np.float64)
+    initial_state_vector[digital_cow.current_state_index] = 1.0
+    # The visits include the current day, which a simulation does not count.
+    visits = expected_visits(transition_matrix, total_states,
+                             initial_state_vector)
+    visits -= np.where(total_states.life_states != EXIT, initial_state_vector, 0)
+    visited = np.flatnonzero(visits > 0)
+    days = None
+    totals = {}
+    for name, phenotype in phenotypes.items():
+        if callable(phenotype):
+            if days is None:
+                days = expected_visit_days(transition_matrix, total_states,
+                                           visits)
+            values = np.zeros_like(visits)
+            values[visited] = phenotype(visited, days[visited])
+        else:
+            values = np.asarray(phenotype, dtype=np.float64)
+        if values.shape != visits.shape:
+            raise ValueError(f"The phenotype {name} must have a value for each "
+                             f"state.")
+        totals[name] = float(visits @ values)
+    return LifetimeTotals(totals=totals, productive_days=float(visits.sum()))
@@ -0,0 +1,424 @@
+"""
+:module: matrix_cache
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the MatrixCache class, which stores the states
+    and transition matrix of a ``DigitalCow`` on disk, so that they only have to
+    be generated once for each combination of herd variables and limits.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+An entry of the cache is identified by a hash of all ``DigitalHerd`` variables
+that the states and transition probabilities depend on, the limits of days in
+milk and lactation numbers, and ``MODEL_VERSION``. Another herd or another limit
+therefore results in another entry. Entries that were written by another model
+version, or that cannot be read, are removed automatically. Only directories
+with the metadata of an entry are removed, so other files in the directory of
+the cache are never deleted.\n
+Each entry is a directory of arrays that are memory mapped when the entry is
+loaded, see the ``storage`` module. Processes that load the same entry share the
+arrays in memory.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the class MatrixCache:
+********************************
+::
+
+    from cow_builder.matrix_cache import MatrixCache, cache_key
+
+************************************************************
+
+2. Create a MatrixCache object:
+*******************************
+a) In the default directory, which is the directory in the
+   ``COW_BUILDER_CACHE_DIR`` environment variable or ``~/.cache/cow_builder``::
+
+    cache = MatrixCache()
+
+b) In another directory::
+
+    cache = MatrixCache('path/to/cache')
+
+************************************************************
+
+3. Load or build a transition matrix:
+*************************************
+The states of the cow are loaded from the cache together with the transition
+matrix. If the cache has no entry, the states are generated, the transition
+matrix is built and both are stored::
+
+    tm = cache.transition_matrix(cow, dim_limit=1000, ln_limit=9)
+
+************************************************************
+
+4. Load or calculate a power of a transition matrix:
+****************************************************
+The transition matrix to the power 14, to simulate 14 days at once, is stored
+next to the transition matrix::
+
+    tm_14 = cache.matrix_power(cow, 14)
+
+************************************************************
+
+5. Manage the cache:
+********************
+::
+
+    key = cache_key(a_herd, dim_limit=1000, ln_limit=9)
+    entry = cache.load(a_herd, dim_limit=1000, ln_limit=9)
+    cache.clear()
+
+************************************************************
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from cow_builder.state_space import StateTable, EXIT
+from cow_builder.storage import save_matrix, open_matrix, save_sparse, \
+    open_sparse, read_metadata
+from cow_builder.transition_matrix import build_transition_matrix
+
+# Increase this number when a change of the model changes the states or the
+# transition probabilities, so that the entries of the previous model are no
+# longer used.
+MODEL_VERSION = 1
+
+
+def herd_parameters(herd) -> dict:
+    """
+    Returns the variables of ``herd`` that the states and transition
+    probabilities of its cows depend on.
+
+    :param herd: The herd of which to return the variables.
+    :type herd: DigitalHerd
+    :return: A dictionary with the name and value of each variable.
+    :rtype: dict
+    """
+    # The variables of lactation 2 apply to all later lactations, and the dry
+    # period of lactation 1 to all later lactations.
+    return {
+        'vwp': [herd.get_voluntary_waiting_period(ln) for ln in range(3)],
+        'insemination_window': [herd.get_insemination_window(ln)
+                                for ln in range(3)],
+        'milk_threshold': herd.milk_threshold,
+        'days_pregnant_limit': [herd.get_days_pregnant_limit(ln)
+                                for ln in range(3)],
+        'duration_dry': [herd.get_duration_dry(ln) for ln in range(2)],
+        'days_in_milk_limit': herd.days_in_milk_limit,
+        'lactation_number_limit': herd.lactation_number_limit,
+    }
+
+
+def _entry_metadata(herd, dim_limit: int, ln_limit: int) -> dict:
+    """Returns the metadata that identifies an entry of the cache."""
+    return {'model_version': MODEL_VERSION, 'herd': herd_parameters(herd),
+            'dim_limit': int(dim_limit), 'ln_limit': int(ln_limit)}
+
+
+def cache_key(herd, dim_limit: int, ln_limit: int) -> str:
+    """
+    Returns the key of the cache entry of the states and transition matrix of a
+    cow in ``herd``. The key is the same in every process and on every machine.
+
+    :param herd: The herd of the cow.
+    :type herd: DigitalHerd
+    :param dim_limit: The limit of days in milk for which states are generated.
+    :type dim_limit: int
+    :param ln_limit: The limit of lactation numbers for which states are generated.
+    :type ln_limit: int
+    :return: A SHA-256 hash as a hexadecimal string.
+    :rtype: str
+    """
+    metadata = json.dumps(_entry_metadata(herd, dim_limit, ln_limit),
+                          sort_keys=True)
+    return hashlib.sha256(metadata.encode()).hexdigest()
+
+
+def _limits(digital_cow, dim_limit, ln_limit) -> tuple:
+    """Returns the limits of the cache entry of ``digital_cow``: the given
+    limits, or else those of the states of the cow, or else those of its herd.
+    The states of a cow are never replaced by states for other limits."""
+    generated_limits = digital_cow.generated_limits
+    if generated_limits is None:
+        if digital_cow.total_states is not None:
+            raise ValueError("The states of the cow were not generated, so "
+                             "they cannot be cached.")
+        generated_limits = (digital_cow.herd.days_in_milk_limit,
+                            digital_cow.herd.lactation_number_limit)
+    if dim_limit is None:
+        dim_limit = generated_limits[0]
+    if ln_limit is None:
+        ln_limit = generated_limits[1]
+    if digital_cow.generated_limits not in (None, (dim_limit, ln_limit)):
+        raise ValueError(f"The cow has states for a days in milk limit of "
+                         f"{generated_limits[0]} and a lactation number limit "
+                         f"of {generated_limits[1]}, not {dim_limit} and "
+                         f"{ln_limit}.")
+    return dim_limit, ln_limit
+
+
+def _is_key(name: str) -> bool:
+    """Returns whether ``name`` has the form of a ``cache_key``."""
+    return len(name) == 64 and all(character in '0123456789abcdef'
+                                   for character in name)
+
+
+class MatrixCache:
+    """
+    A directory with the states and transition matrices of ``DigitalCow``
+    objects.
+
+    :Attributes:
+        :var _directory: The directory of the cache.
+        :type _directory: Path
+
+    :Methods:
+        __init__(directory)\n
+        path(herd, dim_limit, ln_limit)\n
+        load(herd, dim_limit, ln_limit)\n
+        store(herd, dim_limit, ln_limit, total_states, transition_matrix)\n
+        transition_matrix(digital_cow, dim_limit, ln_limit)\n
+        matrix_power(digital_cow, power, tolerance, dim_limit, ln_limit)\n
+        remove_stale()\n
+        clear()\n
+
+    ************************************************************
+    """
+
+    def __init__(self, directory=None):
+        """
+        Initializes a new instance of a MatrixCache object.
+
+        :param directory: The directory of the cache. It is created when an entry
+            is stored. Defaults to the ``COW_BUILDER_CACHE_DIR`` environment
+            variable, or ``~/.cache/cow_builder`` if it is not set.
+        :type directory: str | os.PathLike | None
+        """
+        if directory is None:
+            directory = os.environ.get('COW_BUILDER_CACHE_DIR',
+                                       Path.home() / '.cache' / 'cow_builder')
+        self._directory = Path(directory)
+
+    def __repr__(self):
+        return f"MatrixCache(directory={str(self._directory)!r})"
+
+    def path(self, herd, dim_limit: int, ln_limit: int) -> Path:
+        """
+        Returns the path of the directory of a cache entry.
+
+        :param herd: The herd of the cow.
+        :type herd: DigitalHerd
+        :param dim_limit: The limit of days in milk for which states are generated.
+        :type dim_limit: int
+        :param ln_limit: The limit of lactation numbers for which states are
+            generated.
+        :type ln_limit: int
+        :return: The path of the directory.
+        :rtype: Path
+        """
+        return self._directory / cache_key(herd, dim_limit, ln_limit)
+
+    def load(self, herd, dim_limit: int, ln_limit: int) -> tuple | None:
+        """
+        Opens the states and transition matrix of a cow in ``herd`` from the
+        cache. The arrays are memory mapped, see ``storage.open_matrix``. An
+        entry of which the arrays do not fit together or that does not match
+        the herd, limits and model version is removed. An entry that cannot be
+        opened, such as while another process replaces it, is not found.
+
+        :param herd: The herd of the cow.
+        :type herd: DigitalHerd
+        :param dim_limit: The limit of days in milk for which states are generated.
+        :type dim_limit: int
+        :param ln_limit: The limit of lactation numbers for which states are
+            generated.
+        :type ln_limit: int
+        :return: The states and the transition matrix, or None if the cache has
+            no entry.
+        :rtype: tuple[StateTable, scipy.sparse.csr_matrix] | None
+        """
+        path = self.path(herd, dim_limit, ln_limit)
+        if not path.is_dir():
+            return None
+        try:
+            total_states, transition_matrix, metadata = open_matrix(path)
+            if metadata.get('entry') != _entry_metadata(herd, dim_limit,
+                                                        ln_limit):
+                raise ValueError("The entry does not match its key.")
+        except OSError:
+            # Another process may be replacing the entry, which is kept.
+            return None
+        except (KeyError, ValueError):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return total_states, transition_matrix
+
+    def store(self, herd, dim_limit: int, ln_limit: int, total_states: StateTable,
+              transition_matrix) -> Path:
+        """
+        Stores the states and transition matrix of a cow in ``herd`` in the
+        cache, see ``storage.save_matrix``. Entries of other model versions are
+        removed.
+
+        :param herd: The herd of the cow.
+        :type herd: DigitalHerd
+        :param dim_limit: The limit of days in milk for which states are generated.
+        :type dim_limit: int
+        :param ln_limit: The limit of lactation numbers for which states are
+            generated.
+        :type ln_limit: int
+        :param total_states: The states of the cow.
+        :type total_states: StateTable
+        :param transition_matrix: The transition matrix of the cow.
+        :type transition_matrix: scipy.sparse.csr_matrix
+        :return: The path of the directory of the entry.
+        :rtype: Path
+        """
+        self.remove_stale()
+        return save_matrix(self.path(herd, dim_limit, ln_limit), total_states,
+                           transition_matrix,
+                           {'entry': _entry_metadata(herd, dim_limit, ln_limit)})
+
+    def transition_matrix(self, digital_cow, dim_limit=None, ln_limit=None):
+        """
+        Loads the states and transition matrix of ``digital_cow`` from the
+        cache, and sets its states with ``DigitalCow.set_generated_states()``.
+        If the cache has no entry, the transition matrix is built from the
+        states of the cow, which are generated first if the cow has none, and
+        stored.
+
+        :param digital_cow: The cow of which to load the transition matrix.
+        :type digital_cow: DigitalCow
+        :param dim_limit: The limit of days in milk for which states are generated.
+            Defaults to the limit of the states of the cow, or the limit of its
+            herd if it has no states.
+        :type dim_limit: int | None
+        :param ln_limit: The limit of lactation numbers for which states are
+            generated. Defaults to the limit of the states of the cow, or the
+            limit of its herd if it has no states.
+        :type ln_limit: int | None
+        :return: The transition matrix. If it was loaded from the cache, its
+            arrays are memory mapped and read only.
+        :rtype: scipy.sparse.csr_matrix
+        :raises ValueError: If the cow has states for other limits, or states
+            that were not generated.
+        """
+        herd = digital_cow.herd
+        dim_limit, ln_limit = _limits(digital_cow, dim_limit, ln_limit)
+        entry = self.load(herd, dim_limit, ln_limit)
+        if entry is None:
+            if digital_cow.generated_limits is None:
+                digital_cow.generate_total_states(dim_limit, ln_limit)
+            transition_matrix = build_transition_matrix(digital_cow)
+            self.store(herd, dim_limit, ln_limit, digital_cow.total_states,
+                       transition_matrix)
+            return transition_matrix
+        total_states, transition_matrix = entry
+        # Each Exit state has a single transition, into itself.
+        edge_count = transition_matrix.nnz - int(
+            np.count_nonzero(total_states.life_states == EXIT))
+        digital_cow.set_generated_states(total_states, dim_limit, ln_limit,
+                                         edge_count)
+        return transition_matrix
+
+    def matrix_power(self, digital_cow, power: int, tolerance=0.0, dim_limit=None,
+                     ln_limit=None):
+        """
+        Loads the transition matrix of ``digital_cow`` to the power ``power``
+        from the cache, see ``simulation.matrix_power``. It is stored in the
+        entry of the transition matrix, so it is shared by all cows in herds
+        with the same variables. If the cache has no entry, the transition
+        matrix and its power are calculated and stored. The states of the cow
+        are set as by ``self.transition_matrix()``.
+
+        :param digital_cow: The cow of which to load the power of the transition
+            matrix.
+        :type digital_cow: DigitalCow
+        :param power: The number of days.
+        :type power: int
+        :param tolerance: The probability below which entries are removed.
+            Defaults to 0.0, which keeps all entries.
+        :type tolerance: float
+        :param dim_limit: The limit of days in milk for which states are generated.
+            Defaults to the limit of the states of the cow, or the limit of its
+            herd if it has no states.
+        :type dim_limit: int | None
+        :param ln_limit: The limit of lactation numbers for which states are
+            generated. Defaults to the limit of the states of the cow, or the
+            limit of its herd if it has no states.
+        :type ln_limit: int | None
+        :return: The transition matrix to the power ``power``. If it was loaded
+            from the cache, its arrays are memory mapped and read only.
+        :rtype: scipy.sparse.csr_matrix
+        :raises ValueError: If the cow has states for other limits, or states
+            that were not generated.
+        """
+        from cow_builder.simulation import matrix_power
+        herd = digital_cow.herd
+        dim_limit, ln_limit = _limits(digital_cow, dim_limit, ln_limit)
+        transition_matrix = self.transition_matrix(digital_cow, dim_limit,
+                                                   ln_limit)
+        path = self.path(herd, dim_limit, ln_limit) / \
+            f"power_{int(power)}_{float(tolerance)!r}"
+        metadata = {'power': int(power), 'tolerance': float(tolerance)}
+        if path.is_dir():
+            try:
+                step_matrix, stored = open_sparse(path)
+                if all(stored.get(key) == value
+                       for key, value in metadata.items()) and \
+                        step_matrix.shape == transition_matrix.shape:
+                    return step_matrix
+                raise ValueError("The power does not match its path.")
+            except OSError:
+                # Another process may be replacing the power.
+                pass
+            except (KeyError, ValueError):
+                shutil.rmtree(path, ignore_errors=True)
+        step_matrix = matrix_power(transition_matrix, power, tolerance)
+        save_sparse(path, step_matrix, metadata)
+        return step_matrix
+
+    def remove_stale(self) -> None:
+        """Removes the entries that were stored by another model version. Other
+        files and directories in the directory of the cache are kept."""
+        for path, entry in self._entries():
+            if entry['model_version'] != MODEL_VERSION:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self) -> None:
+        """Removes all entries of the cache. Other files and directories in the
+        directory of the cache are kept."""
+        for path, _ in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _entries(self) -> list:
+        """Returns the paths and the ``entry`` metadata of the entries in the
+        directory of the cache. An entry is a directory named by a
+        ``cache_key`` with metadata that identifies it, see
+        ``_entry_metadata``. The temporary directories of entries that are
+        being stored are hidden, and are not entries."""
+        if not self._directory.is_dir():
+            return []
+        entries = []
+        for path in self._directory.iterdir():
+            if not _is_key(path.name) or not path.is_dir():
+                continue
+            try:
+                entry = read_metadata(path)['entry']
+            except (OSError, KeyError, TypeError, ValueError):
+                continue
+            if isinstance(entry, dict) and \
+                    set(entry) == {'model_version', 'herd', 'dim_limit',
+                                   'ln_limit'}:
+                entries.append((path, entry))
+        return entries
+
+    @property
+    def directory(self) -> Path:
+        """The directory of the cache."""
+        return self._directory
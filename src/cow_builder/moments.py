@@ -0,0 +1,272 @@
+"""
+:module: moments
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the functions that calculate the variance and
+    percentiles of the phenotypes of a ``DigitalCow`` during a simulation,
+    without drawing trajectories.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+The state vector of a day is the distribution of the state of the cow, so the
+distribution of a phenotype on that day follows from it directly: its mean is
+``vector @ values`` and its variance is ``vector @ values ** 2`` minus the
+square of the mean.\n
+The total of a phenotype over the days so far depends on the whole trajectory.
+Its mean and variance are propagated together with the state vector as two
+more vectors: the expected total so far of the cows in each state, and the
+expected square of that total. With ``P`` the transition matrix, ``f`` the
+value of the phenotype in each state and ``w`` the number of days a value
+counts for, each step is::
+
+    vector = vector @ P
+    squares = squares @ P + 2 * w * f * (totals @ P) + (w * f) ** 2 * vector
+    totals = totals @ P + w * f * vector
+
+The vectors of all phenotypes and cows are the columns of one matrix, which is
+multiplied with the transition matrix in a single sparse product per day.\n
+The percentiles of a day are exact. The percentiles of the totals follow from
+their mean and variance with a normal approximation.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the function:
+***********************
+::
+
+    from cow_builder.moments import phenotype_moments, normal_percentiles
+
+************************************************************
+
+2. Calculate the moments of the milk production and nitrogen emission:
+**********************************************************************
+::
+
+    from cow_builder.monte_carlo import default_phenotypes
+
+    moments = phenotype_moments(cow.initial_state_vector, tm, days=2800,
+                                phenotypes=default_phenotypes(cow),
+                                step_size=14, percentiles=(5, 50, 95))
+    moments.mean['milk'], moments.variance['milk']
+    moments.cumulative_mean['milk'][-1], moments.cumulative_variance['milk'][-1]
+    low, median, high = moments.cumulative_percentiles['milk']
+
+************************************************************
+
+3. Calculate the moments of a herd:
+***********************************
+The state vectors of the cows are given as a matrix with a column per cow, see
+``simulation.initial_state_matrix``. The cows are independent, so the mean and
+variance of the herd are the sums over the cows::
+
+    moments = phenotype_moments(initial_state_matrix(cows), tm, days=2800,
+                                phenotypes=default_phenotypes(cows[0]))
+    herd_mean = moments.cumulative_mean['milk'].sum(axis=1)
+    herd_variance = moments.cumulative_variance['milk'].sum(axis=1)
+    normal_percentiles(herd_mean, herd_variance, (5, 95))
+
+************************************************************
+"""
+from dataclasses import dataclass
+from statistics import NormalDist
+import numpy as np
+from cow_builder.simulation import StatePropagator
+
+
+@dataclass(frozen=True)
+class PhenotypeMoments:
+    """
+    The moments of the phenotypes of a simulation, calculated by
+    ``phenotype_moments``. Each array has a row per day in ``days``, and a column
+    per cow if the simulation had a state vector per cow.
+
+    :Attributes:
+        :var days: The days on which the phenotypes were calculated.
+        :type days: np.ndarray[np.int64]
+        :var percentile_levels: The percentiles in ``percentiles`` and
+            ``cumulative_percentiles``.
+        :type percentile_levels: tuple[float]
+        :var mean: The mean value of each phenotype on the day, by name.
+        :type mean: dict[str, np.ndarray[np.float64]]
+        :var variance: The variance of the value on the day.
+        :type variance: dict[str, np.ndarray[np.float64]]
+        :var percentiles: The percentiles of the value on the day, with the
+            percentiles in the first dimension.
+        :type percentiles: dict[str, np.ndarray[np.float64]]
+        :var cumulative_mean: The mean total until the day, in which each value
+            counts for the number of days since the previous day in ``days``.
+        :type cumulative_mean: dict[str, np.ndarray[np.float64]]
+        :var cumulative_variance: The variance of the total until the day.
+        :type cumulative_variance: dict[str, np.ndarray[np.float64]]
+        :var cumulative_percentiles: The percentiles of the total until the day,
+            with a normal approximation.
+        :type cumulative_percentiles: dict[str, np.ndarray[np.float64]]
+
+    ************************************************************
+    """
+    days: np.ndarray
+    percentile_levels: tuple
+    mean: dict
+    variance: dict
+    percentiles: dict
+    cumulative_mean: dict
+    cumulative_variance: dict
+    cumulative_percentiles: dict
+
+
+def normal_percentiles(mean, variance, percentiles) -> np.ndarray:
+    """
+    Calculates percentiles of normal distributions.
+
+    :param mean: The means of the distributions.
+    :type mean: np.ndarray | float
+    :param variance: The variances of the distributions.
+    :type variance: np.ndarray | float
+    :param percentiles: The percentiles, between 0 and 100.
+    :type percentiles: tuple[float]
+    :return: The percentiles, with the percentiles in the first dimension and
+        the shape of ``mean`` in the others.
+    :rtype: np.ndarray[np.float64]
+    """
+    deviation = np.sqrt(np.maximum(variance, 0.0))
+    return np.array([mean + NormalDist().inv_cdf(percentile / 100) * deviation
+                     for percentile in percentiles], dtype=np.float64)
+
+
+def _weighted_percentiles(values: np.ndarray, weights: np.ndarray,
+                          percentiles) -> np.ndarray:
+    """Returns the percentiles of a discrete distribution with probability
+    ``weights`` of each of ``values``."""
+    order = np.argsort(values, kind='stable')
+    cumulative = np.cumsum(weights[order])
+    targets = np.asarray(percentiles, dtype=np.float64) / 100 * cumulative[-1]
+    positions = np.searchsorted(cumulative, targets, side='left')
+    return values[order][np.minimum(positions, len(values) - 1)]
+
+
+def phenotype_moments(initial_state_vector: np.ndarray, transition_matrix,
+                      days: int, phenotypes: dict, step_size=1,
+                      step_matrix=None, percentiles=(5, 50, 95)) \
+        -> PhenotypeMoments:
+    """
+    Simulates ``days`` days and calculates the mean, variance and percentiles of
+    each phenotype, and of its total since day 0, every ``step_size`` days and
+    on the last day. The means of the totals are those of
+    ``simulation.simulate()`` with callbacks ``(vector @ values) * step_size``.
+
+    :param initial_state_vector: The probability of being in each state on day 0,
+        or a matrix with the state vector of a cow per column.
+    :type initial_state_vector: np.ndarray
+    :param transition_matrix: A square matrix with the probability of moving from
+        the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param days: The number of days to simulate.
+    :type days: int
+    :param phenotypes: The phenotypes by name, as a value per state, or a
+        function that takes the indices of the states with a probability above 0
+        and the day, and returns a value per index, see
+        ``monte_carlo.default_phenotypes``.
+    :type phenotypes: dict[str, np.ndarray | Callable[[np.ndarray, int], np.ndarray]]
+    :param step_size: The interval in days at which the phenotypes are
+        calculated. Defaults to 1.
+    :type step_size: int
+    :param step_matrix: The transition matrix to the power ``step_size``, see
+        ``simulation.state_vectors``. Defaults to None.
+    :type step_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :param percentiles: The percentiles to calculate, between 0 and 100.
+        Defaults to (5, 50, 95).
+    :type percentiles: tuple[float]
+    :return: The moments of the phenotypes.
+    :rtype: PhenotypeMoments
+    :raises ValueError: If ``step_size`` is smaller than 1, ``days`` is negative,
+        or the length of the vector does not match the transition matrix.
+    """
+    if step_size < 1:
+        raise ValueError("The step size must be at least 1 day.")
+    if days < 0:
+        raise ValueError("The number of days cannot be negative.")
+    if len(initial_state_vector) != transition_matrix.shape[0]:
+        raise ValueError("The length of the state vector does not match the "
+                         "transition matrix.")
+    initial_state_vector = np.asarray(initial_state_vector, dtype=np.float64)
+    single = initial_state_vector.ndim == 1
+    initial_state_vectors = initial_state_vector.reshape(
+        len(initial_state_vector), -1)
+    node_count, cow_count = initial_state_vectors.shape
+
+    # The columns are the state vectors of the cows, followed by the totals and
+    # squares of each phenotype.
+    vectors = np.zeros((node_count, cow_count * (1 + 2 * len(phenotypes))),
+                       dtype=np.float64)
+    vectors[:, :cow_count] = initial_state_vectors
+    buffer = np.empty_like(vectors)
+    propagator = StatePropagator(transition_matrix)
+    step_propagator = None if step_matrix is None \
+        else StatePropagator(step_matrix)
+
+    samples = -(-days // step_size)
+    shape = (samples, cow_count)
+    sample_days = np.empty(samples, dtype=np.int64)
+    results = [{name: np.empty(shape) for name in phenotypes}
+               for _ in range(4)]
+    mean, variance, cumulative_mean, cumulative_variance = results
+    daily_percentiles = {name: np.empty((len(percentiles), *shape))
+                         for name in phenotypes}
+    day = 0
+    for sample in range(samples):
+        step = min(step_size, days - day)
+        if step_propagator is not None and step == step_size:
+            step_propagator.step(vectors, buffer)
+            vectors, buffer = buffer, vectors
+        else:
+            for _ in range(step):
+                propagator.step(vectors, buffer)
+                vectors, buffer = buffer, vectors
+        day += step
+        sample_days[sample] = day
+
+        support = np.flatnonzero(vectors[:, :cow_count].any(axis=1))
+        probabilities = vectors[support, :cow_count]
+        for number, (name, phenotype) in enumerate(phenotypes.items()):
+            values = phenotype(support, day) if callable(phenotype) \
+                else np.asarray(phenotype, dtype=np.float64)[support]
+            values = np.asarray(values, dtype=np.float64)
+            totals = slice(cow_count * (1 + 2 * number),
+                           cow_count * (2 + 2 * number))
+            squares = slice(totals.stop, totals.stop + cow_count)
+            weighted = (step * values)[:, np.newaxis]
+            vectors[support, squares] += \
+                2 * weighted * vectors[support, totals] + \
+                weighted ** 2 * probabilities
+            vectors[support, totals] += weighted * probabilities
+
+            mean[name][sample] = values @ probabilities
+            variance[name][sample] = values ** 2 @ probabilities - \
+                mean[name][sample] ** 2
+            for cow in range(cow_count):
+                daily_percentiles[name][:, sample, cow] = _weighted_percentiles(
+                    values, probabilities[:, cow], percentiles)
+            cumulative_mean[name][sample] = vectors[support, totals].sum(axis=0)
+            cumulative_variance[name][sample] = \
+                vectors[support, squares].sum(axis=0) - \
+                cumulative_mean[name][sample] ** 2
+
+    # Rounding can make a variance slightly negative.
+    for result in (variance, cumulative_variance):
+        for array in result.values():
+            np.maximum(array, 0.0, out=array)
+    cumulative_percentiles = {
+        name: normal_percentiles(cumulative_mean[name],
+                                 cumulative_variance[name], percentiles)
+        for name in phenotypes}
+    if single:
+        for result in (*results, daily_percentiles, cumulative_percentiles):
+            for name in result:
+                result[name] = result[name][..., 0]
+    return PhenotypeMoments(
+        days=sample_days, percentile_levels=tuple(percentiles), mean=mean,
+        variance=variance, percentiles=daily_percentiles,
+        cumulative_mean=cumulative_mean,
+        cumulative_variance=cumulative_variance,
+        cumulative_percentiles=cumulative_percentiles)
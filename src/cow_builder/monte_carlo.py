@@ -0,0 +1,288 @@
+"""
+:module: monte_carlo
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the TrajectorySampler class and the functions
+    that draw individual trajectories of a ``DigitalCow`` from its transition
+    matrix.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+A simulation with state vectors gives the expected phenotypes of a cow. To know
+their spread, such as the spread of the day a cow exits, individual trajectories
+are drawn instead: each trajectory is in a single state on each day, and moves
+to the next state with the probabilities of the row of its state in the
+transition matrix. All trajectories move at once: one uniform number is drawn
+per trajectory per day, and the next state is found by a binary search in the
+cumulative probabilities of the row.\n
+The numbers are drawn by a ``numpy.random.Generator``. With the same seed, the
+same trajectories are drawn.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the functions:
+************************
+::
+
+    from cow_builder.monte_carlo import sample_trajectories, TrajectorySampler, \\
+        default_phenotypes
+
+************************************************************
+
+2. Draw trajectories of a cow:
+******************************
+The states of the cow must be generated first. The milk production and nitrogen
+emission of each trajectory are returned every ``step_size`` days, with a row
+per day and a column per trajectory::
+
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    trajectories = sample_trajectories(cow, trajectory_count=10000, days=5000,
+                                       step_size=30, seed=42)
+    monthly_milk = trajectories.series['milk']
+    np.percentile(trajectories.exit_days, [5, 50, 95])
+
+Other phenotypes are given as a value per state, or as a function of the states
+of the trajectories and the day::
+
+    trajectories = sample_trajectories(
+        cow, 10000, 5000, seed=42,
+        phenotypes={'lactating': cow.total_states.lactation_numbers > 0})
+
+************************************************************
+
+3. Draw the next states:
+************************
+::
+
+    sampler = TrajectorySampler(tm)
+    rng = np.random.default_rng(42)
+    states = np.full(10000, cow.current_state_index)
+    for day in range(100):
+        states = sampler.step(states, rng)
+
+************************************************************
+"""
+from dataclasses import dataclass
+from typing import Callable
+import numpy as np
+from cow_builder.state_space import EXIT
+
+
+@dataclass(frozen=True)
+class Trajectories:
+    """
+    The trajectories drawn by ``sample_trajectories``.
+
+    :Attributes:
+        :var days: The days on which the phenotypes were calculated.
+        :type days: np.ndarray[np.int64]
+        :var states: The index of the state of each trajectory, with a row per
+            day in ``days`` and a column per trajectory.
+        :type states: np.ndarray[np.int32]
+        :var series: The phenotypes of each trajectory by name, with a row per day
+            in ``days`` and a column per trajectory. A value is the value of the
+            day times the number of days since the previous row, so the sum over
+            the rows is the total of the trajectory.
+        :type series: dict[str, np.ndarray[np.float64]]
+        :var exit_days: The first day each trajectory is in an Exit state, or -1
+            if it did not exit.
+        :type exit_days: np.ndarray[np.int64]
+
+    ************************************************************
+    """
+    days: np.ndarray
+    states: np.ndarray
+    series: dict
+    exit_days: np.ndarray
+
+
+class TrajectorySampler:
+    """
+    Draws the next state of many trajectories at once from a transition matrix.
+
+    :Attributes:
+        :var _indptr: The start of the transitions of each row.
+        :type _indptr: np.ndarray[np.int64]
+        :var _indices: The state each transition moves into.
+        :type _indices: np.ndarray[np.int32]
+        :var _cumulative: The cumulative probability of the transitions of each
+            row, restarting at each row.
+        :type _cumulative: np.ndarray[np.float64]
+        :var _searches: The number of halvings of a binary search in the longest
+            row.
+        :type _searches: int
+
+    :Methods:
+        __init__(transition_matrix)\n
+        step(states, rng, out)\n
+
+    ************************************************************
+    """
+
+    def __init__(self, transition_matrix):
+        """
+        Initializes a new instance of a TrajectorySampler object.
+
+        :param transition_matrix: A square matrix with the probability of moving
+            from the state of a row to the state of a column.
+        :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+        :raises ValueError: If the transition matrix is not square, or a row has
+            no transitions.
+        """
+        from scipy.sparse import csr_matrix
+        rows, columns = transition_matrix.shape
+        if rows != columns:
+            raise ValueError("The transition matrix must be square.")
+        matrix = csr_matrix(transition_matrix, dtype=np.float64)
+        matrix.sort_indices()
+        lengths = np.diff(matrix.indptr)
+        if np.any(lengths == 0):
+            raise ValueError("Every state must have a transition.")
+        self._indptr = matrix.indptr.astype(np.int64)
+        self._indices = matrix.indices
+        # The cumulative sum over all entries, minus the sum of the previous
+        # rows, restarts at each row.
+        cumulative = np.cumsum(matrix.data)
+        previous = np.concatenate(([0.0], cumulative[self._indptr[1:-1] - 1]))
+        self._cumulative = cumulative - np.repeat(previous, lengths)
+        self._searches = int(np.ceil(np.log2(lengths.max()))) if rows else 0
+
+    def step(self, states: np.ndarray, rng: np.random.Generator,
+             out=None) -> np.ndarray:
+        """
+        Draws the state of the next day of each trajectory.
+
+        :param states: The index of the state of each trajectory.
+        :type states: np.ndarray[int]
+        :param rng: The generator of the uniform numbers.
+        :type rng: np.random.Generator
+        :param out: The array in which the next states are written. It may be
+            ``states``. Defaults to None, which allocates a new array.
+        :type out: np.ndarray[int] | None
+        :return: The index of the next state of each trajectory.
+        :rtype: np.ndarray[int]
+        """
+        low = self._indptr[states]
+        high = self._indptr[states + 1] - 1
+        # A row that sums to less than 1, such as a row of a pruned matrix power,
+        # is scaled to 1.
+        target = rng.random(len(states)) * self._cumulative[high]
+        # Finds the first transition of which the cumulative probability is
+        # above the target. The last transition of the row is the fallback.
+        for _ in range(self._searches):
+            middle = (low + high) >> 1
+            above = self._cumulative[middle] > target
+            high = np.where(above, middle, high)
+            low = np.where(above, low, np.minimum(middle + 1, high))
+        if out is None:
+            return self._indices[low]
+        return np.take(self._indices, low, out=out)
+
+    @property
+    def node_count(self) -> int:
+        """The number of states."""
+        return len(self._indptr) - 1
+
+
+def default_phenotypes(digital_cow) -> dict:
+    """
+    Creates the default phenotypes of ``sample_trajectories``: the daily milk
+    production in kg as ``'milk'`` and the daily nitrogen emission in g as
+    ``'nitrogen'``. Both are 0 in the Exit states.
+
+    :param digital_cow: A DigitalCow object for which the states are generated.
+    :type digital_cow: DigitalCow
+    :return: The milk production as a value per state, and the nitrogen
+        emission as a function that takes the indices of states and the day,
+        and returns a value per index. The nitrogen emission is calculated once
+        per distinct state, at the age of the cow on the day.
+    :rtype: dict[str, np.ndarray | Callable[[np.ndarray, int], np.ndarray]]
+    """
+    phenotypes = digital_cow.phenotypes
+
+    def nitrogen(states: np.ndarray, day: int) -> np.ndarray:
+        distinct, inverse = np.unique(states, return_inverse=True)
+        return phenotypes.nitrogen(digital_cow.age + day, distinct)[inverse]
+    return {'milk': phenotypes.milk, 'nitrogen': nitrogen}
+
+
+def sample_trajectories(digital_cow, trajectory_count: int, days: int,
+                        step_size=1, seed=None, phenotypes=None,
+                        transition_matrix=None,
+                        initial_state_vector=None) -> Trajectories:
+    """
+    Draws ``trajectory_count`` trajectories of ``days`` days of ``digital_cow``,
+    and calculates their phenotypes every ``step_size`` days and on the last day.
+
+    :param digital_cow: A DigitalCow object for which the states are generated.
+    :type digital_cow: DigitalCow
+    :param trajectory_count: The number of trajectories.
+    :type trajectory_count: int
+    :param days: The number of days to simulate.
+    :type days: int
+    :param step_size: The interval in days at which the phenotypes are
+        calculated. Defaults to 1.
+    :type step_size: int
+    :param seed: The seed of the generator, or the generator itself. Defaults
+        to None, which draws different trajectories each time.
+    :type seed: int | np.random.Generator | None
+    :param phenotypes: The phenotypes by name, as a value per state of
+        ``total_states``, or a function that takes the states of the
+        trajectories and the day, and returns a value per trajectory. Defaults
+        to ``default_phenotypes``.
+    :type phenotypes: dict[str, np.ndarray | Callable] | None
+    :param transition_matrix: The transition matrix of the cow. Defaults to the
+        matrix of ``transition_matrix.build_transition_matrix()``, which is the
+        matrix assembled from ``state_probability_generator``.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :param initial_state_vector: The probability of each state on day 0, from
+        which the first state of each trajectory is drawn. Defaults to the
+        ``initial_state_vector`` of the cow.
+    :type initial_state_vector: np.ndarray | None
+    :return: The states, phenotypes and exit days of the trajectories.
+    :rtype: Trajectories
+    :raises ValueError: If ``step_size`` is smaller than 1, or ``days`` is
+        negative.
+    """
+    from cow_builder.transition_matrix import build_transition_matrix
+    if step_size < 1:
+        raise ValueError("The step size must be at least 1 day.")
+    if days < 0:
+        raise ValueError("The number of days cannot be negative.")
+    total_states = digital_cow.total_states
+    if transition_matrix is None:
+        transition_matrix = build_transition_matrix(digital_cow)
+    if initial_state_vector is None:
+        initial_state_vector = digital_cow.initial_state_vector
+    if phenotypes is None:
+        phenotypes = default_phenotypes(digital_cow)
+    rng = np.random.default_rng(seed)
+    sampler = TrajectorySampler(transition_matrix)
+    exits = total_states.life_states == EXIT
+
+    initial_state_vector = np.asarray(initial_state_vector, dtype=np.float64)
+    states = rng.choice(len(initial_state_vector), size=trajectory_count,
+                        p=initial_state_vector / initial_state_vector.sum())
+    states = states.astype(np.int32)
+    exit_days = np.where(exits[states], 0, -1).astype(np.int64)
+    samples = -(-days // step_size)
+    sample_days = np.empty(samples, dtype=np.int64)
+    sample_states = np.empty((samples, trajectory_count), dtype=np.int32)
+    series = {name: np.empty((samples, trajectory_count), dtype=np.float64)
+              for name in phenotypes}
+    previous_day = 0
+    for sample in range(samples):
+        day = min(previous_day + step_size, days)
+        for current_day in range(previous_day + 1, day + 1):
+            sampler.step(states, rng, out=states)
+            exit_days[(exit_days < 0) & exits[states]] = current_day
+        sample_days[sample] = day
+        sample_states[sample] = states
+        for name, phenotype in phenotypes.items():
+            values = phenotype(states, day) if callable(phenotype) \
+                else np.asarray(phenotype)[states]
+            series[name][sample] = values * (day - previous_day)
+        previous_day = day
+    return Trajectories(days=sample_days, states=sample_states, series=series,
+                        exit_days=exit_days)
@@ -0,0 +1,441 @@
+"""
+:module: phenotypes
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the StatePhenotypes class, which holds the
+    phenotypes of each state of a ``DigitalCow`` as arrays aligned with its
+    ``total_states``, and the function that calculates the expected phenotype of
+    a state vector with them.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+The phenotypes of a state vector are a sum over the states. Instead of looking
+up each state with a probability above 0, the phenotypes of all states are kept
+in arrays in the order of ``total_states``, so the phenotype of a state vector
+is a dot product of the vector, or of a mask of the vector, with an array.\n
+There are two ways to calculate the expected phenotype of a state vector:
+
+* ``'count'``: The mean over the states with a probability above 0, without the
+  Exit states. Each state counts once, whatever its probability. This is the
+  phenotype of ``vector_milk_production`` and ``vector_nitrogen_emission``.
+* ``'probability'``: The mean over the states weighted by their probability,
+  without the Exit states: the expected phenotype of the cow while it is in the
+  herd.
+
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the class and function:
+*********************************
+::
+
+    from cow_builder.phenotypes import StatePhenotypes, phenotype_expectation
+
+************************************************************
+
+2. Get the phenotypes of the states of a cow:
+*********************************************
+The phenotypes of a cow are created once for its states::
+
+    phenotypes = cow.phenotypes
+    phenotypes.milk
+    phenotypes.body_weight(age=900)
+    phenotypes.dmi(age=900)
+    phenotypes.nitrogen(age=900)
+
+************************************************************
+
+3. Calculate the expected phenotype of a state vector:
+******************************************************
+::
+
+    phenotype_expectation(vector, phenotypes.milk, phenotypes.in_herd,
+                          mode='probability')
+
+The vector phenotype functions take the mode as well::
+
+    vector_milk_production(vector, day, step_size, digital_cow=cow,
+                           intermediate_accumulator=None, mode='probability')
+
+************************************************************
+"""
+from functools import cache
+import numpy as np
+from cow_builder.state_space import StateTable, EXIT
+
+EXPECTATION_MODES = ('count', 'probability')
+# The lactation numbers of which the body weight has its own parameters, see
+# ``digital_cow.set_korver_function_variables``. Higher lactations share the
+# parameters of the last.
+KORVER_CLASSES = 4
+# The diets of ``digital_cow.nitrogen_emission``: the close-up diet, the
+# far-off diet, and the mean of both.
+DIET_CLOSE_UP, DIET_FAR_OFF, DIET_MIXED = 0, 1, 2
+
+
+def phenotype_expectation(vector: np.ndarray, values: np.ndarray,
+                          in_herd: np.ndarray, mode='count') -> float:
+    """
+    Calculates the expected phenotype of a state vector.
+
+    :param vector: The probability of being in each state.
+    :type vector: np.ndarray
+    :param values: The phenotype of each state.
+    :type values: np.ndarray[np.float64]
+    :param in_herd: Whether each state is not an Exit state.
+    :type in_herd: np.ndarray[bool]
+    :param mode: ``'count'`` for the mean over the states with a probability
+        above 0, or ``'probability'`` for the mean weighted by the
+        probabilities. Defaults to ``'count'``.
+    :type mode: str
+    :return: The expected phenotype, or 0 if the cow has exited.
+    :rtype: float
+    :raises ValueError: If the mode is unknown.
+    """
+    present = np.flatnonzero((vector > 0) & in_herd)
+    if mode == 'count':
+        weight = len(present)
+        total = values[present].sum()
+    elif mode == 'probability':
+        probabilities = vector[present]
+        weight = probabilities.sum()
+        total = values[present] @ probabilities
+    else:
+        raise ValueError(f"The mode must be one of {EXPECTATION_MODES}, not "
+                         f"{mode!r}.")
+    if weight == 0:
+        return 0
+    return float(total / weight)
+
+
+@cache
+def korver_parameters() -> np.ndarray:
+    """
+    Returns the parameters of the body weight functions of each lactation
+    class, see ``digital_cow.set_korver_function_variables``.
+
+    :return: A row per lactation number up to ``KORVER_CLASSES - 1``, with the
+        columns birth weight, mature live weight, growth rate, pregnancy
+        parameter, maximum decrease of live weight and duration of the minimum
+        live weight. The parameters a heifer does not have are NaN. The array
+        is read-only.
+    :rtype: np.ndarray[np.float64]
+    """
+    from cow_builder.digital_cow import set_korver_function_variables
+    parameters = np.array([[np.nan if value is None else value
+                            for value in set_korver_function_variables(ln)]
+                           for ln in range(KORVER_CLASSES)], dtype=np.float64)
+    parameters.flags.writeable = False
+    return parameters
+
+
+def korver_classes(total_states: StateTable) -> np.ndarray:
+    """
+    Determines the lactation class of each state, which is the row of its
+    parameters in ``korver_parameters``.
+
+    :param total_states: The states.
+    :type total_states: StateTable
+    :return: The lactation class of each state.
+    :rtype: np.ndarray[np.int8]
+    """
+    return np.minimum(total_states.lactation_numbers, KORVER_CLASSES - 1)
+
+
+def state_body_weight_vector(total_states: StateTable) -> np.ndarray:
+    """
+    Calculates the part of the body weight of each state that does not depend on
+    the age, with the formulas of ``digital_cow.state_body_weight``.
+
+    :param total_states: The states.
+    :type total_states: StateTable
+    :return: The part of the body weight in kg of each state that does not
+        depend on the age.
+    :rtype: np.ndarray[np.float64]
+    """
+    birth_weight, _, growth_rate, pregnancy_parameter, \
+        max_decrease_live_weight, duration_minimum_live_weight = \
+        korver_parameters()[korver_classes(total_states)].T
+    days_in_milk = total_states.days_in_milk.astype(np.float64)
+    heifer = total_states.lactation_numbers == 0
+    with np.errstate(invalid='ignore'):
+        dpc = np.maximum(total_states.days_pregnant - 50.0, 0.0)
+        lactation_weight = \
+            max_decrease_live_weight * \
+            (days_in_milk / duration_minimum_live_weight) * \
+            np.exp(1 - days_in_milk / duration_minimum_live_weight) + \
+            pregnancy_parameter ** 3 * dpc ** 3
+    heifer_weight = np.minimum(
+        np.maximum(birth_weight, 27.2 + growth_rate * days_in_milk), 580)
+    return np.where(heifer, heifer_weight, lactation_weight)
+
+
+def growth_body_weight_vector(age) -> np.ndarray:
+    """
+    Calculates the part of the body weight that depends on the age for each
+    lactation class, with the formula of ``digital_cow.growth_body_weight``.
+
+    :param age: The age of the cow in days, or an array of ages.
+    :type age: float | np.ndarray[np.float64]
+    :return: The part of the body weight in kg that depends on the age, with the
+        lactation classes in the last dimension and the shape of ``age`` in the
+        others. It is 0 for heifers.
+    :rtype: np.ndarray[np.float64]
+    """
+    birth_weight, mature_live_weight, growth_rate = korver_parameters()[1:, :3].T
+    age = np.asarray(age, dtype=np.float64)[..., np.newaxis]
+    growth = np.zeros(age.shape[:-1] + (KORVER_CLASSES,), dtype=np.float64)
+    growth[..., 1:] = \
+        mature_live_weight * (1 - (1 - (birth_weight / mature_live_weight)
+                                   ** (1 / 3)) *
+                              np.exp(-growth_rate * age)) ** 3
+    return growth
+
+
+def body_weight_vector(total_states: StateTable, age) -> np.ndarray:
+    """
+    Calculates the body weight of each state at ``age``, with the formulas of
+    ``digital_cow.calculate_body_weight``: the sum of
+    ``state_body_weight_vector`` and ``growth_body_weight_vector``.
+
+    :param total_states: The states.
+    :type total_states: StateTable
+    :param age: The age of the cow in days, or an age for each state.
+    :type age: float | np.ndarray[np.float64]
+    :return: The body weight in kg of each state.
+    :rtype: np.ndarray[np.float64]
+    """
+    return _add_growth(state_body_weight_vector(total_states),
+                       korver_classes(total_states), age)
+
+
+def _add_growth(state_weight: np.ndarray, classes: np.ndarray,
+                age) -> np.ndarray:
+    """Adds the growth at ``age``, or at an age per state, to the part of the
+    body weight of each state that does not depend on the age."""
+    growth = growth_body_weight_vector(age)
+    if growth.ndim == 1:
+        # One age: a growth per class, picked for each state.
+        return growth[classes] + state_weight
+    return growth[np.arange(len(classes)), classes] + state_weight
+
+
+def dmi_vector(total_states: StateTable, body_weight: np.ndarray) -> np.ndarray:
+    """
+    Calculates the dry matter intake of each state, with the formula of
+    ``digital_cow.calculate_dmi``.
+
+    :param total_states: The states.
+    :type total_states: StateTable
+    :param body_weight: The body weight in kg of each state.
+    :type body_weight: np.ndarray[np.float64]
+    :return: The dry matter intake in kg of each state.
+    :rtype: np.ndarray[np.float64]
+    """
+    return (0.372 * total_states.milk_output +
+            0.0968 * body_weight ** 0.75) * \
+        (1 - np.exp(-0.192 * (total_states.days_in_milk / 7 + 3.67)))
+
+
+def diet_branches(herd, total_states: StateTable) -> np.ndarray:
+    """
+    Determines the diet of each state, with the conditions of
+    ``digital_cow.nitrogen_emission``. The conditions are evaluated for all
+    states at once as boolean masks.
+
+    :param herd: The herd of which the days pregnant limit, voluntary waiting
+        period and dry period are used.
+    :type herd: DigitalHerd
+    :param total_states: The states.
+    :type total_states: StateTable
+    :return: The diet of each state: ``DIET_CLOSE_UP``, ``DIET_FAR_OFF`` or
+        ``DIET_MIXED``.
+    :rtype: np.ndarray[np.int8]
+    """
+    lactation_numbers = total_states.lactation_numbers
+    lactations = range(int(lactation_numbers.max(initial=0)) + 1)
+    dp_limit, vwp, dry_period = (
+        np.array([getter(ln) for ln in lactations],
+                 dtype=np.float64)[lactation_numbers]
+        for getter in (herd.get_days_pregnant_limit,
+                       herd.get_voluntary_waiting_period,
+                       herd.get_duration_dry))
+    close_up = dry_period / 2
+    days_in_milk = total_states.days_in_milk
+    days_pregnant = total_states.days_pregnant
+    heifer = lactation_numbers == 0
+    lactating = ~heifer
+
+    close_up_diet = (lactating & (days_pregnant >= dp_limit - close_up)) | \
+        (heifer & (days_in_milk < vwp / 2)) | \
+        (lactating & (days_in_milk < 100))
+    far_off_diet = ~close_up_diet & (
+        (lactating & (dp_limit - dry_period <= days_pregnant) &
+         (days_pregnant < dp_limit - close_up)) |
+        (heifer & (days_in_milk >= vwp / 2)))
+    branches = np.full(len(total_states), DIET_MIXED, dtype=np.int8)
+    branches[close_up_diet] = DIET_CLOSE_UP
+    branches[far_off_diet] = DIET_FAR_OFF
+    return branches
+
+
+def nitrogen_vector(total_states: StateTable, branches: np.ndarray,
+                    dmi: np.ndarray, diet_cp_cu: float, diet_cp_fo: float,
+                    milk_cp: float) -> np.ndarray:
+    """
+    Calculates the nitrogen emission in manure of each state, with the formulas
+    of ``digital_cow.nitrogen_emission``: ``manure_nitrogen_output`` for
+    lactating cows and ``total_manure_nitrogen_output`` for heifers.
+
+    :param total_states: The states.
+    :type total_states: StateTable
+    :param branches: The diet of each state, see ``diet_branches``.
+    :type branches: np.ndarray[np.int8]
+    :param dmi: The dry matter intake in kg of each state.
+    :type dmi: np.ndarray[np.float64]
+    :param diet_cp_cu: The crude protein in the close-up diet in g/kg.
+    :type diet_cp_cu: float
+    :param diet_cp_fo: The crude protein in the far-off diet in g/kg.
+    :type diet_cp_fo: float
+    :param milk_cp: The crude protein in the milk in %.
+    :type milk_cp: float
+    :return: The nitrogen emission in g of each state.
+    :rtype: np.ndarray[np.float64]
+    """
+    diet_cp = np.array([diet_cp_cu / 1000, diet_cp_fo / 1000,
+                        ((diet_cp_fo + diet_cp_cu) / 2) / 1000])[branches]
+    lactating = ((dmi * (diet_cp * 100)) / 0.625) - \
+        ((total_states.milk_output * milk_cp) / 0.638) - 5
+    heifer = 15.1 + (0.83 * (dmi * diet_cp / 0.625))
+    return np.where(total_states.lactation_numbers == 0, heifer, lactating)
+
+
+class StatePhenotypes:
+    """
+    The phenotypes of the states of a ``DigitalCow``, as arrays aligned with its
+    ``total_states``. The body weight, dry matter intake and nitrogen emission
+    depend on the age of the cow, and are calculated for an age.
+
+    :Attributes:
+        :var _digital_cow: The cow of which the diet and herd are used.
+        :type _digital_cow: DigitalCow
+        :var _total_states: The states of the cow.
+        :type _total_states: StateTable
+        :var _in_herd: Whether each state is not an Exit state.
+        :type _in_herd: np.ndarray[bool]
+        :var _milk: The milk production in kg of each state, 0 in the Exit
+            states.
+        :type _milk: np.ndarray[np.float64]
+        :var _diet_branches: The diet of each state, see ``diet_branches``.
+        :type _diet_branches: np.ndarray[np.int8]
+        :var _korver_classes: The lactation class of each state, see
+            ``korver_classes``.
+        :type _korver_classes: np.ndarray[np.int8]
+        :var _state_body_weight: The part of the body weight in kg of each state
+            that does not depend on the age, see ``state_body_weight_vector``.
+        :type _state_body_weight: np.ndarray[np.float64]
+
+    :Methods:
+        __init__(digital_cow)\n
+        body_weight(age, indices)\n
+        dmi(age)\n
+        nitrogen(age, indices)\n
+
+    ************************************************************
+    """
+
+    def __init__(self, digital_cow):
+        """
+        Initializes a new instance of a StatePhenotypes object.
+
+        :param digital_cow: A DigitalCow object for which the states are
+            generated.
+        :type digital_cow: DigitalCow
+        """
+        self._digital_cow = digital_cow
+        self._total_states = digital_cow.total_states
+        self._in_herd = self._total_states.life_states != EXIT
+        self._milk = np.where(self._in_herd, self._total_states.milk_output, 0.0)
+        self._diet_branches = diet_branches(digital_cow.herd,
+                                            self._total_states)
+        self._korver_classes = korver_classes(self._total_states)
+        self._state_body_weight = state_body_weight_vector(self._total_states)
+        for array in (self._in_herd, self._milk, self._korver_classes,
+                      self._state_body_weight):
+            array.flags.writeable = False
+
+    def body_weight(self, age, indices=None) -> np.ndarray:
+        """
+        Calculates the body weight of states. The part that does not depend on
+        the age is calculated once, so only the growth of each lactation class
+        is calculated for the age.
+
+        :param age: The age of the cow in days, or an age for each state in
+            ``indices``.
+        :type age: float | np.ndarray[np.float64]
+        :param indices: The indices of the states. Defaults to None, which
+            calculates the body weight of all states.
+        :type indices: np.ndarray[int] | None
+        :return: The body weight in kg of each state in ``indices``.
+        :rtype: np.ndarray[np.float64]
+        """
+        if indices is None:
+            return _add_growth(self._state_body_weight, self._korver_classes,
+                               age)
+        return _add_growth(self._state_body_weight[indices],
+                           self._korver_classes[indices], age)
+
+    def dmi(self, age: float) -> np.ndarray:
+        """
+        Calculates the dry matter intake of each state.
+
+        :param age: The age of the cow in days.
+        :type age: float
+        :return: The dry matter intake in kg of each state.
+        :rtype: np.ndarray[np.float64]
+        """
+        return dmi_vector(self._total_states, self.body_weight(age))
+
+    def nitrogen(self, age, indices=None) -> np.ndarray:
+        """
+        Calculates the nitrogen emission of states, with the formulas of
+        ``digital_cow.nitrogen_emission`` evaluated for all states at once, see
+        ``nitrogen_vector``. The diet of the cow is read on each call.
+
+        :param age: The age of the cow in days, or an age for each state in
+            ``indices``.
+        :type age: float | np.ndarray[np.float64]
+        :param indices: The indices of the states. Defaults to None, which
+            calculates the nitrogen emission of all states.
+        :type indices: np.ndarray[int] | None
+        :return: The nitrogen emission in g of each state in ``indices``, 0 in
+            the Exit states.
+        :rtype: np.ndarray[np.float64]
+        """
+        states, branches, in_herd = \
+            self._total_states, self._diet_branches, self._in_herd
+        if indices is not None:
+            indices = np.asarray(indices, dtype=np.int64)
+            states = states.take(indices)
+            branches, in_herd = branches[indices], in_herd[indices]
+        dmi = dmi_vector(states, self.body_weight(age, indices))
+        cow = self._digital_cow
+        nitrogen = nitrogen_vector(states, branches, dmi, cow.diet_cp_cu,
+                                   cow.diet_cp_fo, cow.milk_cp)
+        return np.where(in_herd, nitrogen, 0.0)
+
+    @property
+    def total_states(self) -> StateTable:
+        """The states of the phenotypes."""
+        return self._total_states
+
+    @property
+    def in_herd(self) -> np.ndarray:
+        """Whether each state is not an Exit state."""
+        return self._in_herd
+
+    @property
+    def milk(self) -> np.ndarray:
+        """The milk production in kg of each state, 0 in the Exit states."""
+        return self._milk
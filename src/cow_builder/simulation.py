@@ -0,0 +1,693 @@
+"""
+:module: simulation
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the StatePropagator class and the functions that
+    simulate a ``DigitalCow`` through time with its transition matrix, using only
+    NumPy and SciPy.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+A simulation starts with a state vector, such as the ``initial_state_vector`` of
+a ``DigitalCow``, which holds the probability of the cow being in each state.
+Each day the vector is multiplied with the transition matrix. Every
+``step_size`` days the phenotype callbacks are called with the vector. The
+vectors are kept in buffers that are allocated once, so a simulation step does
+not allocate memory.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the functions:
+************************
+::
+
+    from cow_builder.simulation import simulate, state_vectors, matrix_power, \\
+        simulate_herd, initial_state_matrix, herd_phenotype, permute_matrix
+
+************************************************************
+
+2. Simulate a cow:
+******************
+The phenotype callbacks are given as keyword arguments. Each callback is called
+with the state vector, the day in the simulation and the number of days since
+the previous call, and its results are summed. The vector phenotype functions of
+the ``digital_cow`` module can be used as callbacks::
+
+    from functools import partial
+    from cow_builder.digital_cow import vector_milk_production, \\
+        vector_nitrogen_emission
+
+    tm = build_transition_matrix(cow)
+    accumulated = simulate(cow.initial_state_vector, tm, days=2800,
+                           step_size=14,
+                           milk=partial(vector_milk_production, digital_cow=cow,
+                                        intermediate_accumulator=None),
+                           nitrogen=partial(vector_nitrogen_emission,
+                                            digital_cow=cow,
+                                            intermediate_accumulator=None))
+    accumulated['milk'], accumulated['nitrogen']
+
+************************************************************
+
+3. Iterate over the state vectors:
+**********************************
+::
+
+    for vector, day in state_vectors(cow.initial_state_vector, tm, days=2800,
+                                     step_size=14):
+        ...
+
+The same vector object is returned each time, it must be copied to be kept.
+
+************************************************************
+
+4. Skip days with a power of the transition matrix:
+***************************************************
+If the callbacks are only needed every ``step_size`` days, the vector can be
+multiplied once per step with the transition matrix to the power ``step_size``,
+instead of once per day. Entries of the power below ``tolerance`` can be
+removed to keep it sparse::
+
+    from cow_builder.simulation import matrix_power
+
+    tm_14 = matrix_power(tm, 14)
+    accumulated = simulate(cow.initial_state_vector, tm, days=2800,
+                           step_size=14, step_matrix=tm_14, **callbacks)
+
+The power can also be loaded from a ``MatrixCache``, which stores it next to
+the transition matrix::
+
+    tm_14 = MatrixCache().matrix_power(cow, 14)
+
+************************************************************
+
+5. Simulate a herd:
+*******************
+The cows of a herd for which the states are generated with the same limits
+share their transition matrix, so they can be simulated at once. The result
+contains a series per callback, with a row per day on which the callbacks are
+called and a column per cow::
+
+    cows = a_herd.herd
+    days, series = simulate_herd(
+        initial_state_matrix(cows), tm, days=2800, step_size=14,
+        milk=herd_phenotype(vector_milk_production, cows),
+        nitrogen=herd_phenotype(vector_nitrogen_emission, cows))
+    milk_per_cow = series['milk']
+    milk_of_herd = series['milk'].sum(axis=1)
+
+************************************************************
+
+6. Multiply only the frontier:
+******************************
+A cow starts in a single state, and its probability spreads over a small part of
+the states. While less than ``fill_ratio`` of the states has a probability above
+0, ``simulate`` and ``state_vectors`` multiply only the rows of those states, so
+that a day costs time proportional to them. When the probability has spread
+further, the whole vector is multiplied. To always multiply the whole vector,
+use::
+
+    accumulated = simulate(cow.initial_state_vector, tm, days=2800,
+                           fill_ratio=0, **callbacks)
+
+************************************************************
+
+7. Multiply in banded order:
+****************************
+The transitions of a state lie in a narrow band after it when the states are in
+the order of ``state_space.band_order``, so a multiplication reads the vector
+almost sequentially. States in another order can be multiplied in the banded
+order, while the vectors are returned in the order of the states::
+
+    from cow_builder.state_space import band_order
+
+    accumulated = simulate(initial_state_vector, tm, days=2800,
+                           order=band_order(total_states), **callbacks)
+
+The states of ``generate_total_states()`` are already in the banded order, for
+them the order is the identity and nothing is permuted.
+
+************************************************************
+"""
+from functools import cache
+from typing import Callable, Generator
+import numpy as np
+
+# The kernels of SciPy that multiply a sparse matrix into an existing array.
+# The transposed of a CSR matrix is a CSC matrix with the same arrays, so the
+# CSC kernels multiply a vector with a CSR transition matrix without copying it.
+# They are private, so they are only used after ``_kernels_work`` has checked
+# them.
+try:
+    from scipy.sparse._sparsetools import csc_matvec as _csc_matvec, \
+        csc_matvecs as _csc_matvecs
+except ImportError:
+    _csc_matvec = _csc_matvecs = None
+
+DEFAULT_FILL_RATIO = 0.03
+# The number of steps after which a FrontierPropagator that multiplies whole
+# vectors counts the states with a probability above 0 again.
+FRONTIER_CHECK_INTERVAL = 64
+
+
+@cache
+def _kernels_work(index_dtype: np.dtype) -> bool:
+    """Returns whether the private kernels of SciPy exist and multiply a vector
+    with a small CSR matrix with indices of ``index_dtype`` like the public
+    product does. Any error, such as a changed signature, means they are not
+    used."""
+    if _csc_matvec is None or _csc_matvecs is None:
+        return False
+    from scipy.sparse import csr_matrix
+    matrix = csr_matrix(np.array([[0.5, 0.5, 0.0], [0.0, 0.25, 0.75],
+                                  [0.0, 0.0, 1.0]]))
+    indptr = matrix.indptr.astype(index_dtype)
+    indices = matrix.indices.astype(index_dtype)
+    vector = np.array([1.0, 2.0, 3.0])
+    vectors = np.ascontiguousarray(np.column_stack((vector, 2 * vector)))
+    out = np.zeros(3)
+    outs = np.zeros((3, 2))
+    try:
+        _csc_matvec(3, 3, indptr, indices, matrix.data, vector, out)
+        _csc_matvecs(3, 3, 2, indptr, indices, matrix.data, vectors, outs)
+    except Exception:
+        return False
+    return np.allclose(out, vector @ matrix) and \
+        np.allclose(outs, matrix.T @ vectors)
+
+
+class StatePropagator:
+    """
+    Multiplies state vectors with a transition matrix, without allocating memory.
+    The state vectors of several cows can be multiplied at once as the columns of
+    a matrix.
+
+    :Attributes:
+        :var _node_count: The number of states.
+        :type _node_count: int
+        :var _matrix: The transition matrix. A CSR matrix of 64-bit floats is
+            used as it is, so its arrays, which may be memory mapped, are not
+            copied. Its transposed, a CSC matrix with the same arrays, is
+            multiplied with the vectors.
+        :type _matrix: scipy.sparse.csr_matrix
+        :var _kernels: Whether the private kernels of SciPy are used, which
+            write into ``out`` without allocating. Otherwise the public product
+            is used.
+        :type _kernels: bool
+
+    :Methods:
+        __init__(transition_matrix)\n
+        step(vector, out)\n
+
+    ************************************************************
+    """
+
+    def __init__(self, transition_matrix):
+        """
+        Initializes a new instance of a StatePropagator object.
+
+        :param transition_matrix: A square matrix with the probability of moving
+            from the state of a row to the state of a column.
+        :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+        :raises ValueError: If the transition matrix is not square.
+        """
+        from scipy.sparse import csr_matrix
+        rows, columns = transition_matrix.shape
+        if rows != columns:
+            raise ValueError("The transition matrix must be square.")
+        self._node_count = rows
+        self._matrix = csr_matrix(transition_matrix, dtype=np.float64)
+        self._kernels = _kernels_work(self._matrix.indices.dtype)
+
+    def step(self, vector: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Calculates the state vector of the next day.
+
+        :param vector: The state vector of the current day, or a C-contiguous
+            matrix with a state vector per column.
+        :type vector: np.ndarray[np.float64]
+        :param out: The array in which the state vector of the next day is
+            written, with the same shape as ``vector``. It must not be
+            ``vector``.
+        :type out: np.ndarray[np.float64]
+        :return: ``out``.
+        :rtype: np.ndarray[np.float64]
+        """
+        matrix = self._matrix
+        if not self._kernels:
+            np.copyto(out, matrix.T @ vector)
+        elif vector.ndim == 1:
+            out.fill(0.0)
+            _csc_matvec(self._node_count, self._node_count, matrix.indptr,
+                        matrix.indices, matrix.data, vector, out)
+        else:
+            out.fill(0.0)
+            _csc_matvecs(self._node_count, self._node_count, vector.shape[1],
+                         matrix.indptr, matrix.indices, matrix.data, vector, out)
+        return out
+
+    @property
+    def node_count(self) -> int:
+        """The number of states."""
+        return self._node_count
+
+
+class FrontierPropagator(StatePropagator):
+    """
+    Multiplies a state vector with a transition matrix, using only the rows of
+    the states with a probability above 0: the frontier. A cow starts in a
+    single state, and the probability only spreads over a small part of the
+    states, so a step takes time proportional to the frontier instead of the
+    number of states. When the frontier holds more than ``fill_ratio`` of the
+    states, it multiplies the whole vector as a ``StatePropagator``.\n
+    The rows of the frontier are read from the arrays of the transition matrix
+    of the ``StatePropagator``, so the matrix is not copied.\n
+    While it multiplies the whole vector, it does not know the frontier.
+    Counting it can cost as much as a step, so it is counted again only every
+    ``FRONTIER_CHECK_INTERVAL`` steps. The frontier shrinks again once
+    most of the probability has moved into the Exit states, after which the
+    frontier is used again.
+
+    :Attributes:
+        :var _fill_ratio: The part of the states above which the whole vector is
+            multiplied.
+        :type _fill_ratio: float
+        :var _dense: Whether the frontier had passed ``_fill_ratio`` when it was
+            last counted, so that the whole vector is multiplied.
+        :type _dense: bool
+        :var _dense_steps: The number of steps since the frontier was last
+            counted while the whole vector is multiplied.
+        :type _dense_steps: int
+        :var _position: Scratch space with an entry per state, used to combine
+            the transitions into the same state.
+        :type _position: np.ndarray[np.int64]
+        :var _outputs: The last two arrays written by ``self.step()``, with the
+            indices of their states with a probability above 0.
+        :type _outputs: list[tuple[np.ndarray, np.ndarray]]
+
+    :Methods:
+        __init__(transition_matrix, fill_ratio)\n
+        step(vector, out)\n
+
+    ************************************************************
+    """
+
+    def __init__(self, transition_matrix, fill_ratio=DEFAULT_FILL_RATIO):
+        """
+        Initializes a new instance of a FrontierPropagator object.
+
+        :param transition_matrix: A square matrix with the probability of moving
+            from the state of a row to the state of a column.
+        :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+        :param fill_ratio: The part of the states above which the whole vector is
+            multiplied. Defaults to ``DEFAULT_FILL_RATIO``.
+        :type fill_ratio: float
+        :raises ValueError: If the transition matrix is not square.
+        """
+        super().__init__(transition_matrix)
+        self._fill_ratio = fill_ratio
+        self._dense = False
+        self._dense_steps = 0
+        self._position = np.empty(self._node_count, dtype=np.int64)
+        self._outputs = []
+
+    def __support(self, array: np.ndarray) -> np.ndarray | None:
+        """Returns the indices of the states of ``array`` with a probability
+        above 0, if ``array`` was written by the last two steps."""
+        for output, support in self._outputs:
+            if output is array:
+                return support
+        return None
+
+    def step(self, vector: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Calculates the state vector of the next day.
+
+        :param vector: The state vector of the current day. A matrix with a
+            state vector per column is multiplied as a whole.
+        :type vector: np.ndarray[np.float64]
+        :param out: The array in which the state vector of the next day is
+            written, with the same shape as ``vector``. It must not be
+            ``vector``.
+        :type out: np.ndarray[np.float64]
+        :return: ``out``.
+        :rtype: np.ndarray[np.float64]
+        """
+        if vector.ndim != 1:
+            return super().step(vector, out)
+        if self._dense:
+            self._dense_steps += 1
+            if self._dense_steps < FRONTIER_CHECK_INTERVAL:
+                return super().step(vector, out)
+            self._dense_steps = 0
+        support = self.__support(vector)
+        if support is None:
+            support = np.flatnonzero(vector)
+        self._dense = len(support) > self._fill_ratio * self._node_count
+        if self._dense:
+            self._outputs = []
+            return super().step(vector, out)
+        stale = self.__support(out)
+        if stale is None:
+            out.fill(0.0)
+        else:
+            out[stale] = 0.0
+
+        # Gathers the transitions of the rows of the frontier.
+        matrix = self._matrix
+        starts = matrix.indptr[support].astype(np.int64)
+        counts = matrix.indptr[support + 1] - starts
+        total = int(counts.sum())
+        entries = np.repeat(starts - np.cumsum(counts) + counts, counts) + \
+            np.arange(total)
+        columns = matrix.indices[entries]
+        probabilities = matrix.data[entries] * np.repeat(vector[support], counts)
+
+        # Sums the transitions into the same state. The last transition into a
+        # state represents it, so no sorting is needed.
+        order = np.arange(total)
+        self._position[columns] = order
+        representative = self._position[columns]
+        last = representative == order
+        new_support = columns[last]
+        out[new_support] = np.bincount(representative, weights=probabilities,
+                                       minlength=total)[last]
+        new_support = new_support[out[new_support] != 0.0]
+        self._outputs = [(out, new_support), (vector, support)]
+        return out
+
+
+def permute_matrix(matrix, order: np.ndarray):
+    """
+    Reorders the rows and columns of a square matrix, so that row and column
+    ``i`` of the result are row and column ``order[i]`` of ``matrix``.
+
+    :param matrix: The matrix to reorder, such as a transition matrix.
+    :type matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param order: A permutation of the rows, such as the result of
+        ``state_space.band_order``.
+    :type order: np.ndarray[int]
+    :return: The reordered matrix, with sorted indices.
+    :rtype: scipy.sparse.csr_matrix
+    """
+    from scipy.sparse import csr_matrix
+    matrix = csr_matrix(matrix)[order][:, order].tocsr()
+    matrix.sort_indices()
+    return matrix
+
+
+def matrix_power(transition_matrix, power: int, tolerance=0.0):
+    """
+    Calculates the transition matrix to the power ``power``: the probability of
+    moving from the state of a row to the state of a column in ``power`` days.
+
+    The power is calculated by repeated squaring. After each multiplication the
+    probabilities below ``tolerance`` are removed, which keeps the matrix sparse
+    at the cost of a total probability per row of slightly less than 1.
+
+    :param transition_matrix: A square matrix with the probability of moving from
+        the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param power: The number of days.
+    :type power: int
+    :param tolerance: The probability below which entries are removed. Defaults
+        to 0.0, which keeps all entries.
+    :type tolerance: float
+    :return: The transition matrix to the power ``power``, with sorted indices.
+    :rtype: scipy.sparse.csr_matrix
+    :raises ValueError: If ``power`` is smaller than 1.
+    """
+    from scipy.sparse import csr_matrix
+    if power < 1:
+        raise ValueError("The power must be at least 1.")
+
+    def prune(matrix):
+        if tolerance > 0:
+            matrix.data[matrix.data < tolerance] = 0.0
+            matrix.eliminate_zeros()
+        return matrix
+
+    square = prune(csr_matrix(transition_matrix, dtype=np.float64, copy=True))
+    result = None
+    while power:
+        if power & 1:
+            result = square if result is None else prune(result @ square)
+        power >>= 1
+        if power:
+            square = prune(square @ square)
+    result.sort_indices()
+    return result
+
+
+def state_vectors(initial_state_vector: np.ndarray, transition_matrix, days: int,
+                  step_size=1, step_matrix=None, fill_ratio=DEFAULT_FILL_RATIO,
+                  order=None) \
+        -> Generator[tuple[np.ndarray, int], None, None]:
+    """
+    A generator that simulates ``days`` days, and returns the state vector every
+    ``step_size`` days and on the last day.
+
+    :param initial_state_vector: The probability of being in each state on day 0,
+        or a matrix with the state vector of a cow per column, see
+        ``initial_state_matrix``.
+    :type initial_state_vector: np.ndarray
+    :param transition_matrix: A square matrix with the probability of moving from
+        the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param days: The number of days to simulate.
+    :type days: int
+    :param step_size: The interval in days at which the state vector is
+        returned. Defaults to 1.
+    :type step_size: int
+    :param step_matrix: The transition matrix to the power ``step_size``, see
+        ``matrix_power``. If it is given, the vector is multiplied with it once
+        per step instead of with the transition matrix once per day. Defaults to
+        None.
+    :type step_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :param fill_ratio: The part of the states with a probability above 0 below
+        which a single state vector is multiplied with the transition matrix by
+        a ``FrontierPropagator``. 0 always multiplies the whole vector. Defaults
+        to ``DEFAULT_FILL_RATIO``.
+    :type fill_ratio: float
+    :param order: A permutation of the states, such as the result of
+        ``state_space.band_order``, in which the vectors are multiplied. The
+        matrices are permuted once, and the vectors are returned in the order of
+        the states. Defaults to None, which keeps the order of the states.
+    :type order: np.ndarray[int] | None
+    :return:
+        - vector: The state vector of the day, or the matrix of state vectors.
+          The same array is returned each time and must not be modified.
+        - day: The day in the simulation.
+    :rtype:
+        - vector: np.ndarray[np.float64]
+        - day: int
+    :raises ValueError: If ``step_size`` is smaller than 1, ``days`` is negative,
+        or the length of the vector does not match the transition matrix.
+    """
+    if step_size < 1:
+        raise ValueError("The step size must be at least 1 day.")
+    if days < 0:
+        raise ValueError("The number of days cannot be negative.")
+    if len(initial_state_vector) != transition_matrix.shape[0]:
+        raise ValueError("The length of the state vector does not match the "
+                         "transition matrix.")
+    if step_matrix is not None and step_matrix.shape != transition_matrix.shape:
+        raise ValueError("The step matrix does not match the transition matrix.")
+    vector = np.array(initial_state_vector, dtype=np.float64)
+    inverse = None
+    if order is not None and \
+            not np.array_equal(order, np.arange(len(initial_state_vector))):
+        order = np.asarray(order)
+        transition_matrix = permute_matrix(transition_matrix, order)
+        if step_matrix is not None:
+            step_matrix = permute_matrix(step_matrix, order)
+        vector = vector[order]
+        # The vectors are returned in the order of the states.
+        inverse = np.argsort(order)
+        ordered = np.empty_like(vector)
+    step_propagator = None
+    if step_matrix is not None:
+        step_propagator = StatePropagator(step_matrix)
+    # The transition matrix is only needed for the days after the last step.
+    propagator = None
+    buffer = np.empty_like(vector)
+    day = 0
+    while day < days:
+        if step_propagator is not None and days - day >= step_size:
+            step_propagator.step(vector, buffer)
+            vector, buffer = buffer, vector
+            day += step_size
+        else:
+            if propagator is None:
+                propagator = FrontierPropagator(transition_matrix, fill_ratio) \
+                    if fill_ratio > 0 and vector.ndim == 1 \
+                    else StatePropagator(transition_matrix)
+            for _ in range(min(step_size, days - day)):
+                propagator.step(vector, buffer)
+                vector, buffer = buffer, vector
+                day += 1
+        if inverse is None:
+            yield vector, day
+        else:
+            yield np.take(vector, inverse, axis=0, out=ordered), day
+
+
+def simulate(initial_state_vector: np.ndarray, transition_matrix, days: int,
+             step_size=1, step_matrix=None, fill_ratio=DEFAULT_FILL_RATIO,
+             order=None,
+             **callbacks: Callable[[np.ndarray, int, int], float]) \
+        -> dict[str, float]:
+    """
+    Simulates ``days`` days and sums the results of the phenotype callbacks.
+
+    Every ``step_size`` days, and on the last day, each callback is called with
+    the state vector, the day in the simulation, and the number of days since the
+    previous call.
+
+    :param initial_state_vector: The probability of being in each state on day 0.
+    :type initial_state_vector: np.ndarray
+    :param transition_matrix: A square matrix with the probability of moving from
+        the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param days: The number of days to simulate.
+    :type days: int
+    :param step_size: The interval in days at which the callbacks are called.
+        Defaults to 1.
+    :type step_size: int
+    :param step_matrix: The transition matrix to the power ``step_size``, see
+        ``state_vectors``. Defaults to None.
+    :type step_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :param fill_ratio: The part of the states with a probability above 0 below
+        which only the rows of those states are multiplied, see
+        ``state_vectors``. Defaults to ``DEFAULT_FILL_RATIO``.
+    :type fill_ratio: float
+    :param order: A permutation of the states in which the vectors are
+        multiplied, see ``state_vectors``. Defaults to None.
+    :type order: np.ndarray[int] | None
+    :param callbacks: The phenotype callbacks, by name.
+    :type callbacks: Callable[[np.ndarray, int, int], float]
+    :return: The sum of the results of each callback, by name.
+    :rtype: dict[str, float]
+    """
+    accumulated = dict.fromkeys(callbacks, 0)
+    previous_day = 0
+    for vector, day in state_vectors(initial_state_vector, transition_matrix,
+                                     days, step_size, step_matrix, fill_ratio,
+                                     order):
+        for name, callback in callbacks.items():
+            accumulated[name] += callback(vector, day, day - previous_day)
+        previous_day = day
+    return accumulated
+
+
+def initial_state_matrix(cows: list, total_states=None) -> np.ndarray:
+    """
+    Stacks the initial state vectors of ``cows`` into a matrix, with a column per
+    cow. All cows must have the same state space, such as the cows of a herd
+    for which the states are generated with the same limits.
+
+    :param cows: The cows of which to stack the state vectors.
+    :type cows: list[DigitalCow]
+    :param total_states: The states of the cows. Defaults to the states of the
+        first cow.
+    :type total_states: StateTable | None
+    :return: A matrix with a row per state and a column per cow.
+    :rtype: np.ndarray[np.float64]
+    :raises ValueError: If the current state of a cow is not in ``total_states``.
+    """
+    if total_states is None:
+        total_states = cows[0].total_states
+    matrix = np.zeros((len(total_states), len(cows)), dtype=np.float64)
+    rows = [cow.current_state_index if cow.total_states is total_states
+            else total_states.index(cow.current_state) for cow in cows]
+    matrix[rows, np.arange(len(cows))] = 1.0
+    return matrix
+
+
+def herd_phenotype(phenotype_function: Callable, cows: list) -> Callable:
+    """
+    Creates a herd callback from a vector phenotype function of the
+    ``digital_cow`` module, such as ``vector_milk_production``. The callback
+    calls the function for each cow with the column of the cow, and returns the
+    results as an array.
+
+    :param phenotype_function: The phenotype function, which takes a state
+        vector, the day in the simulation, the number of days since the previous
+        call, ``digital_cow`` and ``intermediate_accumulator``.
+    :type phenotype_function: Callable
+    :param cows: The cows in the order of the columns of the state vectors. Their
+        states must be the states of the rows of the state vectors.
+    :type cows: list[DigitalCow]
+    :return: A callback that takes the matrix of state vectors, the day in the
+        simulation and the number of days since the previous call.
+    :rtype: Callable[[np.ndarray, int, int], np.ndarray]
+    """
+    def callback(vectors: np.ndarray, day: int, step_size: int) -> np.ndarray:
+        return np.array([phenotype_function(vectors[:, column], day, step_size,
+                                            digital_cow=cow,
+                                            intermediate_accumulator=None)
+                         for column, cow in enumerate(cows)], dtype=np.float64)
+    return callback
+
+
+def simulate_herd(initial_state_vectors: np.ndarray, transition_matrix,
+                  days: int, step_size=1, step_matrix=None, order=None,
+                  **callbacks: Callable[[np.ndarray, int, int], np.ndarray]) \
+        -> tuple:
+    """
+    Simulates ``days`` days for all cows of a herd at once. Each day the matrix
+    of state vectors, with a column per cow, is multiplied with the transition
+    matrix in a single sparse matrix product.
+
+    Every ``step_size`` days, and on the last day, each callback is called with
+    the matrix of state vectors, the day in the simulation, and the number of
+    days since the previous call. It returns a value per cow, see
+    ``herd_phenotype``.
+
+    :param initial_state_vectors: The probability of each cow being in each state
+        on day 0, with a column per cow, see ``initial_state_matrix``.
+    :type initial_state_vectors: np.ndarray
+    :param transition_matrix: A square matrix with the probability of moving from
+        the state of a row to the state of a column in one day.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param days: The number of days to simulate.
+    :type days: int
+    :param step_size: The interval in days at which the callbacks are called.
+        Defaults to 1.
+    :type step_size: int
+    :param step_matrix: The transition matrix to the power ``step_size``, see
+        ``state_vectors``. Defaults to None.
+    :type step_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :param order: A permutation of the states in which the vectors are
+        multiplied, see ``state_vectors``. Defaults to None.
+    :type order: np.ndarray[int] | None
+    :param callbacks: The herd callbacks, by name.
+    :type callbacks: Callable[[np.ndarray, int, int], np.ndarray]
+    :return:
+        - days: The days in the simulation on which the callbacks were called.
+        - series: The results of each callback by name, with a row per day in
+          ``days`` and a column per cow. The series of the herd is the sum over
+          the columns.
+    :rtype:
+        - days: np.ndarray[np.int64]
+        - series: dict[str, np.ndarray[np.float64]]
+    :raises ValueError: If ``initial_state_vectors`` is not a matrix.
+    """
+    if np.ndim(initial_state_vectors) != 2:
+        raise ValueError("The initial state vectors must be a matrix with a "
+                         "column per cow.")
+    samples = -(-max(days, 0) // max(step_size, 1))
+    cow_count = np.shape(initial_state_vectors)[1]
+    sample_days = np.empty(samples, dtype=np.int64)
+    series = {name: np.empty((samples, cow_count), dtype=np.float64)
+              for name in callbacks}
+    previous_day = 0
+    for sample, (vectors, day) in enumerate(state_vectors(
+            initial_state_vectors, transition_matrix, days, step_size,
+            step_matrix, order=order)):
+        sample_days[sample] = day
+        for name, callback in callbacks.items():
+            series[name][sample] = callback(vectors, day, day - previous_day)
+        previous_day = day
+    return sample_days, series
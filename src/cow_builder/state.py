@@ -40,10 +40,10 @@ First import the ``State`` class from the ``state`` module::
 ************************************************************
 """
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 
 
-@dataclass(repr=True, eq=True, frozen=True)
+@dataclass(repr=True, eq=True, frozen=True, slots=True)
 class State:
     """
     A class representing the state of a dairy cow.
@@ -64,6 +64,9 @@ class State:
     :Methods:
         __post_init__()
 
+        _trusted(state, days_in_milk, lactation_number, days_pregnant,
+        milk_output)
+
         mutate(**kwargs)
 
     ************************************************************
@@ -99,6 +102,36 @@ class State:
         if not type(self.milk_output) == float:
             raise TypeError("The milk_output variable is not of type float.")
 
+    @classmethod
+    def _trusted(cls, state: str, days_in_milk: int, lactation_number: int,
+                 days_pregnant: int, milk_output: float):
+        """
+        Creates a new instance without the checks of ``__post_init__``.
+        This is used inside the package to create states from values that are
+        known to be valid, users should create states with ``State(...)``.
+
+        :param state: The life state of the dairy cow.
+        :type state: str
+        :param days_in_milk: The number of days since the cow's last calving.
+        :type days_in_milk: int
+        :param lactation_number: The number of lactation cycles the cow has
+            completed.
+        :type lactation_number: int
+        :param days_pregnant: The number of days that the cow is pregnant.
+        :type days_pregnant: int
+        :param milk_output: The amount of milk the cow produces in this state.
+        :type milk_output: float
+        :return: The new state.
+        :rtype: State
+        """
+        instance = _new_instance(cls)
+        _set_state(instance, state)
+        _set_days_in_milk(instance, days_in_milk)
+        _set_lactation_number(instance, lactation_number)
+        _set_days_pregnant(instance, days_pregnant)
+        _set_milk_output(instance, milk_output)
+        return instance
+
     def mutate(self, **kwargs):
         """
         Takes an argument of the ``State`` class and returns a new instance with
@@ -111,7 +144,24 @@ class State:
         :return: The new state with the changed values.
         :rtype: State
         """
-        var = asdict(self)
-        for key, value in kwargs.items():
-            var[key] = value
+        var = {'state': self.state, 'days_in_milk': self.days_in_milk,
+               'lactation_number': self.lactation_number,
+               'days_pregnant': self.days_pregnant,
+               'milk_output': self.milk_output}
+        var.update(kwargs)
         return State(**var)
+
+    def __reduce__(self):
+        return State, (self.state, self.days_in_milk, self.lactation_number,
+                       self.days_pregnant, self.milk_output)
+
+    def __setstate__(self, state):
+        # States pickled before the class used slots stored their fields in a dict.
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+# The slot descriptors set the fields of a frozen instance directly.
+_new_instance = object.__new__
+_set_state, _set_days_in_milk, _set_lactation_number, _set_days_pregnant, \
+    _set_milk_output = (State.__dict__[field.name].__set__ for field in fields(State))
@@ -0,0 +1,793 @@
+"""
+:module: state_space
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the StateTable class, which stores the state space
+    of a ``DigitalCow`` as NumPy arrays, and the functions that enumerate it.
+    It is used by the ``DigitalCow`` class.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+The state space of a cow consists of one block of states per lactation. Within a
+block the states are ordered by days in milk and, for each day in milk, by life
+state: ``Open``, ``DoNotBreed``, ``Pregnant`` (ordered by days pregnant) and
+``Exit``. Instead of creating the states one by one, each block is computed as
+a set of NumPy arrays, one array per ``State`` variable.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the function enumerate_states:
+****************************************
+::
+
+    from cow_builder.state_space import enumerate_states
+
+************************************************************
+
+2. Enumerate the states of a herd:
+**********************************
+The states depend on the variables of a ``DigitalHerd`` object and the limits of
+days in milk and lactation numbers::
+
+    life_states, days_in_milk, lactation_numbers, days_pregnant, milk_output = \\
+        enumerate_states(a_herd, dim_limit=1000, ln_limit=9)
+
+The life states are returned as codes, which are indices into ``LIFE_STATES``::
+
+    from cow_builder.state_space import LIFE_STATES
+
+    state = LIFE_STATES[life_states[0]]
+
+************************************************************
+
+3. Store the states in a StateTable:
+************************************
+A ``StateTable`` stores the arrays and creates ``State`` objects only when they
+are requested. It can be used like a tuple of ``State`` objects::
+
+    from cow_builder.state_space import StateTable
+
+    table = StateTable(*enumerate_states(a_herd, dim_limit=1000, ln_limit=9))
+    first_state = table[0]
+    index = table.index(first_state)
+    number_of_states = len(table)
+
+The arrays can be used directly for calculations over all states::
+
+    milk_output = table.milk_output
+
+************************************************************
+
+4. Order the states in bands:
+*****************************
+Almost every transition goes from a day in milk to the next day in milk of the
+same lactation. In the order of ``enumerate_states`` the states of a day in milk
+follow the states of the previous day, so the transitions of a state lie in a
+narrow band after it and the transition matrix is almost banded. The generated
+states in another order, such as a table created with ``from_states``, can be
+put in that order::
+
+    from cow_builder.state_space import band_order
+
+    order = band_order(table)
+    banded_table = table.take(order)
+
+For a table created by ``enumerate_states`` the order is the identity. A table in
+another order can be indexed and its transition matrix can be built, but a
+state is then looked up with a binary search, and the matrix is built in the
+banded order and permuted back.
+
+************************************************************
+"""
+import math
+import numpy as np
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.state import State
+
+
+LIFE_STATES = ('Open', 'DoNotBreed', 'Pregnant', 'Exit')
+"""The life states of a cow, the index of a life state is its code."""
+OPEN, DO_NOT_BREED, PREGNANT, EXIT = range(len(LIFE_STATES))
+
+
+class StateTable:
+    """
+    A structure of arrays representing all states a cow can be in.
+
+    Each state is a row in the table. ``State`` objects are created from a row
+    when it is accessed, they are not stored.
+
+    :Attributes:
+        :var _life_states: The life state code of each state, which is the index
+            of the life state in ``LIFE_STATES``.
+        :type _life_states: np.ndarray[np.int8]
+        :var _days_in_milk: The days in milk of each state.
+        :type _days_in_milk: np.ndarray[np.int16]
+        :var _lactation_numbers: The lactation number of each state.
+        :type _lactation_numbers: np.ndarray[np.int8]
+        :var _days_pregnant: The days pregnant of each state.
+        :type _days_pregnant: np.ndarray[np.int16]
+        :var _milk_output: The milk output of each state.
+        :type _milk_output: np.ndarray[np.float64]
+        :var _state_index: The ``StateIndex`` used to look up states in the table.
+            Created when it is first used.
+        :type _state_index: StateIndex | None
+
+    :Methods:
+        __init__(life_states, days_in_milk, lactation_numbers, days_pregnant,
+        milk_output)
+
+        from_states(states)
+
+        blocks()
+
+        index(state)
+
+        take(rows)
+
+    ************************************************************
+    """
+
+    def __init__(self, life_states, days_in_milk, lactation_numbers,
+                 days_pregnant, milk_output):
+        """
+        Initializes a new instance of a StateTable object.
+
+        :param life_states: The life state code of each state.
+        :type life_states: np.ndarray
+        :param days_in_milk: The days in milk of each state.
+        :type days_in_milk: np.ndarray
+        :param lactation_numbers: The lactation number of each state.
+        :type lactation_numbers: np.ndarray
+        :param days_pregnant: The days pregnant of each state.
+        :type days_pregnant: np.ndarray
+        :param milk_output: The milk output of each state.
+        :type milk_output: np.ndarray
+        :raises ValueError: If the arrays do not have the same length.
+        """
+        columns = []
+        for values, dtype in ((life_states, np.int8), (days_in_milk, np.int16),
+                              (lactation_numbers, np.int8),
+                              (days_pregnant, np.int16),
+                              (milk_output, np.float64)):
+            column = np.asarray(values, dtype=dtype)
+            column.flags.writeable = False
+            columns.append(column)
+        if len({len(column) for column in columns}) != 1:
+            raise ValueError("All columns of a StateTable must have the same length.")
+        self._life_states, self._days_in_milk, self._lactation_numbers, \
+            self._days_pregnant, self._milk_output = columns
+        self._state_index = None
+
+    @classmethod
+    def from_states(cls, states):
+        """
+        Creates a ``StateTable`` from ``State`` objects.
+
+        :param states: The states to store in the table.
+        :type states: Iterable[State]
+        :return: A table containing the given states in the same order.
+        :rtype: StateTable
+        """
+        states = list(states)
+        return cls([LIFE_STATES.index(state.state) for state in states],
+                   [state.days_in_milk for state in states],
+                   [state.lactation_number for state in states],
+                   [state.days_pregnant for state in states],
+                   [state.milk_output for state in states])
+
+    def __len__(self):
+        return len(self._life_states)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return StateTable(self._life_states[item], self._days_in_milk[item],
+                              self._lactation_numbers[item],
+                              self._days_pregnant[item], self._milk_output[item])
+        return State._trusted(LIFE_STATES[self._life_states[item]],
+                              int(self._days_in_milk[item]),
+                              int(self._lactation_numbers[item]),
+                              int(self._days_pregnant[item]),
+                              float(self._milk_output[item]))
+
+    def __iter__(self):
+        for life_state, dim, ln, dp, milk in zip(
+                self._life_states.tolist(), self._days_in_milk.tolist(),
+                self._lactation_numbers.tolist(), self._days_pregnant.tolist(),
+                self._milk_output.tolist()):
+            yield State._trusted(LIFE_STATES[life_state], dim, ln, dp, milk)
+
+    def __contains__(self, state):
+        try:
+            self.index(state)
+        except ValueError:
+            return False
+        return True
+
+    def __repr__(self):
+        return f"StateTable({len(self)} states)"
+
+    def blocks(self) -> list:
+        """
+        Returns the lactation blocks of the table. A block starts with the states
+        of days in milk 0 of a lactation.
+
+        :return: A slice of the rows of each lactation block.
+        :rtype: list[slice]
+        """
+        days_in_milk = self._days_in_milk
+        lactation_numbers = self._lactation_numbers
+        starts = np.flatnonzero((days_in_milk == 0) & np.concatenate((
+            [True], (days_in_milk[:-1] != 0) |
+            (lactation_numbers[:-1] != lactation_numbers[1:]))))
+        bounds = np.append(starts, len(self)).tolist()
+        return [slice(start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+    def take(self, rows) -> 'StateTable':
+        """
+        Creates a table with the states of ``rows``, in the order of ``rows``.
+
+        :param rows: The indices of the states to take, such as a permutation of
+            the table.
+        :type rows: np.ndarray[int]
+        :return: A table containing the states of ``rows``.
+        :rtype: StateTable
+        """
+        return StateTable(self._life_states[rows], self._days_in_milk[rows],
+                          self._lactation_numbers[rows],
+                          self._days_pregnant[rows], self._milk_output[rows])
+
+    def index(self, state: State) -> int:
+        """
+        Returns the index of ``state`` in the table.
+
+        :param state: The state to look up.
+        :type state: State
+        :return: The index of the state.
+        :rtype: int
+        :raises ValueError: If the state is not in the table.
+        """
+        try:
+            row = self.state_index.row(state.state, state.days_in_milk,
+                                       state.lactation_number,
+                                       state.days_pregnant)
+        except KeyError:
+            row = None
+        if row is None or self._milk_output[row] != state.milk_output:
+            raise ValueError(f"{state} is not in the StateTable.")
+        return row
+
+    @property
+    def life_states(self) -> np.ndarray:
+        """The life state code of each state."""
+        return self._life_states
+
+    @property
+    def days_in_milk(self) -> np.ndarray:
+        """The days in milk of each state."""
+        return self._days_in_milk
+
+    @property
+    def lactation_numbers(self) -> np.ndarray:
+        """The lactation number of each state."""
+        return self._lactation_numbers
+
+    @property
+    def days_pregnant(self) -> np.ndarray:
+        """The days pregnant of each state."""
+        return self._days_pregnant
+
+    @property
+    def milk_output(self) -> np.ndarray:
+        """The milk output of each state."""
+        return self._milk_output
+
+    @property
+    def state_index(self):
+        """The ``StateIndex`` that maps states to their index in the table."""
+        if self._state_index is None:
+            self._state_index = StateIndex(self)
+        return self._state_index
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the arrays of the table."""
+        return sum(column.nbytes for column in (
+            self._life_states, self._days_in_milk, self._lactation_numbers,
+            self._days_pregnant, self._milk_output))
+
+
+class StateIndex:
+    """
+    Maps the variables of a state to its index in a ``StateTable`` and back.
+
+    A cow can only be in one state with a given life state, days in milk and
+    lactation number, except for the ``Pregnant`` states, which
+    ``enumerate_states`` stores in consecutive rows ordered by days pregnant. The
+    index therefore stores one row per life state, lactation number and days in
+    milk in a grid. For ``Pregnant`` states it stores the row of days pregnant 0,
+    so the row of a state is found by adding its days pregnant. Looking up a state
+    takes a constant number of array reads.
+
+    The grid is checked against every row of the table when the index is built.
+    A table in another order, such as one created with ``StateTable.from_states``,
+    is indexed by the sorted keys of its states instead, and a state is found by
+    a binary search.
+
+    :Attributes:
+        :var _table: The table that is indexed.
+        :type _table: StateTable
+        :var _shape: The number of life state codes, lactation numbers, days in
+            milk and days pregnant the keys of the states range over.
+        :type _shape: tuple[int, int, int, int]
+        :var _grid: The rows of the states for each life state code, lactation
+            number and days in milk, -1 if there is no such state. None if the
+            ``Pregnant`` states of the table are not stored in consecutive rows
+            ordered by days pregnant.
+        :type _grid: np.ndarray[np.int32] | None
+        :var _keys: The sorted keys of the states, if ``_grid`` is None.
+        :type _keys: np.ndarray[np.int64] | None
+        :var _order: The row of each key in ``_keys``, if ``_grid`` is None.
+        :type _order: np.ndarray[np.intp] | None
+
+    :Methods:
+        __init__(table)
+
+        row(life_state, days_in_milk, lactation_number, days_pregnant)
+
+        rows(life_states, days_in_milk, lactation_numbers, days_pregnant)
+
+        key(row)
+
+    ************************************************************
+    """
+
+    def __init__(self, table: StateTable):
+        """
+        Initializes a new instance of a StateIndex object.
+
+        :param table: The table to index.
+        :type table: StateTable
+        """
+        self._table = table
+        life_states = table.life_states.astype(np.intp)
+        lactation_numbers = table.lactation_numbers.astype(np.intp)
+        days_in_milk = table.days_in_milk.astype(np.intp)
+        days_pregnant = table.days_pregnant.astype(np.intp)
+        self._shape = (len(LIFE_STATES),
+                       int(lactation_numbers.max(initial=-1)) + 1,
+                       int(days_in_milk.max(initial=-1)) + 1,
+                       int(days_pregnant.max(initial=-1)) + 1)
+        self._keys = self._order = None
+        self._grid = np.full(self._shape[:3], -1, dtype=np.int32)
+        rows = np.arange(len(table), dtype=np.int32)
+        self._grid[life_states, lactation_numbers, days_in_milk] = \
+            rows - days_pregnant
+        # The grid only finds every state if the Pregnant states of each life
+        # state, lactation number and days in milk are consecutive rows.
+        if not np.array_equal(self._grid[life_states, lactation_numbers,
+                                         days_in_milk] + days_pregnant, rows):
+            self._grid = None
+            keys = np.ravel_multi_index(
+                (life_states, lactation_numbers, days_in_milk, days_pregnant),
+                self._shape)
+            self._order = np.argsort(keys, kind='stable')
+            self._keys = keys[self._order]
+            self._keys.flags.writeable = False
+            self._order.flags.writeable = False
+        else:
+            self._grid.flags.writeable = False
+
+    def _candidates(self, life_states, lactation_numbers, days_in_milk,
+                    days_pregnant) -> np.ndarray:
+        """Returns the row at which each of the states would be, or -1. The
+        variables must be within ``_shape``, the rows are not checked."""
+        if self._grid is not None:
+            base = self._grid[life_states, lactation_numbers, days_in_milk]
+            return np.where(base >= 0, base + days_pregnant, -1)
+        keys = np.ravel_multi_index(
+            (life_states, lactation_numbers, days_in_milk, days_pregnant),
+            self._shape)
+        positions = np.searchsorted(self._keys, keys)
+        found = positions < len(self._keys)
+        return np.where(found, self._order[np.where(found, positions, 0)], -1)
+
+    def rows(self, life_states, days_in_milk, lactation_numbers,
+             days_pregnant) -> np.ndarray:
+        """
+        Returns the rows of the states described by the given arrays.
+
+        :param life_states: The life state codes of the states.
+        :type life_states: np.ndarray
+        :param days_in_milk: The days in milk of the states.
+        :type days_in_milk: np.ndarray
+        :param lactation_numbers: The lactation numbers of the states.
+        :type lactation_numbers: np.ndarray
+        :param days_pregnant: The days pregnant of the states.
+        :type days_pregnant: np.ndarray
+        :return: The row of each state in the table, -1 if a state is not in the
+            table.
+        :rtype: np.ndarray[np.intp]
+        """
+        life_states, days_in_milk, lactation_numbers, days_pregnant = \
+            np.broadcast_arrays(*(np.asarray(values, dtype=np.intp) for values in (
+                life_states, days_in_milk, lactation_numbers, days_pregnant)))
+        rows = np.full(life_states.shape, -1, dtype=np.intp)
+        in_grid = (0 <= life_states) & (life_states < self._shape[0]) & \
+            (0 <= lactation_numbers) & (lactation_numbers < self._shape[1]) & \
+            (0 <= days_in_milk) & (days_in_milk < self._shape[2]) & \
+            (0 <= days_pregnant) & (days_pregnant < self._shape[3])
+        candidates = self._candidates(
+            life_states[in_grid], lactation_numbers[in_grid],
+            days_in_milk[in_grid], days_pregnant[in_grid])
+        found = (0 <= candidates) & (candidates < len(self._table))
+        checked = candidates[found]
+        found[found] = (self._table.days_pregnant[checked] ==
+                        days_pregnant[in_grid][found]) & \
+            (self._table.life_states[checked] == life_states[in_grid][found]) & \
+            (self._table.days_in_milk[checked] == days_in_milk[in_grid][found]) & \
+            (self._table.lactation_numbers[checked] ==
+             lactation_numbers[in_grid][found])
+        rows[in_grid] = np.where(found, candidates, -1)
+        return rows
+
+    def row(self, life_state, days_in_milk: int, lactation_number: int,
+            days_pregnant: int) -> int:
+        """
+        Returns the row of a state.
+
+        :param life_state: The life state, or its code.
+        :type life_state: str | int
+        :param days_in_milk: The days in milk of the state.
+        :type days_in_milk: int
+        :param lactation_number: The lactation number of the state.
+        :type lactation_number: int
+        :param days_pregnant: The days pregnant of the state.
+        :type days_pregnant: int
+        :return: The row of the state in the table.
+        :rtype: int
+        :raises KeyError: If the state is not in the table.
+        """
+        key = (life_state, days_in_milk, lactation_number, days_pregnant)
+        if isinstance(life_state, str):
+            if life_state not in LIFE_STATES:
+                raise KeyError(key)
+            code = LIFE_STATES.index(life_state)
+        else:
+            code = life_state
+        if not (0 <= code < self._shape[0] and
+                0 <= lactation_number < self._shape[1] and
+                0 <= days_in_milk < self._shape[2] and
+                0 <= days_pregnant < self._shape[3]):
+            raise KeyError(key)
+        row = int(self._candidates(code, lactation_number, days_in_milk,
+                                   days_pregnant))
+        if not 0 <= row < len(self._table) or \
+                self.key(row) != (LIFE_STATES[code], days_in_milk,
+                                  lactation_number, days_pregnant):
+            raise KeyError(key)
+        return row
+
+    def key(self, row: int) -> tuple:
+        """
+        Returns the variables of the state in a row, the inverse of ``row``.
+
+        :param row: The row in the table.
+        :type row: int
+        :return: The life state, days in milk, lactation number and days pregnant
+            of the state.
+        :rtype: tuple[str, int, int, int]
+        """
+        return (LIFE_STATES[self._table.life_states[row]],
+                int(self._table.days_in_milk[row]),
+                int(self._table.lactation_numbers[row]),
+                int(self._table.days_pregnant[row]))
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the index."""
+        if self._grid is not None:
+            return self._grid.nbytes
+        return self._keys.nbytes + self._order.nbytes
+
+
+def band_order(table: StateTable) -> np.ndarray:
+    """
+    Returns the permutation that puts the states of ``table`` in the order of
+    ``enumerate_states``: by lactation block, days in milk, life state,
+    lactation number and days pregnant. A cow that calves beyond the lactation
+    number limit keeps counting days in milk in the block of its last
+    lactation, so states of a lactation number without a state at days in milk 0
+    belong to the previous block.
+
+    The table must contain the states generated by ``enumerate_states``, in any
+    order. The banded table then equals the generated table. For other states
+    the order is defined, but the banded table need not start with the states of
+    days in milk 0 of a lactation, which the transition matrix requires.
+
+    :param table: The states to order.
+    :type table: StateTable
+    :return: The indices of the states in ``table`` in the banded order. The
+        state at position ``i`` of the banded order is ``table[order[i]]``.
+    :rtype: np.ndarray[np.int64]
+    """
+    lactation_numbers = table.lactation_numbers.astype(np.int64)
+    days_in_milk = table.days_in_milk
+    block = np.where(np.isin(lactation_numbers,
+                             lactation_numbers[days_in_milk == 0]),
+                     lactation_numbers, lactation_numbers - 1)
+    return np.lexsort((table.days_pregnant, lactation_numbers,
+                       table.life_states, days_in_milk, block))
+
+
+def milk_curve(milkbot_variables: tuple, days_in_milk: np.ndarray) -> np.ndarray:
+    """
+    Calculates the MilkBot curve for an array of days in milk.
+
+    The exponentials are taken with ``math.exp`` so that the values are identical
+    to those of the ``milk_production`` function. The arrays this function is used
+    for are only as long as a lactation, the state arrays are filled by indexing
+    the result.
+
+    :param milkbot_variables: A tuple containing parameters for the MilkBot
+        algorithm.
+    :type milkbot_variables: tuple
+    :param days_in_milk: The days in milk for which the milk production must be
+        calculated.
+    :type days_in_milk: np.ndarray
+    :return: The milk production in kg for each of the given days in milk.
+    :rtype: np.ndarray
+    """
+    scale, ramp, offset, decay = milkbot_variables
+    return np.fromiter(
+        (scale * (1 - (math.exp(((offset - dim) / ramp)) / 2)) *
+         math.exp(-decay * dim) for dim in days_in_milk.tolist()),
+        dtype=np.float64, count=len(days_in_milk))
+
+
+def non_pregnant_milk(herd: DigitalHerd, lactation_number: int,
+                      days_in_milk: np.ndarray) -> np.ndarray:
+    """
+    Calculates the milk production of the states that are not pregnant in a
+    lactation, as the ``milk_production`` function would.
+
+    :param herd: The herd that provides the variables of the cow.
+    :type herd: DigitalHerd
+    :param lactation_number: The lactation number of the states.
+    :type lactation_number: int
+    :param days_in_milk: The days in milk of the states.
+    :type days_in_milk: np.ndarray
+    :return: The milk production in kg for each of the given days in milk.
+    :rtype: np.ndarray
+    """
+    from cow_builder.digital_cow import set_milkbot_variables
+    if lactation_number == 0 or 0 >= herd.get_days_pregnant_limit(
+            lactation_number) - herd.get_duration_dry(lactation_number):
+        return np.zeros(len(days_in_milk))
+    return milk_curve(set_milkbot_variables(lactation_number), days_in_milk)
+
+
+def _skips_next_lactation(herd: DigitalHerd, lactation_number: int) -> bool:
+    """Returns True if the lactation after ``lactation_number`` produces no states,
+    because the lactation ``lactation_number`` ended at the days in milk limit."""
+    from cow_builder.digital_cow import set_milkbot_variables, milk_production
+    next_lactation = lactation_number + 1
+    milk_output = milk_production(set_milkbot_variables(lactation_number),
+                                  State._trusted('DoNotBreed', -1, next_lactation,
+                                                 0, 0.0),
+                                  herd.get_days_pregnant_limit(next_lactation),
+                                  herd.get_duration_dry(next_lactation))
+    return milk_output < herd.milk_threshold
+
+
+def lactation_template_key(herd: DigitalHerd, lactation_number: int,
+                           ln_limit: int) -> tuple:
+    """
+    Returns the variables that determine the states of a lactation block and the
+    transitions from them, apart from the lactation number itself. Lactation
+    blocks with the same key contain the same states, with lactation numbers
+    that differ by the difference between their lactation numbers. Because
+    ``DigitalHerd`` and ``set_milkbot_variables`` use the same variables for all
+    lactations above 2, this is the case for lactation 3 up to ``ln_limit``.
+
+    :param herd: The herd that provides the variables of the cow.
+    :type herd: DigitalHerd
+    :param lactation_number: The lactation number of the block.
+    :type lactation_number: int
+    :param ln_limit: The limit of lactation numbers for which states are generated.
+    :type ln_limit: int
+    :return: A hashable key.
+    :rtype: tuple
+    """
+    from cow_builder.digital_cow import set_milkbot_variables
+
+    def lactation_variables(ln):
+        return (herd.get_voluntary_waiting_period(ln),
+                herd.get_insemination_window(ln),
+                herd.get_days_pregnant_limit(ln), herd.get_duration_dry(ln),
+                set_milkbot_variables(ln))
+
+    key = (min(lactation_number, 2), lactation_variables(lactation_number))
+    if lactation_number == ln_limit:
+        # The last lactation also contains states of the next lactation.
+        key += (lactation_variables(lactation_number + 1),)
+    return key
+
+
+def lactation_block(herd: DigitalHerd, lactation_number: int, dim_limit: int,
+                    ln_limit: int) -> tuple:
+    """
+    Enumerates all states of one lactation as arrays.
+
+    :param herd: The herd that provides the variables of the cow.
+    :type herd: DigitalHerd
+    :param lactation_number: The lactation number of the block.
+    :type lactation_number: int
+    :param dim_limit: The limit of days in milk for which states are generated.
+    :type dim_limit: int
+    :param ln_limit: The limit of lactation numbers for which states are generated.
+    :type ln_limit: int
+    :return:
+        - life_states: The life state codes of the states.
+        - days_in_milk: The days in milk of the states.
+        - lactation_numbers: The lactation numbers of the states.
+        - days_pregnant: The days pregnant of the states.
+        - milk_output: The milk output of the states.
+        - dim_limit_reached: Whether the lactation ended at the days in milk
+          limit.
+    :rtype:
+        - life_states: np.ndarray
+        - days_in_milk: np.ndarray
+        - lactation_numbers: np.ndarray
+        - days_pregnant: np.ndarray
+        - milk_output: np.ndarray
+        - dim_limit_reached: bool
+    """
+    ln = lactation_number
+    heifer = ln == 0
+    last_lactation = ln == ln_limit
+    vwp = herd.get_voluntary_waiting_period(ln)
+    insemination_window = herd.get_insemination_window(ln)
+    dp_limit = herd.get_days_pregnant_limit(ln)
+    duration_dry = herd.get_duration_dry(ln)
+    insemination_cutoff = vwp + insemination_window
+
+    # The last day in milk of the lactation.
+    if heifer:
+        last_dim = insemination_cutoff + dp_limit + 1
+        dim_limit_reached = False
+    else:
+        milk = non_pregnant_milk(herd, ln, np.arange(dim_limit))
+        below_threshold = np.flatnonzero(milk[:dim_limit - 1] < herd.milk_threshold)
+        if len(below_threshold):
+            last_dim = int(below_threshold[0])
+            dim_limit_reached = False
+        else:
+            last_dim = dim_limit - 1
+            dim_limit_reached = True
+    dims = np.arange(last_dim + 1)
+    milk = non_pregnant_milk(herd, ln, dims)
+    productive = heifer | (milk >= herd.milk_threshold)
+
+    # The cow calves for the last time when her first possible pregnancy ends.
+    # From then on, the states of the next lactation are added to this block.
+    last_calving = vwp + dp_limit
+    after_last_calving = last_lactation & (dims >= last_calving)
+    if last_lactation:
+        next_milk = non_pregnant_milk(herd, ln + 1, dims)
+    else:
+        next_milk = np.zeros(len(dims))
+    next_productive = next_milk >= herd.milk_threshold
+
+    open_count = ((dims <= insemination_cutoff) & productive).astype(np.int64)
+    dnb_count = ((dims > insemination_cutoff) & (not heifer) &
+                 productive).astype(np.int64)
+    next_dnb_count = ((dims > insemination_cutoff) & (not heifer) &
+                      after_last_calving & (dims > last_calving) &
+                      next_productive).astype(np.int64)
+    dp_first = np.maximum(1, dims - insemination_cutoff)
+    dp_last = np.minimum(dims - vwp, dp_limit)
+    pregnant_count = np.where(
+        (vwp < dims) & (dims <= insemination_cutoff + dp_limit),
+        dp_last - dp_first + 1, 0)
+    next_exit_count = after_last_calving.astype(np.int64)
+
+    per_dim = open_count + dnb_count + next_dnb_count + pregnant_count + 1 + \
+        next_exit_count
+    start = np.concatenate(([0], np.cumsum(per_dim)[:-1]))
+    size = int(per_dim.sum())
+    final_exits = (1 + int(last_lactation)) if dim_limit_reached else 0
+
+    life_states = np.empty(size + final_exits, dtype=np.int8)
+    days_in_milk = np.empty(size + final_exits, dtype=np.int16)
+    lactation_numbers = np.full(size + final_exits, ln, dtype=np.int8)
+    days_pregnant = np.zeros(size + final_exits, dtype=np.int16)
+    milk_output = np.zeros(size + final_exits, dtype=np.float64)
+
+    position = start.copy()
+    for code, count, lactation, values in (
+            (OPEN, open_count, ln, milk),
+            (DO_NOT_BREED, dnb_count, ln, milk),
+            (DO_NOT_BREED, next_dnb_count, ln + 1, next_milk)):
+        mask = count.astype(bool)
+        rows = position[mask]
+        life_states[rows] = code
+        days_in_milk[rows] = dims[mask]
+        lactation_numbers[rows] = lactation
+        milk_output[rows] = values[mask]
+        position += count
+
+    pregnant_dims = np.repeat(dims, pregnant_count)
+    dp_offset = np.arange(len(pregnant_dims)) - np.repeat(
+        np.cumsum(pregnant_count) - pregnant_count, pregnant_count)
+    pregnant_dp = np.repeat(dp_first, pregnant_count) + dp_offset
+    rows = np.repeat(position, pregnant_count) + dp_offset
+    life_states[rows] = PREGNANT
+    days_in_milk[rows] = pregnant_dims
+    days_pregnant[rows] = pregnant_dp
+    if not heifer:
+        milk_output[rows] = np.where(pregnant_dp < dp_limit - duration_dry,
+                                     milk[pregnant_dims], 0.0)
+    position += pregnant_count
+
+    life_states[position] = EXIT
+    days_in_milk[position] = dims
+    position += 1
+    mask = next_exit_count.astype(bool)
+    life_states[position[mask]] = EXIT
+    days_in_milk[position[mask]] = dims[mask]
+    lactation_numbers[position[mask]] = ln + 1
+
+    if final_exits:
+        life_states[size:] = EXIT
+        days_in_milk[size:] = dim_limit
+        lactation_numbers[size:] = np.arange(ln, ln + final_exits)
+
+    return life_states, days_in_milk, lactation_numbers, days_pregnant, \
+        milk_output, dim_limit_reached
+
+
+def enumerate_states(herd: DigitalHerd, dim_limit: int, ln_limit: int) -> tuple:
+    """
+    Enumerates all states a cow in ``herd`` can be in, in the order used by
+    ``DigitalCow.generate_total_states``.
+
+    :param herd: The herd that provides the variables of the cow.
+    :type herd: DigitalHerd
+    :param dim_limit: The limit of days in milk for which states are generated.
+    :type dim_limit: int
+    :param ln_limit: The limit of lactation numbers for which states are generated.
+    :type ln_limit: int
+    :return:
+        - life_states: The life state codes of the states.
+        - days_in_milk: The days in milk of the states.
+        - lactation_numbers: The lactation numbers of the states.
+        - days_pregnant: The days pregnant of the states.
+        - milk_output: The milk output of the states.
+    :rtype:
+        - life_states: np.ndarray
+        - days_in_milk: np.ndarray
+        - lactation_numbers: np.ndarray
+        - days_pregnant: np.ndarray
+        - milk_output: np.ndarray
+    """
+    # Lactation blocks with the same template key are copied from the first one.
+    templates = {}
+    blocks = []
+    lactation_number = 0
+    while lactation_number <= ln_limit:
+        key = lactation_template_key(herd, lactation_number, ln_limit)
+        if key in templates:
+            template_number, template, dim_limit_reached = templates[key]
+            block = list(template)
+            block[2] = template[2] + (lactation_number - template_number)
+        else:
+            *block, dim_limit_reached = lactation_block(herd, lactation_number,
+                                                        dim_limit, ln_limit)
+            templates[key] = (lactation_number, block, dim_limit_reached)
+        blocks.append(block)
+        if dim_limit_reached and _skips_next_lactation(herd, lactation_number):
+            lactation_number += 1
+        lactation_number += 1
+    return tuple(np.concatenate(column) for column in zip(*blocks))
@@ -0,0 +1,334 @@
+"""
+:module: steady_state
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the functions that calculate the equilibrium of a
+    herd in which every cow that exits is replaced by a heifer.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+A herd in which each cow that exits is replaced by a newborn heifer reaches an
+equilibrium: the share of the places in the herd in each state no longer
+changes. It is the stationary distribution of the transition matrix with a
+re-entry transition from every Exit state to the entry state of a heifer, which
+is ``State('Open', 0, 0, 0, 0.0)``.\n
+The distribution can be calculated in two ways:
+
+* ``'renewal'``: Each place in the herd repeats the life of a cow from its entry
+  as a heifer until its exit. The stationary distribution is proportional to the
+  expected number of days a heifer spends in each state, which is solved
+  exactly with ``lifetime.expected_visits``.
+* ``'power'``: A distribution is multiplied with the transition matrix until it
+  changes less than ``tolerance`` per day.
+
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the functions:
+************************
+::
+
+    from cow_builder.steady_state import steady_state, stationary_distribution, \\
+        replacement_matrix
+
+************************************************************
+
+2. Calculate the equilibrium of a herd:
+***************************************
+The states of a cow in the herd must be generated first. The cow provides the
+variables of the replacement heifers, such as their diet::
+
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+    equilibrium = steady_state(cow)
+    equilibrium.milk_per_cow, equilibrium.nitrogen_per_cow
+    equilibrium.composition[(1, 'Pregnant')]
+
+With the power method instead of the renewal solution::
+
+    equilibrium = steady_state(cow, method='power', tolerance=1e-10)
+    equilibrium.iterations, equilibrium.residual
+
+************************************************************
+
+3. Use the transition matrix with replacement:
+**********************************************
+::
+
+    tm = build_transition_matrix(cow)
+    replacement_tm = replacement_matrix(tm, cow.total_states)
+    distribution, iterations, residual = stationary_distribution(
+        tm, cow.total_states, method='power')
+
+************************************************************
+"""
+from dataclasses import dataclass
+import numpy as np
+from cow_builder.lifetime import expected_visits
+from cow_builder.simulation import StatePropagator
+from cow_builder.state_space import StateTable, LIFE_STATES, OPEN, EXIT
+
+STEADY_STATE_METHODS = ('renewal', 'power')
+
+
+@dataclass(frozen=True)
+class SteadyState:
+    """
+    The equilibrium of a herd in which every cow that exits is replaced by a
+    heifer.
+
+    :Attributes:
+        :var distribution: The share of the places in the herd in each state of
+            ``total_states``. The share in the Exit states is the share of places
+            of which the cow is replaced that day.
+        :type distribution: np.ndarray[np.float64]
+        :var composition: The share of the cows in the herd by lactation number
+            and life state, such as ``(1, 'Pregnant')``. Exit states are not
+            included.
+        :type composition: dict[tuple[int, str], float]
+        :var replacement_rate: The share of the places in the herd of which the
+            cow is replaced each day.
+        :type replacement_rate: float
+        :var milk_per_cow: The mean daily milk production per cow in kg.
+        :type milk_per_cow: float
+        :var nitrogen_per_cow: The mean daily nitrogen emission per cow in g.
+        :type nitrogen_per_cow: float
+        :var iterations: The number of multiplications of the power method, 0
+            for the renewal solution.
+        :type iterations: int
+        :var residual: The sum of the absolute change of the distribution in a
+            day.
+        :type residual: float
+
+    ************************************************************
+    """
+    distribution: np.ndarray
+    composition: dict
+    replacement_rate: float
+    milk_per_cow: float
+    nitrogen_per_cow: float
+    iterations: int
+    residual: float
+
+
+def entry_state_index(total_states: StateTable) -> int:
+    """
+    Returns the index of the state in which a replacement heifer enters the
+    herd: Open, at 0 days in milk in lactation 0.
+
+    :param total_states: The states of a cow.
+    :type total_states: StateTable
+    :return: The index of the entry state.
+    :rtype: int
+    :raises ValueError: If ``total_states`` has no entry state.
+    """
+    entry = np.flatnonzero((total_states.life_states == OPEN) &
+                           (total_states.days_in_milk == 0) &
+                           (total_states.lactation_numbers == 0) &
+                           (total_states.days_pregnant == 0))
+    if not len(entry):
+        raise ValueError("The states have no entry state for a heifer.")
+    return int(entry[0])
+
+
+def replacement_matrix(transition_matrix, total_states: StateTable):
+    """
+    Creates the transition matrix of a place in a herd, in which each Exit state
+    transitions into the entry state of a heifer instead of into itself.
+
+    :param transition_matrix: A square matrix with the probability of moving from
+        the state of a row to the state of a column in one day, such as the
+        result of ``transition_matrix.build_transition_matrix()``.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param total_states: The states of the rows and columns of
+        ``transition_matrix``.
+    :type total_states: StateTable
+    :return: The transition matrix with the re-entry transitions.
+    :rtype: scipy.sparse.csr_matrix
+    :raises ValueError: If ``total_states`` has no entry state.
+    """
+    from scipy.sparse import coo_matrix
+    entry = entry_state_index(total_states)
+    exits = np.flatnonzero(total_states.life_states == EXIT)
+    matrix = coo_matrix(transition_matrix)
+    kept = total_states.life_states[matrix.row] != EXIT
+    rows = np.concatenate((matrix.row[kept], exits))
+    columns = np.concatenate((matrix.col[kept], np.full(len(exits), entry)))
+    data = np.concatenate((matrix.data[kept], np.ones(len(exits))))
+    result = coo_matrix((data, (rows, columns)),
+                        shape=transition_matrix.shape).tocsr()
+    result.sort_indices()
+    return result
+
+
+def stationary_distribution(transition_matrix, total_states: StateTable,
+                            method='renewal', tolerance=1e-10,
+                            max_iterations=100_000, check_interval=100) -> tuple:
+    """
+    Calculates the stationary distribution of a place in a herd in which each
+    cow that exits is replaced by a heifer, see ``replacement_matrix``.
+
+    :param transition_matrix: The transition matrix of a cow, without re-entry
+        transitions.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param total_states: The states of the rows and columns of
+        ``transition_matrix``.
+    :type total_states: StateTable
+    :param method: ``'renewal'`` for the exact solution, or ``'power'`` for the
+        power method. Defaults to ``'renewal'``.
+    :type method: str
+    :param tolerance: The sum of the absolute change of the distribution in a day
+        below which the power method stops. Defaults to 1e-10.
+    :type tolerance: float
+    :param max_iterations: The maximum number of multiplications of the power
+        method. Defaults to 100 000.
+    :type max_iterations: int
+    :param check_interval: The number of multiplications of the power method
+        between checks of the change. Defaults to 100.
+    :type check_interval: int
+    :return:
+        - distribution: The stationary probability of each state.
+        - iterations: The number of multiplications, 0 for ``'renewal'``.
+        - residual: The sum of the absolute change of the distribution in a
+          day.
+    :rtype:
+        - distribution: np.ndarray[np.float64]
+        - iterations: int
+        - residual: float
+    :raises ValueError: If the method is unknown, ``max_iterations`` or
+        ``check_interval`` is smaller than 1, or the states have no entry state.
+    :raises RuntimeError: If the power method has not converged after
+        ``max_iterations`` multiplications.
+    """
+    if method not in STEADY_STATE_METHODS:
+        raise ValueError(f"The method must be one of {STEADY_STATE_METHODS}, "
+                         f"not {method!r}.")
+    if max_iterations < 1:
+        raise ValueError(f"The maximum number of iterations must be at least 1, "
+                         f"not {max_iterations}.")
+    if check_interval < 1:
+        raise ValueError(f"The check interval must be at least 1, "
+                         f"not {check_interval}.")
+    replacement = replacement_matrix(transition_matrix, total_states)
+    propagator = StatePropagator(replacement)
+    buffer = np.empty(len(total_states), dtype=np.float64)
+    if method == 'renewal':
+        distribution = _renewal_visits(transition_matrix, total_states)
+        distribution /= distribution.sum()
+        propagator.step(distribution, buffer)
+        return distribution, 0, float(np.abs(buffer - distribution).sum())
+
+    distribution = np.full(len(total_states), 1 / len(total_states))
+    iterations = 0
+    while iterations < max_iterations:
+        for _ in range(min(check_interval, max_iterations - iterations) - 1):
+            propagator.step(distribution, buffer)
+            distribution, buffer = buffer, distribution
+        propagator.step(distribution, buffer)
+        iterations += min(check_interval, max_iterations - iterations)
+        residual = float(np.abs(buffer - distribution).sum())
+        distribution, buffer = buffer, distribution
+        if residual < tolerance:
+            return distribution / distribution.sum(), iterations, residual
+    raise RuntimeError(f"The power method did not converge in {max_iterations} "
+                       f"iterations, the residual is {residual:.3g}.")
+
+
+def _renewal_visits(transition_matrix, total_states: StateTable) -> np.ndarray:
+    """Returns the expected number of days a heifer spends in each state from its
+    entry until the day it exits, when it is in an Exit state."""
+    initial_state_vector = np.zeros(len(total_states), dtype=np.float64)
+    initial_state_vector[entry_state_index(total_states)] = 1.0
+    visits = expected_visits(transition_matrix, total_states,
+                             initial_state_vector)
+    # The day in an Exit state is the probability of exiting into it.
+    exits = total_states.life_states == EXIT
+    visits[exits] = (transition_matrix.T @ visits)[exits]
+    return visits
+
+
+def expected_ages(transition_matrix, total_states: StateTable) -> np.ndarray:
+    """
+    Calculates the mean age in days of the cows in each state of a herd in which
+    each cow that exits is replaced by a newborn heifer. With ``x`` the expected
+    days in each state from the entry state ``v0`` and ``m`` the sum of the ages
+    of those days, ``(I - Q)ᵀ m = x - v0``.
+
+    :param transition_matrix: The transition matrix of a cow, without re-entry
+        transitions.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray
+    :param total_states: The states of the rows and columns of
+        ``transition_matrix``.
+    :type total_states: StateTable
+    :return: The mean age of the cows in each state. The age of states that are
+        never reached is 0.
+    :rtype: np.ndarray[np.float64]
+    :raises ValueError: If ``total_states`` has no entry state.
+    """
+    initial_state_vector = np.zeros(len(total_states), dtype=np.float64)
+    initial_state_vector[entry_state_index(total_states)] = 1.0
+    visits = expected_visits(transition_matrix, total_states,
+                             initial_state_vector)
+    age_sums = expected_visits(transition_matrix, total_states,
+                               visits - initial_state_vector)
+    return np.divide(age_sums, visits, out=np.zeros_like(visits),
+                     where=visits > 0)
+
+
+def steady_state(digital_cow, method='renewal', tolerance=1e-10,
+                 max_iterations=100_000, transition_matrix=None) -> SteadyState:
+    """
+    Calculates the equilibrium of the herd of ``digital_cow`` when every cow that
+    exits is replaced by a heifer with the variables of ``digital_cow``.
+
+    The nitrogen emission of a state depends on the age of the cow through its
+    body weight. It is calculated at the mean age of the cows in the state, see
+    ``expected_ages``.
+
+    :param digital_cow: A DigitalCow object for which the states are generated.
+    :type digital_cow: DigitalCow
+    :param method: The method of ``stationary_distribution``. Defaults to
+        ``'renewal'``.
+    :type method: str
+    :param tolerance: The tolerance of the power method. Defaults to 1e-10.
+    :type tolerance: float
+    :param max_iterations: The maximum number of multiplications of the power
+        method. Defaults to 100 000.
+    :type max_iterations: int
+    :param transition_matrix: The transition matrix of the cow. Defaults to the
+        matrix of ``transition_matrix.build_transition_matrix()``, which is the
+        matrix assembled from ``state_probability_generator``.
+    :type transition_matrix: scipy.sparse.spmatrix | scipy.sparse.sparray | None
+    :return: The equilibrium of the herd.
+    :rtype: SteadyState
+    :raises ValueError: If the method is unknown, ``max_iterations`` or
+        ``check_interval`` is smaller than 1, or the states have no entry state.
+    :raises RuntimeError: If the power method has not converged.
+    """
+    from cow_builder.transition_matrix import build_transition_matrix
+    total_states = digital_cow.total_states
+    if transition_matrix is None:
+        transition_matrix = build_transition_matrix(digital_cow)
+    distribution, iterations, residual = stationary_distribution(
+        transition_matrix, total_states, method, tolerance, max_iterations)
+
+    in_herd = total_states.life_states != EXIT
+    cows = distribution[in_herd].sum()
+    present = np.flatnonzero(in_herd & (distribution > 0))
+    ages = expected_ages(transition_matrix, total_states)
+    nitrogen = distribution[present] @ digital_cow.phenotypes.nitrogen(
+        ages[present], present)
+
+    lactation_numbers = total_states.lactation_numbers[in_herd].astype(np.int64)
+    life_states = total_states.life_states[in_herd].astype(np.int64)
+    shares = np.bincount(lactation_numbers * len(LIFE_STATES) + life_states,
+                         weights=distribution[in_herd]) / cows
+    composition = {(int(key // len(LIFE_STATES)),
+                    LIFE_STATES[key % len(LIFE_STATES)]): float(shares[key])
+                   for key in np.flatnonzero(shares)}
+    return SteadyState(
+        distribution=distribution, composition=composition,
+        replacement_rate=float(1 - cows),
+        milk_per_cow=float(distribution @ total_states.milk_output / cows),
+        nitrogen_per_cow=float(nitrogen / cows),
+        iterations=iterations, residual=residual)
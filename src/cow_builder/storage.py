@@ -0,0 +1,254 @@
+"""
+:module: storage
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the functions that save the states and transition
+    matrix of a ``DigitalCow`` as uncompressed NumPy arrays, and open them with
+    memory mapping.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+The columns of a ``StateTable`` and the arrays of a transition matrix in the
+compressed sparse row (CSR) format are saved in a directory, one ``.npy`` file
+per array. When the directory is opened, the arrays are memory mapped instead of
+read: opening takes almost no time, and processes that open the same directory
+share one copy of the arrays in memory. Worker processes should therefore be
+given the path of the directory instead of the arrays.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the functions:
+************************
+::
+
+    from cow_builder.storage import save_matrix, open_matrix, save_sparse, \\
+        open_sparse
+
+************************************************************
+
+2. Save the states and transition matrix:
+*****************************************
+::
+
+    save_matrix('path/to/matrix', cow.total_states, tm)
+
+************************************************************
+
+3. Open the states and transition matrix:
+*****************************************
+The arrays are opened read only::
+
+    total_states, tm, metadata = open_matrix('path/to/matrix')
+
+To read the arrays into memory instead, use::
+
+    total_states, tm, metadata = open_matrix('path/to/matrix', mmap_mode=None)
+
+************************************************************
+
+4. Save and open another sparse matrix:
+***************************************
+A matrix without states, such as a power of the transition matrix, is saved in
+the same way::
+
+    save_sparse('path/to/power', tm_14)
+    tm_14, metadata = open_sparse('path/to/power')
+
+************************************************************
+"""
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+from cow_builder.state_space import StateTable
+
+STATE_COLUMNS = ('life_states', 'days_in_milk', 'lactation_numbers',
+                 'days_pregnant', 'milk_output')
+MATRIX_COLUMNS = ('indptr', 'indices', 'data')
+METADATA_FILE = 'metadata.json'
+
+
+def _is_complete(directory: Path, names) -> bool:
+    """Returns True if ``directory`` contains the metadata and the arrays
+    ``names``, as a directory placed by ``_save_arrays`` does."""
+    return (directory / METADATA_FILE).is_file() and \
+        all((directory / f"{name}.npy").is_file() for name in names)
+
+
+def _save_arrays(directory, arrays: dict, metadata: dict) -> Path:
+    """Saves ``arrays`` and ``metadata`` in a temporary directory, which then
+    replaces ``directory``. If another process places a complete directory
+    first, so that the temporary directory cannot replace it, the temporary
+    directory is discarded and the other directory is kept."""
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    temporary = Path(tempfile.mkdtemp(dir=directory.parent,
+                                      prefix=f".{directory.name}."))
+    old = None
+    try:
+        for name, array in arrays.items():
+            np.save(temporary / f"{name}.npy", np.ascontiguousarray(array))
+        with open(temporary / METADATA_FILE, 'w') as file:
+            json.dump(metadata, file)
+        if directory.exists():
+            # A directory cannot replace a directory that is not empty, the old
+            # directory is moved away first. Processes that opened it keep their
+            # memory maps, processes that open it in between find no directory.
+            old = Path(tempfile.mkdtemp(dir=directory.parent,
+                                        prefix=f".{directory.name}."))
+            try:
+                os.replace(directory, old / directory.name)
+            except FileNotFoundError:
+                # Another process moved it away.
+                pass
+        try:
+            os.replace(temporary, directory)
+        except OSError:
+            if not _is_complete(directory, arrays):
+                raise
+            # Another process placed its directory first.
+            shutil.rmtree(temporary, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+    finally:
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+    return directory
+
+
+def _open_csr(directory: Path, node_count: int, mmap_mode):
+    """Opens the arrays of a square matrix in the CSR format."""
+    from scipy.sparse import csr_matrix
+    indptr, indices, data = (
+        np.load(directory / f"{column}.npy", mmap_mode=mmap_mode,
+                allow_pickle=False)
+        for column in MATRIX_COLUMNS)
+    if len(indptr) != node_count + 1:
+        raise ValueError("The arrays do not fit together.")
+    return csr_matrix((data, indices, indptr), shape=(node_count, node_count),
+                      copy=False)
+
+
+def save_matrix(directory, total_states: StateTable, transition_matrix,
+                metadata=None) -> Path:
+    """
+    Saves the states and transition matrix of a cow in ``directory``. The arrays
+    are written to a temporary directory first, which then replaces
+    ``directory``, so that other processes never open a partly written
+    directory.
+
+    :param directory: The directory in which to save the arrays.
+    :type directory: str | os.PathLike
+    :param total_states: The states of the cow.
+    :type total_states: StateTable
+    :param transition_matrix: The transition matrix of the cow.
+    :type transition_matrix: scipy.sparse.csr_matrix
+    :param metadata: Values to save together with the arrays. They must be
+        serializable to JSON. Defaults to None.
+    :type metadata: dict | None
+    :return: The path of the directory.
+    :rtype: Path
+    """
+    arrays = {column: getattr(total_states, column) for column in STATE_COLUMNS}
+    arrays.update(indptr=transition_matrix.indptr,
+                  indices=transition_matrix.indices,
+                  data=transition_matrix.data)
+    return _save_arrays(directory, arrays,
+                        {'node_count': len(total_states), **(metadata or {})})
+
+
+def save_sparse(directory, matrix, metadata=None) -> Path:
+    """
+    Saves a square sparse matrix, such as a power of a transition matrix, in
+    ``directory`` in the same way as ``save_matrix``.
+
+    :param directory: The directory in which to save the arrays.
+    :type directory: str | os.PathLike
+    :param matrix: The matrix to save.
+    :type matrix: scipy.sparse.csr_matrix
+    :param metadata: Values to save together with the arrays. They must be
+        serializable to JSON. Defaults to None.
+    :type metadata: dict | None
+    :return: The path of the directory.
+    :rtype: Path
+    """
+    return _save_arrays(directory, {'indptr': matrix.indptr,
+                                    'indices': matrix.indices,
+                                    'data': matrix.data},
+                        {'node_count': matrix.shape[0], **(metadata or {})})
+
+
+def read_metadata(directory) -> dict:
+    """
+    Reads the metadata saved by ``save_matrix`` or ``save_sparse``.
+
+    :param directory: The directory in which the arrays are saved.
+    :type directory: str | os.PathLike
+    :return: The metadata, including the number of states as ``node_count``.
+    :rtype: dict
+    :raises FileNotFoundError: If the directory contains no metadata.
+    """
+    with open(Path(directory) / METADATA_FILE) as file:
+        return json.load(file)
+
+
+def open_matrix(directory, mmap_mode='r') -> tuple:
+    """
+    Opens the states and transition matrix saved by ``save_matrix``.
+
+    :param directory: The directory in which the arrays are saved.
+    :type directory: str | os.PathLike
+    :param mmap_mode: The mode in which the arrays are memory mapped, see
+        ``numpy.load``. None reads the arrays into memory. Defaults to 'r'.
+    :type mmap_mode: str | None
+    :return:
+        - total_states: The states of the cow.
+        - transition_matrix: The transition matrix of the cow, of which the
+          arrays are the memory mapped arrays.
+        - metadata: The metadata saved with the arrays.
+    :rtype:
+        - total_states: StateTable
+        - transition_matrix: scipy.sparse.csr_matrix
+        - metadata: dict
+    :raises FileNotFoundError: If an array or the metadata is missing.
+    :raises ValueError: If an array cannot be read, or the arrays do not fit
+        together.
+    """
+    directory = Path(directory)
+    metadata = read_metadata(directory)
+    total_states = StateTable(*(
+        np.load(directory / f"{column}.npy", mmap_mode=mmap_mode,
+                allow_pickle=False)
+        for column in STATE_COLUMNS))
+    if metadata['node_count'] != len(total_states):
+        raise ValueError("The states and transition matrix do not fit together.")
+    return total_states, _open_csr(directory, len(total_states), mmap_mode), \
+        metadata
+
+
+def open_sparse(directory, mmap_mode='r') -> tuple:
+    """
+    Opens a sparse matrix saved by ``save_sparse``.
+
+    :param directory: The directory in which the arrays are saved.
+    :type directory: str | os.PathLike
+    :param mmap_mode: The mode in which the arrays are memory mapped, see
+        ``numpy.load``. None reads the arrays into memory. Defaults to 'r'.
+    :type mmap_mode: str | None
+    :return:
+        - matrix: The matrix, of which the arrays are the memory mapped arrays.
+        - metadata: The metadata saved with the arrays.
+    :rtype:
+        - matrix: scipy.sparse.csr_matrix
+        - metadata: dict
+    :raises FileNotFoundError: If an array or the metadata is missing.
+    :raises ValueError: If an array cannot be read, or the arrays do not fit
+        together.
+    """
+    directory = Path(directory)
+    metadata = read_metadata(directory)
+    return _open_csr(directory, metadata['node_count'], mmap_mode), metadata
@@ -0,0 +1,616 @@
+"""
+:module: transition_matrix
+:module author: Gabe van den Hoeven
+:synopsis: This module contains the functions that build the transition matrix of
+    a ``DigitalCow`` with NumPy arrays, as an alternative to the
+    ``state_probability_generator`` function.
+
+======================
+How To Use This Module
+======================
+(See the individual classes, methods, and attributes for details.)\n
+The ``state_probability_generator`` function calculates the transitions of one
+state at a time. The functions in this module calculate the transitions and their
+probabilities of a whole lactation block at once, and return the transition matrix
+in the compressed sparse row (CSR) format used by :py:mod:`scipy`. The matrix is
+identical to the matrix assembled from the ``state_probability_generator``.\n
+*Values in this HowTo are examples, see documentation of each class or function
+for details on the default values.*
+
+1. Import the functions:
+************************
+::
+
+    from cow_builder.transition_matrix import transition_arrays, \\
+        build_transition_matrix, estimate_size
+
+************************************************************
+
+2. Create a transition matrix:
+******************************
+The states of the cow must be generated first::
+
+    cow.generate_total_states(dim_limit=1000, ln_limit=9)
+
+a) As a ``scipy.sparse.csr_matrix``::
+
+    tm = build_transition_matrix(cow)
+
+b) As the arrays of the CSR format::
+
+    indptr, indices, data = transition_arrays(cow)
+
+************************************************************
+
+3. Estimate the size of a transition matrix:
+********************************************
+The number of states and transitions, and the memory needed for the transition
+matrix and state vectors, can be calculated before the states are generated::
+
+    size = estimate_size(a_herd, dim_limit=1000, ln_limit=9)
+    size.node_count, size.edge_count, size.matrix_nbytes, size.vector_nbytes
+
+************************************************************
+"""
+from dataclasses import dataclass
+import numpy as np
+from cow_builder.state_space import StateTable, band_order, enumerate_states, \
+    lactation_template_key, non_pregnant_milk, OPEN, DO_NOT_BREED, PREGNANT, EXIT
+
+
+@dataclass(frozen=True)
+class TransitionMatrixSize:
+    """
+    The size of the states and transition matrix of a ``DigitalCow``.
+
+    :Attributes:
+        :var node_count: The number of states.
+        :type node_count: int
+        :var edge_count: The number of possible transitions, which is the total
+            number of possible new states of all states.
+        :type edge_count: int
+        :var exit_count: The number of Exit states. Each Exit state transitions
+            into itself in the transition matrix.
+        :type exit_count: int
+
+    :Methods:
+        transition_count\n
+        index_dtype\n
+        matrix_nbytes\n
+        vector_nbytes\n
+
+    ************************************************************
+    """
+    node_count: int
+    edge_count: int
+    exit_count: int
+
+    @property
+    def transition_count(self) -> int:
+        """The number of stored values in the transition matrix."""
+        return self.edge_count + self.exit_count
+
+    @property
+    def index_dtype(self) -> type:
+        """The data type of the index arrays of the transition matrix."""
+        return np.int32 if max(self.node_count, self.transition_count) < 2 ** 31 \
+            else np.int64
+
+    @property
+    def matrix_nbytes(self) -> int:
+        """The number of bytes of the arrays of the transition matrix in the
+        compressed sparse row format."""
+        index_size = np.dtype(self.index_dtype).itemsize
+        return (self.node_count + 1) * index_size + \
+            self.transition_count * (index_size + np.dtype(np.float64).itemsize)
+
+    @property
+    def vector_nbytes(self) -> int:
+        """The number of bytes of one state vector of 64-bit floats."""
+        return self.node_count * np.dtype(np.float64).itemsize
+
+
+def _herd_variables(herd, lactation_numbers: np.ndarray) -> tuple:
+    """Returns the voluntary waiting period, insemination window, days pregnant
+    limit and dry period for each of the given lactation numbers."""
+    lookup = np.array([
+        (herd.get_voluntary_waiting_period(ln), herd.get_insemination_window(ln),
+         herd.get_days_pregnant_limit(ln), herd.get_duration_dry(ln))
+        for ln in range(int(lactation_numbers.max(initial=0)) + 1)
+    ], dtype=np.int64)
+    return tuple(lookup[lactation_numbers].T)
+
+
+def _milk_grid(herd, table: StateTable, dim_limit: int) -> np.ndarray:
+    """Returns the milk output of a non-pregnant cow for each lactation number in
+    ``table`` (rows) and each days in milk up to ``dim_limit`` (columns)."""
+    return np.stack([
+        non_pregnant_milk(herd, ln, np.arange(dim_limit + 1))
+        for ln in range(int(table.lactation_numbers.max(initial=0)) + 1)])
+
+
+def _transition_groups(herd, table: StateTable, block: slice,
+                       milk_grid: np.ndarray, dim_limit: int,
+                       ln_limit: int) -> tuple:
+    """
+    Determines the transitions from the states of one lactation block, except
+    the transitions of an Exit state into itself.
+
+    :return:
+        - rows: The index of each state of the block.
+        - days_in_milk: The days in milk of each state of the block.
+        - is_exit: Whether each state of the block is an Exit state.
+        - groups: A tuple of transition groups. Each group is a tuple of a mask
+          over the states of the block, the life state, days in milk, lactation
+          number and days pregnant of the states transitioned into, and the
+          probability of the transition.
+    :rtype:
+        - rows: np.ndarray
+        - days_in_milk: np.ndarray
+        - is_exit: np.ndarray
+        - groups: tuple[tuple]
+    """
+    milk_threshold = herd.milk_threshold
+
+    rows = np.arange(block.start, block.stop)
+    life = table.life_states[block]
+    dim = table.days_in_milk[block].astype(np.int64)
+    ln = table.lactation_numbers[block].astype(np.int64)
+    dp = table.days_pregnant[block].astype(np.int64)
+    milk = table.milk_output[block]
+    vwp, insemination_window, dp_limit, duration_dry = _herd_variables(herd, ln)
+    cutoff = vwp + insemination_window
+
+    # The probabilities of probability_state_change, in the same order of
+    # operations so that the results are identical.
+    heifer = ln == 0
+    p_ovulation = np.where(heifer, 1 / 19, 1 / 21)
+    p_insemination = np.where(dim < vwp, 0.0, np.where(heifer, 0.85, 0.65))
+    p_pregnancy = np.where(heifer, 0.5, np.where(ln == 1, 0.45, 0.35))
+    p_birth = (dp == dp_limit).astype(np.float64)
+    p_abortion = np.select(
+        [dp < 30, (29 < dp) & (dp < 46), (45 < dp) & (dp < 181),
+         (180 < dp) & (dp < dp_limit + 1)],
+        [0.0, 0.125 / 15, 0.099 / 135, 0.02 / (dp_limit - 180)])
+    p_above_cutoff = (dim > cutoff).astype(np.float64)
+    below_threshold = (milk < milk_threshold) & ~heifer & \
+        (dp < dp_limit - duration_dry)
+    p_death = 0.05 / 365
+
+    not_death = (1 - p_death)
+    pregnant = p_ovulation * p_insemination * p_pregnancy
+    not_pregnant = (1 - pregnant)
+    not_aborting = (1 - p_abortion)
+    not_below_threshold = (1 - below_threshold.astype(np.float64))
+    not_above_cutoff = (1 - p_above_cutoff)
+
+    is_open = life == OPEN
+    is_dnb = life == DO_NOT_BREED
+    is_pregnant = life == PREGNANT
+    is_exit = life == EXIT
+    transitions = ~is_exit & (dim != dim_limit - 1)
+    productive = (milk > milk_threshold) | heifer
+    open_ = is_open & transitions & productive
+    pregnant_ = is_pregnant & transitions & \
+        (productive | (dp >= dp_limit - duration_dry))
+    calving = pregnant_ & (dp == dp_limit) & (ln <= ln_limit)
+    staying_pregnant = pregnant_ & ~calving & (dp < dp_limit)
+    next_dim = np.minimum(dim + 1, milk_grid.shape[1] - 1)
+    dnb_productive = milk_grid[ln, next_dim] >= milk_threshold
+
+    zeros = np.zeros_like(dim)
+    exit_probability = np.where(
+        below_threshold, 1.0, np.select(
+            [is_open & (dim == cutoff) & heifer,
+             is_pregnant & (dp == dp_limit) & heifer,
+             is_pregnant & (dim >= cutoff) & heifer],
+            [(not_pregnant * not_death) + p_death,
+             p_death,
+             (p_abortion * not_death) + p_death],
+            p_death))
+    open_open = np.where(
+        dim < vwp, not_below_threshold * not_death,
+        not_pregnant * not_below_threshold * not_above_cutoff * not_death)
+    open_dnb = np.where(
+        (dim == cutoff) & ~heifer, not_pregnant * not_below_threshold * not_death,
+        p_above_cutoff * not_below_threshold * not_death)
+    calving_probability = p_birth * not_below_threshold * not_death
+    abortion_probability = p_abortion * not_below_threshold * not_death
+
+    # Each group is a set of transitions: its mask over the states of the block,
+    # the variables of the states transitioned into and the probability. Each
+    # group matches one of the possible new states of DigitalCow.
+    groups = (
+        (~is_exit, EXIT, dim + 1, ln, zeros, exit_probability),
+        (open_ & (vwp <= dim) & (dim <= cutoff), PREGNANT, dim + 1, ln, zeros + 1,
+         pregnant * not_below_threshold * not_above_cutoff * not_death),
+        (open_ & (dim >= cutoff) & ~heifer, DO_NOT_BREED, dim + 1, ln, zeros,
+         open_dnb),
+        (open_ & (dim < cutoff), OPEN, dim + 1, ln, zeros, open_open),
+        (is_dnb & transitions & (milk > milk_threshold) & dnb_productive,
+         DO_NOT_BREED, dim + 1, ln, zeros, not_below_threshold * not_death),
+        (calving & (ln == ln_limit), DO_NOT_BREED, dim + 1, ln + 1, zeros,
+         calving_probability),
+        (calving & (ln < ln_limit), OPEN, zeros, ln + 1, zeros,
+         calving_probability),
+        (staying_pregnant, PREGNANT, dim + 1, ln, dp + 1,
+         not_aborting * not_below_threshold * not_death),
+        (staying_pregnant & (dim < cutoff), OPEN, dim + 1, ln, zeros,
+         abortion_probability),
+        (staying_pregnant & (dim >= cutoff) & ~heifer, DO_NOT_BREED, dim + 1, ln,
+         zeros, abortion_probability),
+    )
+    return rows, dim, is_exit, groups
+
+
+def _block_transitions(table: StateTable, block: slice, rows: np.ndarray,
+                       dim: np.ndarray, is_exit: np.ndarray, groups: tuple,
+                       dim_limit: int) -> tuple:
+    """
+    Calculates all transitions from the states of one lactation block.
+
+    :return:
+        - rows: The index of the state from which each transition starts.
+        - columns: The index of the state in which each transition ends.
+        - probabilities: The probability of each transition.
+    :rtype:
+        - rows: np.ndarray
+        - columns: np.ndarray
+        - probabilities: np.ndarray
+    """
+    from_rows = []
+    to_rows = []
+    probabilities = []
+    for mask, life_to, dim_to, ln_to, dp_to, probability in groups:
+        targets = table.state_index.rows(life_to, dim_to[mask], ln_to[mask],
+                                         dp_to[mask])
+        if (targets < 0).any():
+            missing = rows[mask][targets < 0][0]
+            raise ValueError(f"A state that {table[int(missing)]} can transition "
+                             f"into is not in total_states.")
+        from_rows.append(rows[mask])
+        to_rows.append(targets)
+        probabilities.append(probability[mask])
+    # An Exit state stays in the Exit state.
+    from_rows.append(rows[is_exit])
+    to_rows.append(rows[is_exit])
+    probabilities.append(np.ones(is_exit.sum()))
+
+    from_rows = np.concatenate(from_rows)
+    to_rows = np.concatenate(to_rows)
+    probabilities = np.concatenate(probabilities)
+    # A state with a single transition always makes that transition, and so
+    # does every transition from a state at the days in milk limit.
+    counts = np.bincount(from_rows - block.start, minlength=len(rows))
+    probabilities[(counts[from_rows - block.start] == 1) |
+                  (dim[from_rows - block.start] == dim_limit)] = 1.0
+    order = np.lexsort((to_rows, from_rows))
+    return from_rows[order], to_rows[order], probabilities[order]
+
+
+def _blocks(table: StateTable) -> list:
+    """Returns the lactation blocks of ``table``, see ``StateTable.blocks()``.
+
+    :raises ValueError: If the blocks do not cover all states of the table,
+        because the table does not start with the states of days in milk 0 of
+        a lactation.
+    """
+    blocks = table.blocks()
+    if len(table) and (not blocks or blocks[0].start != 0):
+        raise ValueError("The states of total_states are not ordered in "
+                         "lactation blocks starting at days in milk 0.")
+    return blocks
+
+
+def _template(templates: dict, herd, table: StateTable, block: slice,
+              ln_limit: int) -> tuple:
+    """
+    Looks up the template of a lactation block in ``templates``. The template is
+    an earlier block with the same ``lactation_template_key``, of which the
+    states are equal to the states of the block apart from their lactation
+    numbers.
+
+    :return:
+        - lactation_number: The lactation number of the block.
+        - key: The template key of the block.
+        - template: The value in ``templates`` for the key, starting with the
+          slice and lactation number of the template block. None if the block
+          has no template.
+    :rtype:
+        - lactation_number: int
+        - key: tuple
+        - template: tuple | None
+    """
+    lactation_number = int(table.lactation_numbers[block.start])
+    key = lactation_template_key(herd, lactation_number, ln_limit)
+    template = templates.get(key)
+    if template is not None:
+        template_block, template_number = template[:2]
+        offset = lactation_number - template_number
+        if block.stop - block.start != template_block.stop - template_block.start \
+                or not all(np.array_equal(column[block], column[template_block])
+                           for column in (table.life_states, table.days_in_milk,
+                                          table.days_pregnant,
+                                          table.milk_output)) \
+                or not np.array_equal(
+                    table.lactation_numbers[block].astype(np.int64),
+                    table.lactation_numbers[template_block] + offset):
+            template = None
+    return lactation_number, key, template
+
+
+def _stamp_transitions(table: StateTable, block: slice, lactation_number: int,
+                       template_block: slice, template_number: int,
+                       from_rows: np.ndarray, to_rows: np.ndarray,
+                       probabilities: np.ndarray) -> tuple:
+    """
+    Copies the transitions of a template block to ``block``. Transitions within
+    the block are moved by the offset between the blocks, the states of the
+    other transitions are looked up with the lactation number of ``block``.
+
+    :return:
+        - rows: The index of the state from which each transition starts.
+        - columns: The index of the state in which each transition ends.
+        - probabilities: The probability of each transition.
+    :rtype:
+        - rows: np.ndarray
+        - columns: np.ndarray
+        - probabilities: np.ndarray
+    """
+    offset = block.start - template_block.start
+    from_rows = from_rows + offset
+    columns = to_rows + offset
+    outside = (to_rows < template_block.start) | (to_rows >= template_block.stop)
+    if outside.any():
+        targets = to_rows[outside]
+        columns[outside] = table.state_index.rows(
+            table.life_states[targets], table.days_in_milk[targets],
+            table.lactation_numbers[targets].astype(np.int64) +
+            (lactation_number - template_number),
+            table.days_pregnant[targets])
+        missing = columns[outside] < 0
+        if missing.any():
+            raise ValueError(f"A state that "
+                             f"{table[int(from_rows[outside][missing][0])]} can "
+                             f"transition into is not in total_states.")
+        unsorted = (from_rows[1:] == from_rows[:-1]) & (columns[1:] <= columns[:-1])
+        if unsorted.any():
+            order = np.lexsort((columns, from_rows))
+            return from_rows[order], columns[order], probabilities[order]
+    return from_rows, columns, probabilities
+
+
+def _band_permutation(table: StateTable) -> np.ndarray | None:
+    """Returns the ``band_order`` of ``table``, or None if the table is already
+    in that order, as a table created by ``enumerate_states`` is."""
+    order = band_order(table)
+    if np.array_equal(order, np.arange(len(table))):
+        return None
+    return order
+
+
+def _permute_arrays(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                    order: np.ndarray) -> tuple:
+    """Returns the CSR arrays of the matrix of ``table.take(order)`` for the rows
+    and columns of ``table``: row and column ``i`` of the given matrix become row
+    and column ``order[i]``. The column indices of each row are sorted."""
+    rows = order[np.repeat(np.arange(len(order)), np.diff(indptr))]
+    columns = order[indices]
+    sort = np.lexsort((columns, rows))
+    permuted = np.zeros_like(indptr)
+    np.cumsum(np.bincount(rows, minlength=len(order)), out=permuted[1:])
+    return permuted, columns[sort].astype(indices.dtype), data[sort]
+
+
+def _generated_limits(digital_cow) -> tuple:
+    """Returns the ``DigitalCow.generated_limits`` of ``digital_cow``.
+
+    :raises ValueError: If the states of the cow were not generated.
+    """
+    limits = digital_cow.generated_limits
+    if limits is None:
+        raise ValueError("The states of the cow must be generated first, see "
+                         "DigitalCow.generate_total_states().")
+    return limits
+
+
+def transition_arrays(digital_cow) -> tuple:
+    """
+    Calculates the transition matrix of ``digital_cow`` as the arrays of the
+    compressed sparse row format. The column indices of each row are sorted.
+
+    :param digital_cow: A DigitalCow object for which the states are generated.
+    :type digital_cow: DigitalCow
+    :return:
+        - indptr: The start of the transitions of each state in ``indices`` and
+          ``data``, followed by the number of transitions.
+        - indices: The index of the state in which each transition ends.
+        - data: The probability of each transition.
+    :rtype:
+        - indptr: np.ndarray[np.int32 | np.int64]
+        - indices: np.ndarray[np.int32 | np.int64]
+        - data: np.ndarray[np.float64]
+    :raises ValueError: If a state can transition into a state that is not in
+        ``total_states``, if the states are not ordered in lactation blocks, or
+        if the states of the cow were not generated.
+    """
+    return _transition_arrays(digital_cow.herd, digital_cow.total_states,
+                              *_generated_limits(digital_cow))
+
+
+def _transition_arrays(herd, table: StateTable, dim_limit: int,
+                       ln_limit: int, counts=None) -> tuple:
+    """Calculates the arrays of ``transition_arrays`` for the states in
+    ``table``, generated for ``herd`` with ``dim_limit`` and ``ln_limit``. The
+    arrays are allocated once with the size of ``estimate_size``, from the
+    number of possible new states of each state, see ``transition_counts``,
+    and the transitions of each lactation block are written into them. The
+    blocks cover all states, see ``_blocks``, so every value is written. A
+    table in another order than ``band_order``, such as one created with
+    ``StateTable.from_states``, is put in that order first, and the rows and
+    columns of its matrix are put back in the order of the table."""
+    order = _band_permutation(table)
+    if order is not None:
+        return _permute_arrays(*_transition_arrays(
+            herd, table.take(order), dim_limit, ln_limit,
+            None if counts is None else counts[order]), order)
+    if counts is None:
+        counts = transition_counts(herd, table, dim_limit, ln_limit)
+    exits = table.life_states == EXIT
+    size = TransitionMatrixSize(len(table), int(counts.sum()),
+                                int(np.count_nonzero(exits)))
+    indptr = np.zeros(len(table) + 1, dtype=size.index_dtype)
+    # Each Exit state transitions into itself.
+    np.cumsum(counts + exits, out=indptr[1:])
+    indices = np.empty(size.transition_count, dtype=size.index_dtype)
+    data = np.empty(size.transition_count, dtype=np.float64)
+    milk_grid = _milk_grid(herd, table, dim_limit)
+
+    # The transitions of lactation blocks with a template are copied from it.
+    templates = {}
+    for block in _blocks(table):
+        lactation_number, key, template = _template(templates, herd, table, block,
+                                                    ln_limit)
+        if template is None:
+            block_from, block_to, block_data = _block_transitions(
+                table, block, *_transition_groups(herd, table, block, milk_grid,
+                                                  dim_limit, ln_limit),
+                dim_limit)
+            templates.setdefault(key, (block, lactation_number, block_from,
+                                       block_to, block_data))
+        else:
+            block_from, block_to, block_data = _stamp_transitions(
+                table, block, lactation_number, *template)
+        # The transitions of a block are ordered by the state they come from.
+        rows = slice(indptr[block.start], indptr[block.stop])
+        indices[rows] = block_to
+        data[rows] = block_data
+    return indptr, indices, data
+
+
+def build_transition_matrix(digital_cow):
+    """
+    Creates the transition matrix of ``digital_cow``. If the cow uses the
+    shared states of its herd, the shared transition matrix of the herd is
+    returned, see ``DigitalHerd.get_transition_matrix()``.
+
+    :param digital_cow: A DigitalCow object for which the states are generated.
+    :type digital_cow: DigitalCow
+    :return: The transition matrix, with the probability of moving from the state
+        of a row to the state of a column.
+    :rtype: scipy.sparse.csr_matrix
+    :raises ValueError: If the states of the cow were not generated.
+    """
+    if digital_cow.shares_states:
+        return digital_cow.herd.get_transition_matrix(
+            *_generated_limits(digital_cow))
+    return herd_transition_matrix(digital_cow.herd, digital_cow.total_states,
+                                  *_generated_limits(digital_cow))
+
+
+def herd_transition_matrix(herd, table: StateTable, dim_limit: int,
+                           ln_limit: int, counts=None):
+    """
+    Creates the transition matrix of the states in ``table``, generated for a
+    cow in ``herd`` with ``dim_limit`` and ``ln_limit``.
+
+    :param herd: The herd for which the states are generated.
+    :type herd: DigitalHerd
+    :param table: The states of which to create the transition matrix.
+    :type table: StateTable
+    :param dim_limit: The limit of days in milk for which the states are
+        generated.
+    :type dim_limit: int
+    :param ln_limit: The limit of lactation numbers for which the states are
+        generated.
+    :type ln_limit: int
+    :param counts: The number of possible new states of each state, see
+        ``transition_counts``, with which the arrays of the matrix are
+        allocated. Defaults to None, which counts them.
+    :type counts: np.ndarray[np.int64] | None
+    :return: The transition matrix, with the probability of moving from the state
+        of a row to the state of a column.
+    :rtype: scipy.sparse.csr_matrix
+    :raises ValueError: If a state can transition into a state that is not in
+        ``table``, or if the states are not ordered in lactation blocks.
+    """
+    from scipy.sparse import csr_matrix
+    indptr, indices, data = _transition_arrays(herd, table, dim_limit, ln_limit,
+                                               counts)
+    return csr_matrix((data, indices, indptr), shape=(len(table), len(table)))
+
+
+def transition_counts(herd, table: StateTable, dim_limit: int,
+                      ln_limit: int) -> np.ndarray:
+    """
+    Counts the possible new states of each state in ``table``, as
+    ``DigitalCow.possible_new_states()`` would for states generated with
+    ``dim_limit`` and ``ln_limit``. The states transitioned into are not looked
+    up.
+
+    :param herd: The herd for which the states are generated.
+    :type herd: DigitalHerd
+    :param table: The states of which to count the possible new states.
+    :type table: StateTable
+    :param dim_limit: The limit of days in milk for which the states are
+        generated.
+    :type dim_limit: int
+    :param ln_limit: The limit of lactation numbers for which the states are
+        generated.
+    :type ln_limit: int
+    :return: The number of possible new states of each state.
+    :rtype: np.ndarray[np.int64]
+    :raises ValueError: If the states are not ordered in lactation blocks.
+    """
+    counts = np.zeros(len(table), dtype=np.int64)
+    if not len(table):
+        return counts
+    order = _band_permutation(table)
+    if order is not None:
+        counts[order] = transition_counts(herd, table.take(order), dim_limit,
+                                          ln_limit)
+        return counts
+    milk_grid = _milk_grid(herd, table, dim_limit)
+    templates = {}
+    for block in _blocks(table):
+        lactation_number, key, template = _template(templates, herd, table, block,
+                                                    ln_limit)
+        if template is None:
+            _, _, _, groups = _transition_groups(herd, table, block, milk_grid,
+                                                 dim_limit, ln_limit)
+            counts[block] = np.sum([group[0] for group in groups], axis=0)
+            templates.setdefault(key, (block, lactation_number))
+        else:
+            template_block = template[0]
+            counts[block] = counts[template_block]
+    return counts
+
+
+def estimate_size(herd, dim_limit=None, ln_limit=None) -> TransitionMatrixSize:
+    """
+    Calculates the number of states and transitions, and the memory they need,
+    of a ``DigitalCow`` in ``herd``, without building ``State`` objects or the
+    matrix; the state arrays are enumerated and their transitions counted. The
+    result is exact, and can be used to size jobs. The assembly of the
+    transition matrix allocates its arrays with the same size.
+
+    :param herd: The herd of the cow.
+    :type herd: DigitalHerd
+    :param dim_limit: The limit of days in milk for which states would be
+        generated. Defaults to the limit of the herd.
+    :type dim_limit: int | None
+    :param ln_limit: The limit of lactation numbers for which states would be
+        generated. Defaults to the limit of the herd.
+    :type ln_limit: int | None
+    :return: The number of states and transitions.
+    :rtype: TransitionMatrixSize
+    """
+    if dim_limit is None:
+        dim_limit = herd.days_in_milk_limit
+    if ln_limit is None:
+        ln_limit = herd.lactation_number_limit
+    table = StateTable(*enumerate_states(herd, dim_limit, ln_limit))
+    counts = transition_counts(herd, table, dim_limit, ln_limit)
+    return TransitionMatrixSize(
+        node_count=len(table), edge_count=int(counts.sum()),
+        exit_count=int(np.count_nonzero(table.life_states == EXIT)))
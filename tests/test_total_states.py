@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+from cow_builder.digital_cow import DigitalCow
+from cow_builder.digital_herd import DigitalHerd
+from cow_builder.transition_matrix import build_transition_matrix
+
+
+class TestShuffledTotalStates(unittest.TestCase):
+    """A tuple of states assigned to ``DigitalCow.total_states`` may be in any
+    order."""
+
+    def setUp(self):
+        self.cow = DigitalCow(days_in_milk=0, lactation_number=1,
+                              days_pregnant=0, age=660, herd=DigitalHerd(),
+                              state='Open')
+        self.cow.generate_total_states(dim_limit=250, ln_limit=3)
+        self.states = tuple(self.cow.total_states)
+        self.transition_matrix = build_transition_matrix(self.cow)
+        self.order = np.random.default_rng(0).permutation(len(self.states))
+        self.cow.total_states = tuple(self.states[row] for row in self.order)
+
+    def test_index(self):
+        total_states = self.cow.total_states
+        for position, row in enumerate(self.order.tolist()):
+            self.assertEqual(total_states.index(self.states[row]), position)
+        self.assertEqual(
+            self.cow.current_state_index,
+            int(np.flatnonzero(
+                self.order == self.states.index(self.cow.current_state))[0]))
+
+    def test_transition_matrix(self):
+        transition_matrix = build_transition_matrix(self.cow)
+        expected = self.transition_matrix[self.order][:, self.order]
+        self.assertEqual((transition_matrix != expected).nnz, 0)
+        self.assertTrue(transition_matrix.has_sorted_indices)
+
+
+if __name__ == '__main__':
+    unittest.main()